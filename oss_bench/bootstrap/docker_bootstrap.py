@@ -3,13 +3,14 @@ from __future__ import print_function
 import argparse
 import datetime
 import os
-import subprocess
 import sys
-import time
 import yaml
 
 parser = argparse.ArgumentParser()
 
+# Where a git mirror folder outside of the workspace is mounted in docker.
+DOCKER_GIT_MIRROR_DIR = '/git_mirrors'
+
 
 class Bootstrap(object):
   """Builds docker image and starts test harness within the image.
@@ -25,6 +26,16 @@ class Bootstrap(object):
     framework:
     gpu_process_check:
     pure_docker:
+    git_mirror_dir: Folder of git mirrors shared by workspaces, mounted in
+      docker at `DOCKER_GIT_MIRROR_DIR`. Defaults to cache/git_mirrors in the
+      workspace.
+    docker_reuse: Skip the build if an image from the same Dockerfile, base
+      images and package versions exists, see `bootstrap.image_cache`.
+    docker_keep_images: Images from earlier inputs kept for reuse.
+    docker: docker executable used to build images.
+    gpu_quiet_window: Seconds the GPUs and CPUs must stay idle before tests
+      start, see `tools.quiescence`.
+    gpu_quiet_timeout: Seconds to wait for the host to become idle.
 
   """
 
@@ -41,7 +52,13 @@ class Bootstrap(object):
                pure_docker=False,
                docker_no_cache=True,
                bootstrap_log='./log.txt',
-               python='python'):
+               python='python',
+               git_mirror_dir=None,
+               docker_reuse=True,
+               docker_keep_images=5,
+               docker='docker',
+               gpu_quiet_window=30,
+               gpu_quiet_timeout=300):
     self.docker_folder = docker_folder
     self.workspace = workspace
     self.test_config = test_config
@@ -56,6 +73,16 @@ class Bootstrap(object):
     self.docker_no_cache = docker_no_cache
     self.bootstrap_log = bootstrap_log
     self.python = python
+    # Mounted in docker if set, otherwise the folder in the workspace is
+    # used in and out of docker.
+    self.shared_git_mirror_dir = git_mirror_dir
+    self.git_mirror_dir = git_mirror_dir or os.path.join(
+        workspace, 'cache', 'git_mirrors')
+    self.docker_reuse = docker_reuse
+    self.docker_keep_images = docker_keep_images
+    self.docker = docker
+    self.gpu_quiet_window = gpu_quiet_window
+    self.gpu_quiet_timeout = gpu_quiet_timeout
 
   def run_local_command(self, cmd, stdout=None):
     """Run a command in a subprocess and log result.
@@ -71,73 +98,100 @@ class Bootstrap(object):
     if stdout:
       f = open(stdout, 'a')
       f.write(cmd + '\n')
-    for line in self._run_local_command(cmd):
-      if line.strip('\n'):
-        print(line.strip('\n'))
-        if f:
-          f.write(line.strip('\n') + '\n')
+    try:
+      for lines in self._run_local_command(cmd):
+        lines = [line for line in lines if line]
+        if lines:
+          text = '\n'.join(lines)
+          print(text)
+          if f:
+            f.write(text + '\n')
+    finally:
+      if f:
+        f.close()
 
   def _run_local_command(self, cmd):
-    p = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-    while True:
-      retcode = p.poll()
-      line = p.stdout.readline()
-      yield line
-      if retcode is not None:
-        break
+    # Modules are added to sys.path at runtime.
+    # pylint: disable=C6204
+    import tools.local_command as local_command
+    command = local_command.LocalCommand(cmd)
+    for lines in command.lines():
+      yield lines
+    print('Harness CPU time: {:.3f}s'.format(command.harness_cpu_time))
 
   def existing_process_check(self):
     """Checks if system is open for testing.
 
-    Watches the system periodically for 5 minutes to see if the GPUs are being
-    used.
+    Samples GPU utilization, memory, GPU processes and CPU load until the host
+    has been idle for `gpu_quiet_window` seconds or `gpu_quiet_timeout`
+    passes.
 
     Returns:
       True if system looks available and GPUs are free.
     """
     # Modules are added to sys.path at runtime.
     # pylint: disable=C6204
-    import tools.nvidia as nvidia
-    totaltime = 0
-    maxtime = 300
-    print('Checking if existing processes are running on GPUs for {} seconds'
-          .format(maxtime))
-    while True:
-      if not nvidia.is_ok_to_run():
-        return False
-      if totaltime > maxtime:
-        return True
-      print('No GPU processes found watching for {} more seconds'.format(
-          maxtime - totaltime))
-      time.sleep(20)
-      totaltime += 20
+    import tools.quiescence as quiescence
+    print('Waiting up to {}s for the host to be idle for {}s'.format(
+        self.gpu_quiet_timeout, self.gpu_quiet_window))
+    detector = quiescence.QuiescenceDetector(
+        window=self.gpu_quiet_window, timeout=self.gpu_quiet_timeout)
+    return detector.wait()
 
   def git_clone(self, git_repo, local_folder, branch=None, sha_hash=None):
     """Clone, update, or synce a repo.
 
-    If the clone already exists the repo will be updated via a pull.
+    The repo is fetched shallow through the git mirrors, see `tools.git_sync`.
 
     Args:
-      git_repo (str): Command to
+      git_repo (str): URL or path of the repo.
       local_folder (str): Where to clone repo into.
       branch (str, optional): Branch to checkout.
       sha_hash (str, optional): Hash to sync to.
     """
-    if os.path.isdir(local_folder):
-      git_clone_or_pull = 'git -C {} pull'.format(local_folder)
-    else:
-      git_clone_or_pull = 'git clone {} {}'.format(git_repo, local_folder)
-    self.run_local_command(git_clone_or_pull)
+    # Modules are added to sys.path at runtime.
+    # pylint: disable=C6204
+    import tools.git_sync as git_sync
+    git_sync.sync_repo(
+        git_sync.Repo(git_repo, local_folder, branch=branch,
+                      sha_hash=sha_hash),
+        mirror_dir=self.git_mirror_dir)
+
+  def build_image(self):
+    """Builds the docker image unless one from the same inputs exists."""
+    # Modules are added to sys.path at runtime.
+    # pylint: disable=C6204
+    from bootstrap import image_cache
+    hash_image = None
+    if self.docker_reuse and self.docker_tag:
+      content_hash = image_cache.image_hash(self.docker_folder,
+                                            docker=self.docker)
+      if content_hash:
+        hash_image = image_cache.hash_image(self.docker_tag, content_hash)
+        if image_cache.image_exists(hash_image, docker=self.docker):
+          print('Reusing docker image {}'.format(hash_image))
+          self.run_local_command('{} tag {} {}'.format(
+              self.docker, hash_image, self.docker_tag))
+          return
 
-    if branch is not None:
-      branch_cmd = 'git -C {} checkout {}'.format(local_folder, branch)
-      self.run_local_command(branch_cmd)
+    # Build latest docker image.
+    # Build with --no-cache as some Dockerfile have pip installs and the rest of
+    # the docker may not be changing.
+    docker_build = ''
+    if self.docker_no_cache:
+      docker_build = '{} build --no-cache --pull -t {} {}'.format(
+          self.docker, self.docker_tag, self.docker_folder)
+    else:
+      docker_build = '{} build --pull -t {} {}'.format(
+          self.docker, self.docker_tag, self.docker_folder)
+    if hash_image:
+      docker_build = docker_build.replace(
+          ' -t ', ' -t {} -t '.format(hash_image), 1)
 
-    if sha_hash is not None:
-      sync_to_hash_cmd = 'git -C {} reset --hard {}'.format(
-          local_folder, sha_hash)
-      self.run_local_command(sync_to_hash_cmd)
+    self.run_local_command(docker_build)
+    if hash_image:
+      image_cache.prune(self.docker_tag, keep=self.docker_keep_images,
+                        docker=self.docker)
 
   def load_config(self, config_path):
     """Loads yaml file from path and returns dict."""
@@ -175,6 +229,8 @@ class Bootstrap(object):
         '--workspace=/workspace --test-config={} --framework={}')
     run_cmd = run_cmd.format(docker, extra_args, mounts, docker_image,
                              self.python, self.test_config, self.framework)
+    if self.shared_git_mirror_dir:
+      run_cmd += ' --git-mirror-dir={}'.format(DOCKER_GIT_MIRROR_DIR)
     return run_cmd
 
   def run_tests(self):
@@ -190,18 +246,7 @@ class Bootstrap(object):
         os.path.join(self.git_workspace, 'benchmark_harness'),
         branch=self.harness_branch)
 
-    # Build latest docker image.
-    # Build with --no-cache as some Dockerfile have pip installs and the rest of
-    # the docker may not be changing.
-    docker_build = ''
-    if self.docker_no_cache:
-      docker_build = 'docker build --no-cache --pull -t {} {}'.format(
-          self.docker_tag, self.docker_folder)
-    else:
-      docker_build = 'docker build --pull -t {} {}'.format(
-          self.docker_tag, self.docker_folder)
-
-    self.run_local_command(docker_build)
+    self.build_image()
 
     # Builds docker command, starts docker, and executes the command.
     bootstrap_config = self.load_config(self.bootstrap_config)
@@ -212,6 +257,10 @@ class Bootstrap(object):
 
     bootstrap_config['mount_point'].append(auth_tokens_mnt)
     bootstrap_config['mount_point'].append(workspace_mnt)
+    if self.shared_git_mirror_dir:
+      bootstrap_config['mount_point'].append(
+          dict([('folder_path', self.shared_git_mirror_dir),
+                ('docker_path', DOCKER_GIT_MIRROR_DIR)]))
 
     run_benchmarks = self.build_docker_cmd(bootstrap_config, self.docker_tag)
 
@@ -246,7 +295,13 @@ def main():
       pure_docker=FLAGS.pure_docker,
       docker_no_cache=FLAGS.docker_no_cache,
       bootstrap_log=bootstrap_log,
-      python=FLAGS.python)
+      python=FLAGS.python,
+      git_mirror_dir=FLAGS.git_mirror_dir,
+      docker_reuse=FLAGS.docker_reuse,
+      docker_keep_images=FLAGS.docker_keep_images,
+      docker=FLAGS.docker,
+      gpu_quiet_window=FLAGS.gpu_quiet_window,
+      gpu_quiet_timeout=FLAGS.gpu_quiet_timeout)
   bootstrap.run_tests()
 
 
@@ -260,6 +315,16 @@ if __name__ == '__main__':
   # Allows gpu-process-check to be turned off.
   parser.add_argument(
       '--no-gpu-process-check', dest='gpu_process_check', action='store_false')
+  parser.add_argument(
+      '--gpu-quiet-window',
+      type=float,
+      default=30,
+      help='Seconds the GPUs and CPUs must stay idle before tests start.')
+  parser.add_argument(
+      '--gpu-quiet-timeout',
+      type=float,
+      default=300,
+      help='Seconds to wait for the host to be idle before aborting.')
   parser.add_argument(
       '--pure-docker',
       type=bool,
@@ -321,6 +386,31 @@ if __name__ == '__main__':
   # Allows docker-no-cache to be turned off.
   parser.add_argument(
       '--no-docker-no-cache', dest='docker_no_cache', action='store_false')
+  parser.add_argument(
+      '--docker-reuse',
+      type=bool,
+      default=True,
+      help='Set to true to reuse an image built from the same Dockerfile, '
+      'base images and package versions.')
+  # Allows docker-reuse to be turned off.
+  parser.add_argument(
+      '--no-docker-reuse', dest='docker_reuse', action='store_false')
+  parser.add_argument(
+      '--docker-keep-images',
+      type=int,
+      default=5,
+      help='Images from earlier Dockerfiles and package versions kept.')
+  parser.add_argument(
+      '--docker',
+      type=str,
+      default='docker',
+      help='docker executable used to build images.')
+  parser.add_argument(
+      '--git-mirror-dir',
+      type=str,
+      default=None,
+      help='Folder of git mirrors shared by workspaces. Defaults to '
+      'cache/git_mirrors in the workspace.')
 
   FLAGS, unparsed = parser.parse_known_args()
   main()
@@ -142,3 +142,53 @@ class TestDockerBootstrap(unittest.TestCase):
         ' --workspace=/workspace --test-config=test_config.yaml'
         ' --framework=pytorch')
     process_check_mock.assert_called()
+
+  @patch('bootstrap.docker_bootstrap.Bootstrap.git_clone')
+  @patch('bootstrap.docker_bootstrap.Bootstrap.existing_process_check')
+  @patch('bootstrap.docker_bootstrap.Bootstrap._run_local_command')
+  def test_build_docker_cmd_git_mirror_dir(self, run_command_mock,
+                                           process_check_mock, _):
+    """Tests a shared git mirror folder is mounted and passed to docker."""
+    bootstrap = docker_bootstrap.Bootstrap(
+        '/docker_folder',
+        '/workspace',
+        'test_config.yaml',
+        docker_tag='tf_test/framework',
+        auth_token_dir='/test/auth_token',
+        git_mirror_dir='/shared/git_mirrors')
+
+    bootstrap.run_tests()
+    # Assumes last call was to kick off the docker image.
+    arg0 = run_command_mock.call_args[0][0]
+    self.assertEqual(
+        arg0, 'nvidia-docker run  --rm  '
+        '-v /test/auth_token:/auth_tokens -v /workspace:/workspace '
+        '-v /shared/git_mirrors:/git_mirrors '
+        'tf_test/framework python '
+        '/workspace/git/benchmark_harness/oss_bench/harness/controller.py'
+        ' --workspace=/workspace --test-config=test_config.yaml'
+        ' --framework=tensorflow --git-mirror-dir=/git_mirrors')
+    process_check_mock.assert_called()
+
+  @patch('tools.git_sync.sync_repo')
+  def test_git_clone(self, sync_repo_mock):
+    """Tests the harness is synced through the mirror in the workspace."""
+    bootstrap = docker_bootstrap.Bootstrap('/docker_folder', '/workspace',
+                                           'test_config.yaml')
+    bootstrap.git_clone('https://github.com/tfboyd/benchmark_harness.git',
+                        '/workspace/git/benchmark_harness', branch='dev')
+    repo = sync_repo_mock.call_args[0][0]
+    self.assertEqual('/workspace/git/benchmark_harness', repo.local_folder)
+    self.assertEqual('dev', repo.branch)
+    self.assertEqual('/workspace/cache/git_mirrors',
+                     sync_repo_mock.call_args[1]['mirror_dir'])
+
+  @patch('tools.quiescence.QuiescenceDetector')
+  def test_existing_process_check(self, detector_mock):
+    """Tests the host is checked with the configured quiet window."""
+    detector_mock.return_value.wait.return_value = False
+    bootstrap = docker_bootstrap.Bootstrap(
+        '/docker_folder', '/workspace', 'test_config.yaml',
+        gpu_quiet_window=10, gpu_quiet_timeout=60)
+    self.assertFalse(bootstrap.existing_process_check())
+    detector_mock.assert_called_with(window=10, timeout=60)
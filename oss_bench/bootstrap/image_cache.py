@@ -0,0 +1,236 @@
+"""Reuses docker images built from the same inputs.
+
+An image is identified by a hash of what goes into it:
+
+  * every file of the build context, which holds the Dockerfile,
+  * the id of each `FROM` image, pulled first so a new nightly base counts,
+  * the version pip would install for each package a `pip install` line does
+    not pin, looked up on PyPI.
+
+Images are tagged `<repo>:ctx-<hash>` and a build is skipped when the tag
+already exists. Only the newest `KEEP_IMAGES` hash tags of a repo are kept.
+If the version of a package cannot be resolved, e.g. it comes from another
+index with `-f`, there is no hash and the image is always built.
+
+Every call to docker goes through the `docker` executable passed in, which
+tests replace with a local stub.
+
+Example:
+  content_hash = image_cache.image_hash('docker/tensorflow/nightly_gpu')
+  image = image_cache.hash_image('tobyboyd/tf-gpu', content_hash)
+  if not image_cache.image_exists(image):
+    ...
+"""
+from __future__ import print_function
+import hashlib
+import json
+import os
+import re
+
+from six.moves import shlex_quote
+from six.moves.urllib import request
+import tools.local_command as local_command
+
+DOCKER = 'docker'
+# Hash tags kept for each image repo.
+KEEP_IMAGES = 5
+# Start of the tags of images named by their hash.
+HASH_TAG_PREFIX = 'ctx-'
+PYPI_URL = 'https://pypi.org/pypi/{}/json'
+# Seconds to wait for PyPI.
+PYPI_TIMEOUT = 10
+# pip options followed by a value.
+_PIP_VALUE_OPTIONS = ('-t', '--target', '--prefix', '--root', '--src',
+                      '--upgrade-strategy', '--progress-bar', '--log')
+# pip options that install from somewhere other than PyPI.
+_PIP_INDEX_OPTIONS = ('-f', '--find-links', '-i', '--index-url',
+                      '--extra-index-url', '-r', '--requirement', '-c',
+                      '--constraint', '-e', '--editable')
+
+
+def _docker(args, docker=DOCKER):
+  """Runs docker and returns tuple of return value and output."""
+  return local_command.run_local_command('{} {}'.format(docker, args))
+
+
+def context_hash(docker_folder):
+  """Returns sha256 of the paths and contents of the build context."""
+  digest = hashlib.sha256()
+  for root, dirs, files in os.walk(docker_folder):
+    dirs.sort()
+    for name in sorted(files):
+      path = os.path.join(root, name)
+      digest.update(os.path.relpath(path, docker_folder).encode('utf-8'))
+      digest.update(b'\0')
+      with open(path, 'rb') as f:
+        digest.update(f.read())
+      digest.update(b'\0')
+  return digest.hexdigest()
+
+
+def _instructions(dockerfile_text):
+  """Returns list of (instruction, args) with continued lines joined."""
+  text = re.sub(r'\\[ \t]*\n', ' ', dockerfile_text)
+  instructions = []
+  for line in text.splitlines():
+    line = line.strip()
+    if not line or line.startswith('#'):
+      continue
+    parts = line.split(None, 1)
+    instructions.append((parts[0].upper(), parts[1] if len(parts) > 1 else ''))
+  return instructions
+
+
+def base_images(dockerfile_text):
+  """Returns list of the images `FROM` lines build on.
+
+  Earlier stages of a multi-stage build and scratch are left out.
+  """
+  images = []
+  stages = set()
+  for instruction, args in _instructions(dockerfile_text):
+    if instruction != 'FROM':
+      continue
+    words = args.split()
+    if len(words) >= 3 and words[-2].lower() == 'as':
+      stages.add(words[-1])
+    if words[0] not in stages and words[0] != 'scratch':
+      images.append(words[0])
+  return images
+
+
+def unpinned_packages(dockerfile_text):
+  """Returns sorted packages pip installs from PyPI without a version.
+
+  Returns:
+    List of package names or None if a `pip install` uses another index or
+    a requirements file, whose versions cannot be resolved here.
+  """
+  packages = set()
+  for instruction, args in _instructions(dockerfile_text):
+    if instruction != 'RUN':
+      continue
+    for command in re.split(r'&&|;|\|\|', args):
+      words = command.split()
+      for i in range(len(words) - 1):
+        if re.match(r'^pip[0-9.]*$', os.path.basename(words[i])) and (
+            words[i + 1] == 'install'):
+          break
+      else:
+        continue
+      skip_value = False
+      for word in words[i + 2:]:
+        if skip_value:
+          skip_value = False
+          continue
+        option = word.split('=')[0]
+        if option in _PIP_INDEX_OPTIONS:
+          return None
+        if option in _PIP_VALUE_OPTIONS:
+          skip_value = '=' not in word
+          continue
+        if word.startswith('-'):
+          continue
+        # URLs, files and pinned versions are part of the Dockerfile.
+        if '://' in word or word.endswith('.whl') or '==' in word:
+          continue
+        packages.add(re.split(r'[\[<>=!~;]', word)[0].lower())
+  return sorted(packages)
+
+
+def pypi_version(package):
+  """Returns the latest version of `package` on PyPI or None."""
+  try:
+    response = request.urlopen(PYPI_URL.format(package), timeout=PYPI_TIMEOUT)
+    try:
+      return json.loads(response.read().decode('utf-8'))['info']['version']
+    finally:
+      response.close()
+  except Exception as e:  # pylint: disable=broad-except
+    print('Unable to look up version of {} on PyPI: {}'.format(package, e))
+    return None
+
+
+def image_id(image, docker=DOCKER, pull=False):
+  """Returns the id of a local image, pulled first if `pull`, or None."""
+  if pull:
+    _docker('pull {}'.format(shlex_quote(image)), docker=docker)
+  retval, stdout = _docker(
+      "image inspect --format '{{{{.Id}}}}' {}".format(shlex_quote(image)),
+      docker=docker)
+  if retval != 0:
+    return None
+  return stdout.strip()
+
+
+def image_hash(docker_folder, docker=DOCKER, pull=True):
+  """Returns hash of the inputs of an image or None if they are unknown.
+
+  Args:
+    docker_folder: Build context holding the Dockerfile.
+    docker: docker executable.
+    pull: Pull the base images first, as `docker build --pull` would.
+  """
+  dockerfile = os.path.join(docker_folder, 'Dockerfile')
+  if not os.path.isfile(dockerfile):
+    return None
+  with open(dockerfile) as f:
+    dockerfile_text = f.read()
+  inputs = {'context': context_hash(docker_folder), 'images': {},
+            'packages': {}}
+  for image in base_images(dockerfile_text):
+    inputs['images'][image] = image_id(image, docker=docker, pull=pull)
+    if inputs['images'][image] is None:
+      return None
+  packages = unpinned_packages(dockerfile_text)
+  if packages is None:
+    return None
+  for package in packages:
+    inputs['packages'][package] = pypi_version(package)
+    if inputs['packages'][package] is None:
+      return None
+  return hashlib.sha256(
+      json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _repo(docker_tag):
+  """Returns image repo of a tag, e.g. tobyboyd/tf-gpu of tobyboyd/tf-gpu:1."""
+  name, _, tag = docker_tag.rpartition(':')
+  if name and '/' not in tag:
+    return name
+  return docker_tag
+
+
+def hash_image(docker_tag, content_hash):
+  """Returns name of the image built from inputs with `content_hash`."""
+  return '{}:{}{}'.format(_repo(docker_tag), HASH_TAG_PREFIX,
+                          content_hash[:16])
+
+
+def image_exists(image, docker=DOCKER):
+  """Returns True if `image` is available locally."""
+  retval, _ = _docker('image inspect {}'.format(shlex_quote(image)),
+                      docker=docker)
+  return retval == 0
+
+
+def prune(docker_tag, keep=KEEP_IMAGES, docker=DOCKER):
+  """Removes all but the newest `keep` hash tags of the repo of `docker_tag`.
+
+  Returns:
+    List of images removed.
+  """
+  repo = _repo(docker_tag)
+  retval, stdout = _docker(
+      "images --format '{{{{.Tag}}}}' {}".format(shlex_quote(repo)),
+      docker=docker)
+  if retval != 0:
+    return []
+  # docker lists images newest first.
+  tags = [tag for tag in stdout.split() if tag.startswith(HASH_TAG_PREFIX)]
+  removed = []
+  for tag in tags[keep:]:
+    image = '{}:{}'.format(repo, tag)
+    if _docker('rmi {}'.format(shlex_quote(image)), docker=docker)[0] == 0:
+      removed.append(image)
+  return removed
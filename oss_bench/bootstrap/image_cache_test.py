@@ -0,0 +1,131 @@
+"""Tests image_cache module."""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from bootstrap import docker_bootstrap
+from bootstrap import image_cache
+from mock import patch
+
+DOCKERFILE = """# Comment with pip install ignored
+FROM nvidia/cuda:10.0-base-ubuntu18.04 as base
+FROM base
+RUN apt-get update && \\
+    pip install --upgrade pip==9.0.1 pyyaml
+RUN pip3 install --upgrade --force-reinstall https://host/tf.whl
+RUN pip install --upgrade google-cloud-bigquery[pandas]>=1.0 -t /opt psutil
+"""
+
+
+class TestImageCache(unittest.TestCase):
+  """Tests for reusing docker images with a stub docker CLI."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.docker_folder = os.path.join(self.tmp_dir, 'nightly_gpu')
+    os.makedirs(self.docker_folder)
+    self._write_dockerfile(DOCKERFILE)
+    self.state_file = os.path.join(self.tmp_dir, 'docker_state.json')
+    self._write_state({
+        'remote': {
+            'nvidia/cuda:10.0-base-ubuntu18.04': 'sha256:cuda1'
+        }
+    })
+    self.docker = '{} {} --state={}'.format(
+        sys.executable, 'bootstrap/test_config/docker_stub.py',
+        self.state_file)
+    patch_pypi = patch('bootstrap.image_cache.pypi_version')
+    self.pypi_version_mock = patch_pypi.start()
+    self.addCleanup(patch_pypi.stop)
+    self.versions = {'pyyaml': '5.1', 'google-cloud-bigquery': '1.11',
+                     'psutil': '5.6'}
+    self.pypi_version_mock.side_effect = self.versions.get
+
+  def _write_dockerfile(self, text):
+    with open(os.path.join(self.docker_folder, 'Dockerfile'), 'w') as f:
+      f.write(text)
+
+  def _write_state(self, state):
+    with open(self.state_file, 'w') as f:
+      json.dump(state, f)
+
+  def _state(self):
+    with open(self.state_file) as f:
+      return json.load(f)
+
+  def _bootstrap(self):
+    return docker_bootstrap.Bootstrap(
+        self.docker_folder, '/workspace', 'test_config.yaml',
+        docker_tag='tf_test/framework', docker_keep_images=2,
+        docker=self.docker)
+
+  def test_parse_dockerfile(self):
+    """Tests base images and unpinned pip packages are found."""
+    self.assertEqual(['nvidia/cuda:10.0-base-ubuntu18.04'],
+                     image_cache.base_images(DOCKERFILE))
+    self.assertEqual(['google-cloud-bigquery', 'psutil', 'pyyaml'],
+                     image_cache.unpinned_packages(DOCKERFILE))
+    self.assertIsNone(
+        image_cache.unpinned_packages(
+            'RUN pip3 install torch_nightly -f https://host/torch.html\n'))
+
+  def test_image_hash(self):
+    """Tests the hash changes with the Dockerfile, base and packages."""
+    first = image_cache.image_hash(self.docker_folder, docker=self.docker)
+    self.assertEqual(
+        first, image_cache.image_hash(self.docker_folder, docker=self.docker))
+    self.versions['psutil'] = '5.7'
+    second = image_cache.image_hash(self.docker_folder, docker=self.docker)
+    self.assertNotEqual(first, second)
+    state = self._state()
+    state['remote']['nvidia/cuda:10.0-base-ubuntu18.04'] = 'sha256:cuda2'
+    self._write_state(state)
+    third = image_cache.image_hash(self.docker_folder, docker=self.docker)
+    self.assertNotEqual(second, third)
+    self._write_dockerfile(DOCKERFILE + 'RUN echo changed\n')
+    self.assertNotEqual(
+        third, image_cache.image_hash(self.docker_folder, docker=self.docker))
+    del self.versions['psutil']
+    self.assertIsNone(
+        image_cache.image_hash(self.docker_folder, docker=self.docker))
+
+  @patch('bootstrap.docker_bootstrap.Bootstrap._run_local_command')
+  def test_build_image_reuse(self, run_command_mock):
+    """Tests the build is skipped when an image from the same inputs exists."""
+    run_command_mock.side_effect = (
+        lambda cmd: image_cache.local_command.LocalCommand(cmd).lines())
+    bootstrap = self._bootstrap()
+    bootstrap.build_image()
+    self.assertEqual(1, self._state()['builds'])
+    bootstrap.build_image()
+    self.assertEqual(1, self._state()['builds'])
+    self.assertEqual(['tag'], self._state()['calls'][-1][:1])
+
+    # A new package version builds a new image and old ones are pruned.
+    for version in ['5.7', '5.8', '5.9']:
+      self.versions['psutil'] = version
+      bootstrap.build_image()
+    state = self._state()
+    self.assertEqual(4, state['builds'])
+    hash_tags = [name for name in state['images'] if ':ctx-' in name]
+    self.assertEqual(2, len(hash_tags))
+    self.assertEqual(state['images']['tf_test/framework'],
+                     'sha256:build4')
+
+  @patch('bootstrap.docker_bootstrap.Bootstrap._run_local_command')
+  def test_build_image_no_reuse(self, run_command_mock):
+    """Tests images are always built when reuse is off."""
+    bootstrap = self._bootstrap()
+    bootstrap.docker_reuse = False
+    bootstrap.build_image()
+    self.assertEqual(
+        '{} build --no-cache --pull -t tf_test/framework {}'.format(
+            self.docker, self.docker_folder),
+        run_command_mock.call_args[0][0])
+    self.pypi_version_mock.assert_not_called()
@@ -0,0 +1,61 @@
+"""Stand-in for the docker CLI used by the image_cache tests.
+
+Keeps images in a JSON state file and records every call. Base images that
+can be pulled are listed under `remote` in the state file.
+
+Example:
+  python docker_stub.py --state=/tmp/state.json image inspect ubuntu
+"""
+from __future__ import print_function
+import json
+import sys
+
+
+def main(argv):
+  state_file = argv[0].split('=', 1)[1]
+  args = argv[1:]
+  with open(state_file) as f:
+    state = json.load(f)
+  state.setdefault('images', {})
+  state.setdefault('created', {})
+  state.setdefault('remote', {})
+  state.setdefault('calls', []).append(args)
+  retval = 0
+  command = args[0]
+  if command == 'pull':
+    if args[-1] in state['remote']:
+      state['images'][args[-1]] = state['remote'][args[-1]]
+    else:
+      retval = 1
+  elif command == 'image' and args[1] == 'inspect':
+    if args[-1] in state['images']:
+      print(state['images'][args[-1]])
+    else:
+      retval = 1
+  elif command == 'build':
+    state['builds'] = state.get('builds', 0) + 1
+    image_id = 'sha256:build{}'.format(state['builds'])
+    for i, arg in enumerate(args):
+      if arg == '-t':
+        state['images'][args[i + 1]] = image_id
+        state['created'][args[i + 1]] = state['builds']
+  elif command == 'tag':
+    state['images'][args[2]] = state['images'][args[1]]
+  elif command == 'images':
+    repo = args[-1]
+    tags = [name for name in state['images']
+            if name.rpartition(':')[0] == repo]
+    # Newest first, like docker.
+    tags.sort(key=lambda name: -state['created'].get(name, 0))
+    for name in tags:
+      print(name.rpartition(':')[2])
+  elif command == 'rmi':
+    if state['images'].pop(args[-1], None) is None:
+      retval = 1
+  with open(state_file, 'w') as f:
+    json.dump(state, f)
+  return retval
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -2,7 +2,6 @@
 from __future__ import print_function
 import argparse
 import os
-import subprocess
 import sys
 import yaml
 
@@ -31,13 +30,21 @@ class BenchmarkRunner(object):
       either absolute to the host or mounted path on docker if using docker.
     test_config (str): path to yaml config file.
     framework (str): framework to test.
+    git_mirror_dir (str, optional): Folder of the git mirrors repos are
+      fetched from, see `tools.git_sync`. Defaults to cache/git_mirrors in the
+      workspace.
   """
 
-  def __init__(self, workspace, test_config, framework='tensorflow'):
+  def __init__(self, workspace, test_config, framework='tensorflow',
+               git_mirror_dir=None):
     """Initalize the BenchmarkRunner with values."""
     self.workspace = workspace
     self.git_repo_base = os.path.join(self.workspace, 'git')
     self.logs_dir = os.path.join(self.workspace, 'logs')
+    # Holds results of probes, e.g. framework versions, between runs.
+    self.cache_dir = os.path.join(self.workspace, 'cache')
+    self.git_mirror_dir = git_mirror_dir or os.path.join(
+        self.workspace, 'cache', 'git_mirrors')
     self.test_config = test_config
     self.framework = framework
 
@@ -55,48 +62,52 @@ class BenchmarkRunner(object):
     if stdout:
       f = open(stdout, 'a')
       f.write(cmd + '\n')
-    for line in self._run_local_command(cmd):
-      line_str = line.decode('utf-8')
-      if line_str.strip('\n'):
-        print(line_str.strip('\n'))
-        if f:
-          f.write(line_str.strip('\n') + '\n')
+    try:
+      for lines in self._run_local_command(cmd):
+        lines = [line for line in lines if line]
+        if lines:
+          text = '\n'.join(lines)
+          print(text)
+          if f:
+            f.write(text + '\n')
+    finally:
+      if f:
+        f.close()
 
   def _run_local_command(self, cmd):
-    p = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-    while True:
-      retcode = p.poll()
-      line = p.stdout.readline()
-      yield line
-      if retcode is not None:
-        break
+    # Module cannot be loaded until benchmark_harness is added to sys.path.
+    # pylint: disable=C6204
+    import tools.local_command as local_command
+    command = local_command.LocalCommand(cmd)
+    for lines in command.lines():
+      yield lines
+    print('Harness CPU time: {:.3f}s'.format(command.harness_cpu_time))
 
   def _git_clone(self, git_repo, local_folder, branch=None, sha_hash=None):
     """Clone, update, or synce a repo.
 
-    If the clone already exists the repo will be updated via a pull.
-
     Args:
-      git_repo (str): Command to
+      git_repo (str): URL or path of the repo.
       local_folder (str): Where to clone repo into.
       branch (str, optional): Branch to checkout.
       sha_hash (str, optional): Hash to sync to.
     """
-    if os.path.isdir(local_folder):
-      git_clone_or_pull = 'git -C {} pull'.format(local_folder)
-    else:
-      git_clone_or_pull = 'git clone {} {}'.format(git_repo, local_folder)
-    self.run_local_command(git_clone_or_pull)
+    self._sync_repos([
+        dict(git_repo=git_repo, local_folder=local_folder, branch=branch,
+             sha_hash=sha_hash)
+    ])
 
-    if branch is not None:
-      branch_cmd = 'git -C {} checkout {}'.format(local_folder, branch)
-      self.run_local_command(branch_cmd)
+  def _sync_repos(self, repos):
+    """Syncs repos at once with shallow fetches through the git mirrors.
 
-    if sha_hash is not None:
-      sync_to_hash_cmd = 'git -C {} reset --hard {}'.format(
-          local_folder, sha_hash)
-      self.run_local_command(sync_to_hash_cmd)
+    Args:
+      repos (list): dicts of the args of `_git_clone`.
+    """
+    # Module cannot be loaded until benchmark_harness is added to sys.path.
+    # pylint: disable=C6204
+    import tools.git_sync as git_sync
+    git_sync.sync_repos([git_sync.Repo(**repo) for repo in repos],
+                        mirror_dir=self.git_mirror_dir)
 
   def _tf_model_bench(self, auto_config):
     """Runs tf model benchmarks.
@@ -160,7 +171,8 @@ class BenchmarkRunner(object):
         config,
         os.path.join(self.logs_dir, 'tf_cnn_workspace'),
         tf_cnn_bench_path,
-        auto_test_config=auto_config)
+        auto_test_config=auto_config,
+        cache_dir=self.cache_dir)
     test_runner.run_tests()
 
   def _load_config(self):
@@ -180,12 +192,13 @@ class BenchmarkRunner(object):
     information is stored in test_config for downstream tests to store
     as part of their results.
     """
-    self._git_clone('https://github.com/tensorflow/benchmarks.git',
-                    os.path.join(self.git_repo_base, 'benchmarks'))
-
-    self._git_clone('https://github.com/tfboyd/models.git',
-                    os.path.join(self.git_repo_base, 'tf_models'),
-                    branch='resnet_perf_tweaks')
+    self._sync_repos([
+        dict(git_repo='https://github.com/tensorflow/benchmarks.git',
+             local_folder=os.path.join(self.git_repo_base, 'benchmarks')),
+        dict(git_repo='https://github.com/tfboyd/models.git',
+             local_folder=os.path.join(self.git_repo_base, 'tf_models'),
+             branch='resnet_perf_tweaks'),
+    ])
 
   def _make_logs_dir(self):
     try:
@@ -236,7 +249,8 @@ class BenchmarkRunner(object):
     import tools.tf_version as tf_version
 
     # Sets system GPU info on test_config for child modules to consume.
-    version, git_version = tf_version.get_tf_full_version()
+    version, git_version = tf_version.get_tf_full_version(
+        cache_dir=self.cache_dir)
     test_config['framework_version'] = version
     test_config['framework_describe'] = git_version
 
@@ -298,11 +312,12 @@ class BenchmarkRunner(object):
                               'mxnet_repo/example/image-classification')
 
     # pylint: disable=C6204
-    import mxnet as mx
+    import tools.framework_version as framework_version
     # pylint: disable=C6204
     from test_runners.mxnet import runner
-    test_config['framework_version'] = mx.__version__
-    test_config['framework_describe'] = mx.__version__
+    test_config['framework_version'], test_config[
+        'framework_describe'] = framework_version.get_version(
+            'mxnet', cache_dir=self.cache_dir)
 
     tested = self.check_if_run(test_config, 'mxnet')
     if not tested:
@@ -328,9 +343,10 @@ class BenchmarkRunner(object):
     bench_home = os.path.join(self.git_repo_base, 'pytorch_examples')
 
     # pylint: disable=C6204
-    import torch
-    test_config['framework_version'] = torch.__version__
-    test_config['framework_describe'] = torch.__version__
+    import tools.framework_version as framework_version
+    test_config['framework_version'], test_config[
+        'framework_describe'] = framework_version.get_version(
+            'pytorch', cache_dir=self.cache_dir)
     # pylint: disable=C6204
     from test_runners.pytorch import runner
 
@@ -369,19 +385,30 @@ class BenchmarkRunner(object):
       # pylint: disable=C6204
       import tools.nvidia as nvidia
       test_config['gpu_driver'], test_config[
-          'accel_type'] = nvidia.get_gpu_info()
+          'accel_type'] = nvidia.get_gpu_info(cache_dir=self.cache_dir)
 
     # Modules are loaded by this function.
     # pylint: disable=C6204
     import tools.cpu as cpu_info
     cpu_data = {}
     cpu_data['model_name'], cpu_data['socket_count'], cpu_data[
-        'core_count'], cpu_data['cpu_info'] = cpu_info.get_cpu_info()
+        'core_count'], cpu_data['cpu_info'] = cpu_info.get_cpu_info(
+            cache_dir=self.cache_dir)
     test_config['cpu_info'] = cpu_data
     global tracker
     # pylint: disable=C6204
     # pylint: disable=W0621
     import tools.tracker as tracker
+    # pylint: disable=C6204
+    import upload.result_upload as result_upload
+    # Rows are spooled in the workspace and uploaded in the background. Rows
+    # a crashed or offline run left behind are sent first.
+    result_upload.set_spool_dir(os.path.join(self.workspace, 'spool'))
+    # pylint: disable=C6204
+    from test_runners.common import result_index
+    # Runs already parsed by an earlier report are read from the index.
+    result_index.set_index_path(
+        os.path.join(self.cache_dir, result_index.INDEX_FILE))
 
     if self.framework == 'tensorflow':
       self.run_tensorflow_tests(test_config)
@@ -392,10 +419,14 @@ class BenchmarkRunner(object):
     else:
       raise ValueError('framework needs to be set to tensorflow or mxnet')
 
+    # Sends the rows still waiting in the spool.
+    result_upload.flush_all()
+
 
 def main():
   runner = BenchmarkRunner(
-      FLAGS.workspace, FLAGS.test_config, framework=FLAGS.framework)
+      FLAGS.workspace, FLAGS.test_config, framework=FLAGS.framework,
+      git_mirror_dir=FLAGS.git_mirror_dir)
   runner.run_tests()
 
 
@@ -416,6 +447,12 @@ if __name__ == '__main__':
       type=str,
       default='tensorflow',
       help='Framework to be tested.')
+  parser.add_argument(
+      '--git-mirror-dir',
+      type=str,
+      default=None,
+      help='Folder of git mirrors shared by workspaces. Defaults to '
+      'cache/git_mirrors in the workspace.')
   FLAGS, unparsed = parser.parse_known_args()
 
   main()
@@ -6,7 +6,6 @@ import sys
 import unittest
 
 from harness import controller
-from mock import Mock
 from mock import patch
 import tools.tracker as tracker
 import yaml
@@ -39,6 +38,9 @@ class TestBenchmarkRunner(unittest.TestCase):
     check_state.assert_called()
     clone_repos_mock.assert_called()
     mock_make_dirs.assert_called()
+    self.mock_set_spool_dir.assert_called_with('/workspace/spool')
+    self.mock_set_index_path.assert_called_with(
+        '/workspace/cache/result_index.sqlite')
     store_repo_info.assert_called()
     mock_gpu_info.assert_called()
     mock_cpu_info.assert_called()
@@ -152,6 +154,7 @@ class TestBenchmarkRunner(unittest.TestCase):
     self.assertEqual(arg0[2],
                      '/workspace/git/benchmarks/scripts/tf_cnn_benchmarks')
     self.assertEqual(call_args[1]['auto_test_config'], auto_config)
+    self.assertEqual(call_args[1]['cache_dir'], '/workspace/cache')
 
   @patch('test_runners.tf_models.runner.TestRunner')
   def test_tf_model_bench(self, test_runner_mock):
@@ -241,6 +244,20 @@ class TestBenchmarkRunner(unittest.TestCase):
     entry = saved_object[key]
     self.assertIn('pytorch', entry['tests'])
 
+  @patch('tools.git_sync.sync_repos')
+  def test_clone_tf_repos(self, sync_repos_mock):
+    """Tests tf repos are synced together through the workspace mirrors."""
+    benchmark_runner = controller.BenchmarkRunner(
+        '/workspace', None, framework='tensorflow')
+    benchmark_runner._clone_tf_repos()
+
+    repos = sync_repos_mock.call_args[0][0]
+    self.assertEqual(['/workspace/git/benchmarks', '/workspace/git/tf_models'],
+                     [repo.local_folder for repo in repos])
+    self.assertEqual('resnet_perf_tweaks', repos[1].branch)
+    self.assertEqual('/workspace/cache/git_mirrors',
+                     sync_repos_mock.call_args[1]['mirror_dir'])
+
   @patch('tools.git_info.git_repo_last_commit_id')
   @patch('tools.git_info.git_repo_describe')
   def test_store_repo_info(self, git_describe, git_last_commit_id):
@@ -269,6 +286,9 @@ class TestBenchmarkRunner(unittest.TestCase):
     patch_cpu_info = patch('tools.cpu.get_cpu_info')
     patch_make_dirs = patch('harness.controller.BenchmarkRunner._make_logs_dir')
     patch_git_clone = patch('harness.controller.BenchmarkRunner._git_clone')
+    patch_set_spool_dir = patch('upload.result_upload.set_spool_dir')
+    patch_set_index_path = patch(
+        'test_runners.common.result_index.set_index_path')
 
     mock_cpu_info = patch_cpu_info.start()
     mock_cpu_info.return_value = ['XEON 2600E 2.0Ghz', 2, 64, 'Lots of foo']
@@ -276,27 +296,38 @@ class TestBenchmarkRunner(unittest.TestCase):
     mock_gpu_info.return_value = gpu_info
     mock_make_dirs = patch_make_dirs.start()
     mock_git_clone = patch_git_clone.start()
+    self.mock_set_spool_dir = patch_set_spool_dir.start()
+    self.mock_set_index_path = patch_set_index_path.start()
 
     self.addCleanup(patch_cpu_info.stop)
     self.addCleanup(patch_gpu_info.stop)
     self.addCleanup(patch_make_dirs.stop)
     self.addCleanup(patch_git_clone.stop)
+    self.addCleanup(patch_set_spool_dir.stop)
+    self.addCleanup(patch_set_index_path.stop)
 
     return mock_git_clone, mock_make_dirs, mock_gpu_info, mock_cpu_info
 
   def _patch_mxnet(self, version='1_0_0'):
-    mxnet_mock = Mock(__version__=version)
-    modules = {'mxnet': mxnet_mock}
-    mock_modules = patch.dict('sys.modules', modules)
-    mock_modules.start()
-    self.addCleanup(mock_modules.stop)
+    self._patch_framework_version('mxnet', version)
 
   def _patch_pytorch(self, version='1_0_0'):
-    pytorch_mock = Mock(__version__=version)
-    modules = {'torch': pytorch_mock}
-    mock_modules = patch.dict('sys.modules', modules)
-    mock_modules.start()
-    self.addCleanup(mock_modules.stop)
+    self._patch_framework_version('pytorch', version)
+
+  def _patch_framework_version(self, framework, version):
+    """Patches the version probe and verifies no framework is imported."""
+    patch_version = patch('tools.framework_version.get_version')
+    mock_version = patch_version.start()
+    mock_version.return_value = (version, version)
+    self.addCleanup(patch_version.stop)
+    self.addCleanup(self._assert_frameworks_not_imported)
+    self.addCleanup(mock_version.assert_called_with,
+                    framework,
+                    cache_dir='/workspace/cache')
+
+  def _assert_frameworks_not_imported(self):
+    for module in ['tensorflow', 'mxnet', 'torch']:
+      self.assertNotIn(module, sys.modules)
 
   def _mock_state_object(self, framework, channel, build_type, tests):
     """Returns state object for testing."""
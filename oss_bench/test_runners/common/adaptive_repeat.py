@@ -0,0 +1,213 @@
+"""Runs copies of a test until the copies agree, rather than a fixed count.
+
+Tests run `repeat` copies by default. A test config setting `max_repeat`
+above `min_repeat` runs copies one at a time instead. After each copy the
+throughput of the finished copies is checked and no more are run once either
+their coefficient of variation is at most `repeat_cv` or the relative half
+width of the bootstrap confidence interval of their mean is at most
+`repeat_ci`. Noisy tests get up to `max_repeat` copies. Why a test stopped
+is written to the suite folder, see `util.load_repeat_info`.
+
+Example:
+  adaptive_repeat.run_copies(
+      test_config,
+      lambda copy: self.run_benchmark(test_config, instance, copy=copy))
+"""
+from __future__ import print_function
+
+import os
+
+import numpy
+from test_runners.common import journal
+from test_runners.common import steady_state
+from test_runners.common import time_series
+from test_runners.common import util
+
+# Coefficient of variation used when neither threshold is configured.
+DEFAULT_CV = 0.01
+BOOTSTRAP_RESAMPLES = 2000
+
+# Reasons a test stopped adding copies.
+FIXED = 'fixed'
+CV = 'cv'
+CI = 'ci'
+MAX_COPIES = 'max_copies'
+
+
+def coefficient_of_variation(values):
+  """Returns sample std over mean of `values`, inf for fewer than two."""
+  x = numpy.asarray(values, dtype=numpy.float64)
+  if len(x) < 2 or x.mean() == 0:
+    return float('inf')
+  return float(x.std(ddof=1) / abs(x.mean()))
+
+
+def bootstrap_ci(values, confidence=0.95, resamples=BOOTSTRAP_RESAMPLES,
+                 seed=0):
+  """Returns half width of the bootstrap CI of the mean over the mean.
+
+  The percentile interval of the means of `resamples` resamples of `values`.
+  Seeded so the same copies always lead to the same decision.
+
+  Args:
+    values: Throughput of each copy.
+    confidence: Fraction of resampled means inside the interval.
+    resamples: Number of resamples.
+    seed: Seed of the resampling.
+
+  Returns:
+    float, inf for fewer than two values or a mean of 0.
+  """
+  x = numpy.asarray(values, dtype=numpy.float64)
+  if len(x) < 2 or x.mean() == 0:
+    return float('inf')
+  rng = numpy.random.RandomState(seed)
+  means = x[rng.randint(0, len(x), size=(resamples, len(x)))].mean(axis=1)
+  tail = (1 - confidence) / 2 * 100
+  low, high = numpy.percentile(means, [tail, 100 - tail])
+  return float((high - low) / 2 / abs(x.mean()))
+
+
+def copy_throughput(result_dir):
+  """Returns steady state throughput of a finished copy, None if unknown.
+
+  Read from the copy's time series, see `time_series`, so it works the same
+  for every harness.
+  """
+  steps = time_series.load(result_dir, mmap_mode=None)
+  if steps is None:
+    return None
+  rates = steps['throughput'][~numpy.isnan(steps['throughput'])]
+  rates = rates[rates > 0]
+  if not len(rates):
+    return None
+  warmup = steady_state.detect_warmup(rates)
+  return util.throughput_stats(util.rate_windows(rates[warmup:]))['throughput']
+
+
+class RepeatController(object):
+  """Decides after each copy of a test whether to run another.
+
+  Args:
+    min_copies (int): Copies always run.
+    max_copies (int, optional): Most copies run. Defaults to `min_copies`,
+      which runs a fixed number of copies.
+    cv_threshold (float, optional): Stop once the coefficient of variation of
+      the copies' throughput is at most this.
+    ci_threshold (float, optional): Stop once the relative half width of the
+      bootstrap CI of the mean throughput is at most this.
+  """
+
+  def __init__(self, min_copies, max_copies=None, cv_threshold=None,
+               ci_threshold=None):
+    self.min_copies = max(int(min_copies), 1)
+    self.max_copies = max(int(max_copies or min_copies), self.min_copies)
+    self.adaptive = self.max_copies > self.min_copies
+    if self.adaptive and cv_threshold is None and ci_threshold is None:
+      cv_threshold = DEFAULT_CV
+    self.cv_threshold = cv_threshold
+    self.ci_threshold = ci_threshold
+    self.copies = 0
+    self.values = []
+    self.cv = None
+    self.ci = None
+    self.stop_reason = None
+
+  @classmethod
+  def from_config(cls, test_config):
+    """Returns controller for `repeat` and `util.REPEAT_KEYS` of a config.
+
+    OOM tests search for a batch size rather than measure throughput and
+    always run `repeat` copies.
+    """
+    repeat = int(test_config.get('repeat', 1))
+    if test_config.get('oom_test') or not test_config.get('max_repeat'):
+      return cls(repeat)
+    return cls(
+        test_config.get('min_repeat', min(repeat, 2)),
+        max_copies=test_config['max_repeat'],
+        cv_threshold=test_config.get('repeat_cv'),
+        ci_threshold=test_config.get('repeat_ci'))
+
+  def add_copy(self, result_dir):
+    """Records a finished copy, whose results are in `result_dir`."""
+    self.copies += 1
+    if not self.adaptive or not result_dir:
+      return
+    value = copy_throughput(result_dir)
+    if value:
+      self.values.append(value)
+
+  def done(self):
+    """Returns True once no more copies should be run."""
+    if self.stop_reason is not None:
+      return True
+    if not self.adaptive:
+      if self.copies >= self.min_copies:
+        self.stop_reason = FIXED
+    elif self.copies >= self.max_copies:
+      self.stop_reason = MAX_COPIES
+    elif self.copies >= self.min_copies and len(self.values) >= 2:
+      self.cv = coefficient_of_variation(self.values)
+      self.ci = bootstrap_ci(self.values)
+      if self.cv_threshold is not None and self.cv <= self.cv_threshold:
+        self.stop_reason = CV
+      elif self.ci_threshold is not None and self.ci <= self.ci_threshold:
+        self.stop_reason = CI
+    return self.stop_reason is not None
+
+  def info(self):
+    """Returns dict describing the copies run and why they stopped."""
+    return {
+        'copies': self.copies,
+        'measured_copies': len(self.values),
+        'stop_reason': self.stop_reason,
+        'min_copies': self.min_copies,
+        'max_copies': self.max_copies,
+        'cv': self.cv,
+        'ci': self.ci,
+        'cv_threshold': self.cv_threshold,
+        'ci_threshold': self.ci_threshold,
+    }
+
+
+def run_copies(test_config, run_fn, run_journal=None):
+  """Runs copies of a test with `run_fn` until `RepeatController` is done.
+
+  Args:
+    test_config: Config of the test, see `RepeatController.from_config`.
+    run_fn: Called with the copy index, returns the copy's result_dir.
+    run_journal: `journal.Journal` recording each copy. Copies it has as
+      finished are not run again.
+
+  Returns:
+    The `RepeatController`.
+  """
+  run_journal = run_journal or journal.Journal()
+  controller = RepeatController.from_config(test_config)
+  finished = run_journal.resume(test_config)
+  result_dir = None
+  while not controller.done():
+    copy = controller.copies
+    if copy < len(finished):
+      result_dir = finished[copy]
+    else:
+      run_journal.start(test_config, copy)
+      result_dir = run_fn(copy)
+      run_journal.finish(test_config, copy, result_dir)
+    controller.add_copy(result_dir)
+  finish(controller, result_dir)
+  return controller
+
+
+def finish(controller, result_dir):
+  """Prints and, for adaptive tests, saves why copies stopped.
+
+  Args:
+    controller: `RepeatController` that is done.
+    result_dir: Folder of the last copy, its parent is the suite folder.
+  """
+  print('Ran {} copies, stopped by {}.'.format(controller.copies,
+                                                controller.stop_reason))
+  if controller.adaptive and result_dir:
+    util.write_repeat_info(os.path.dirname(result_dir), controller.info())
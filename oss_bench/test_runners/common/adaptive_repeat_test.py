@@ -0,0 +1,119 @@
+"""Tests adaptive_repeat module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from test_runners.common import adaptive_repeat
+from test_runners.common import journal
+from test_runners.common import time_series
+from test_runners.common import util
+
+
+class TestAdaptiveRepeat(unittest.TestCase):
+  """Tests for running copies until they agree."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+  def test_fixed(self):
+    """Tests configs without max_repeat run exactly `repeat` copies."""
+    controller = adaptive_repeat.RepeatController.from_config({'repeat': 3})
+    self.assertFalse(controller.adaptive)
+    copies = []
+    while not controller.done():
+      copies.append(controller.copies)
+      controller.add_copy(None)
+    self.assertEqual([0, 1, 2], copies)
+    self.assertEqual(adaptive_repeat.FIXED, controller.stop_reason)
+
+  def test_oom_test_fixed(self):
+    """Tests OOM tests ignore max_repeat."""
+    controller = adaptive_repeat.RepeatController.from_config(
+        {'repeat': 1, 'max_repeat': 5, 'oom_test': True})
+    self.assertFalse(controller.adaptive)
+
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  def test_stable_stops_early(self, copy_throughput_mock):
+    """Tests copies that agree stop before `repeat` copies."""
+    copy_throughput_mock.side_effect = [100.0, 100.5, 100.2]
+    controller = adaptive_repeat.RepeatController.from_config(
+        {'repeat': 3, 'max_repeat': 10, 'repeat_cv': 0.01})
+    while not controller.done():
+      controller.add_copy('/results/suite/copy')
+    self.assertEqual(2, controller.copies)
+    self.assertEqual(adaptive_repeat.CV, controller.stop_reason)
+    self.assertLess(controller.cv, 0.01)
+
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  def test_noisy_runs_to_cap(self, copy_throughput_mock):
+    """Tests copies that disagree add copies up to max_repeat."""
+    copy_throughput_mock.side_effect = [100.0, 150.0] * 5
+    controller = adaptive_repeat.RepeatController.from_config(
+        {'repeat': 3, 'max_repeat': 6, 'repeat_ci': 0.01})
+    while not controller.done():
+      controller.add_copy('/results/suite/copy')
+    self.assertEqual(6, controller.copies)
+    self.assertEqual(adaptive_repeat.MAX_COPIES, controller.stop_reason)
+    self.assertGreater(controller.ci, 0.01)
+
+  def test_bootstrap_ci(self):
+    """Tests the interval is deterministic and narrows with agreement."""
+    noisy = [100, 120, 90, 110]
+    self.assertEqual(adaptive_repeat.bootstrap_ci(noisy),
+                     adaptive_repeat.bootstrap_ci(noisy))
+    self.assertLess(adaptive_repeat.bootstrap_ci([100, 101, 99, 100]),
+                    adaptive_repeat.bootstrap_ci(noisy))
+    self.assertEqual(float('inf'), adaptive_repeat.bootstrap_ci([100]))
+
+  def test_copy_throughput(self):
+    """Tests throughput is read from the copy's time series."""
+    result_dir = os.path.join(self.tmp_dir, 'copy_0')
+    os.makedirs(result_dir)
+    self.assertIsNone(adaptive_repeat.copy_throughput(result_dir))
+    time_series.write_records(
+        result_dir, [{'step': i, 'value': 200.0} for i in range(10)])
+    self.assertAlmostEqual(200, adaptive_repeat.copy_throughput(result_dir))
+
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  def test_run_copies(self, copy_throughput_mock):
+    """Tests copies are run and the reason is saved for reporting."""
+    copy_throughput_mock.return_value = 100.0
+    result_dir = os.path.join(self.tmp_dir, 'copy')
+    copies = []
+
+    def run_fn(copy):
+      copies.append(copy)
+      return result_dir
+
+    config = {'repeat': 3, 'max_repeat': 5}
+    controller = adaptive_repeat.run_copies(config, run_fn)
+    self.assertEqual([0, 1], copies)
+    repeat_info = util.load_repeat_info(self.tmp_dir)
+    self.assertEqual(controller.info(), repeat_info)
+    self.assertEqual(adaptive_repeat.CV, repeat_info['stop_reason'])
+
+  def test_run_copies_resume(self):
+    """Tests copies finished by an interrupted run are not run again."""
+    run_journal = journal.Journal(
+        os.path.join(self.tmp_dir, journal.JOURNAL_FILE), key='build')
+    config = {'repeat': 3, 'test_id': 'test', 'test_suite_start_time': 'a'}
+    finished_dir = os.path.join(self.tmp_dir, 'copy_0')
+    os.makedirs(finished_dir)
+    run_journal.finish(config, 0, finished_dir)
+    copies = []
+
+    def run_fn(copy):
+      copies.append(copy)
+      return os.path.join(self.tmp_dir, 'copy_{}'.format(copy))
+
+    config['test_suite_start_time'] = 'b'
+    controller = adaptive_repeat.run_copies(config, run_fn,
+                                            run_journal=run_journal)
+    self.assertEqual([1, 2], copies)
+    self.assertEqual(3, controller.copies)
+    self.assertEqual('a', config['test_suite_start_time'])
@@ -1,12 +1,9 @@
 """Util to execute commands in the local shell"""
 from __future__ import print_function
-import os
-import time
-from contextlib import contextmanager
-from subprocess import call
-import signal
 import threading
-import subprocess
+import time
+
+import tools.local_command as local_command
 
 
 class LocalInstance(object):
@@ -15,6 +12,11 @@ class LocalInstance(object):
     self.hostname = host
     self.virtual_env_path = virtual_env_path
     self.kill = False
+    self.command = None
+    # CPU seconds the harness spent pumping output of the last command.
+    self.harness_cpu_time = 0.0
+    # Resource usage of the last command's process group, see `proc_stats`.
+    self.resource_usage = None
 
   @property
   def state(self):
@@ -45,11 +47,24 @@ class LocalInstance(object):
                              command,
                              stdout_file=None,
                              stderr_file=None,
-                             print_error=False):
+                             print_error=False,
+                             stop_conditions=None):
+    """Runs command in a thread and returns the thread.
+
+    Args:
+      command: Command to run.
+      stdout_file: File to append stdout and stderr to.
+      stderr_file: Not used, stderr is written to stdout_file.
+      print_error: Not used.
+      stop_conditions: List of `stop_condition.StopCondition` checked against
+        each line of output. The processes are killed as soon as one fires.
+    """
     self.kill = False
     command = self.addVirtualEnv(command)
     t = threading.Thread(
-        target=self.runLocalCommand, args=[command, stdout_file])
+        target=self.runLocalCommand,
+        args=[command, stdout_file],
+        kwargs={'stop_conditions': stop_conditions})
     t.start()
     return t
 
@@ -59,40 +74,68 @@ class LocalInstance(object):
       cmd = 'source {};{}'.format(self.virtual_env_path, cmd)
     return cmd
 
-  def runLocalCommand(self, cmd, stdout=None):
+  def runLocalCommand(self, cmd, stdout=None, stop_conditions=None):
     f = None
     if stdout:
       f = open(stdout, 'a', 1)
       f.write(cmd + '\n')
-    for line in self.run_command(cmd):
-      line = line.decode('utf-8')
-      if (line.strip('\n')):
-        print(line.strip('\n'))
-        if f:
-          f.write(line.strip('\n') + '\n')
+    stop_conditions = stop_conditions or []
+    start_time = time.time()
+    for condition in stop_conditions:
+      condition.start(start_time)
+    try:
+      for lines in self.run_command(cmd):
+        lines = [line for line in lines if line]
+        if lines:
+          text = '\n'.join(lines)
+          print(text)
+          if f:
+            f.write(text + '\n')
+          if stop_conditions and not self.kill:
+            self._check_stop_conditions(lines, stop_conditions)
+    finally:
+      if f:
+        f.close()
+    print('Harness CPU time: {:.3f}s'.format(self.harness_cpu_time))
+
+  def _check_stop_conditions(self, lines, stop_conditions):
+    """Kills the processes if any line satisfies a stop condition."""
+    for line in lines:
+      for condition in stop_conditions:
+        if condition.check(line):
+          print('Stop condition met: {}'.format(condition))
+          self.kill_processes()
+          return
 
   def kill_processes(self):
     self.kill = True
-
-  def run_command(
-      self,
-      cmd,
-  ):
-    p = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        shell=True,
-        preexec_fn=os.setsid)
-    while True:
-      if self.kill:
-        print('Kill process:{}'.format(p.pid))
-        os.killpg(os.getpgid(p.pid), signal.SIGTERM)
-      retcode = p.poll()
-      line = p.stdout.readline()
-      yield line
-      if (retcode is not None):
-        break
+    command = self.command
+    if command:
+      print('Kill process:{}'.format(command.pid))
+      command.kill()
+
+  def run_command(self, cmd):
+    """Runs cmd in its own process group and yields its output.
+
+    Args:
+      cmd: Command to run.
+
+    Yields:
+      Lists of lines from stdout and stderr as they are written.
+    """
+    command = local_command.LocalCommand(cmd, new_session=True)
+    command.start()
+    self.command = command
+    # Catches a kill requested before the process group existed.
+    if self.kill:
+      self.kill_processes()
+    try:
+      for lines in command.lines():
+        yield lines
+    finally:
+      self.command = None
+      self.harness_cpu_time = command.harness_cpu_time
+      self.resource_usage = command.resource_usage
 
 
 def UseLocalInstances(virtual_env_path=''):
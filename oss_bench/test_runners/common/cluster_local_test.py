@@ -0,0 +1,47 @@
+"""Tests cluster_local module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from test_runners.common import cluster_local
+from test_runners.common import stop_condition
+
+
+class TestLocalInstance(unittest.TestCase):
+  """Tests for LocalInstance."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+  def test_execute_command_in_thread(self):
+    """Tests output is written to the stdout file without blank lines."""
+    stdout_file = os.path.join(self.tmp_dir, 'worker_0_stdout.log')
+    instance = cluster_local.UseLocalInstances()
+    t = instance.ExecuteCommandInThread('echo foo; echo; echo bar >&2',
+                                        stdout_file)
+    t.join()
+    with open(stdout_file) as f:
+      lines = f.read().splitlines()
+    self.assertEqual('foo', lines[1])
+    self.assertEqual('bar', lines[-1])
+    self.assertEqual(3, len(lines))
+
+  def test_stop_condition_kills(self):
+    """Tests a stop condition kills the command as soon as it matches."""
+    stdout_file = os.path.join(self.tmp_dir, 'worker_0_stdout.log')
+    instance = cluster_local.UseLocalInstances()
+    stop = stop_condition.StepStop(r'step = (\d+)', 3)
+    cmd = 'for i in 1 2 3 4 5; do echo "step = $i"; sleep 0.05; done; sleep 30'
+    start = time.time()
+    t = instance.ExecuteCommandInThread(
+        cmd, stdout_file, stop_conditions=[stop])
+    t.join()
+    self.assertLess(time.time() - start, 10)
+    self.assertTrue(stop.fired)
+    self.assertEqual(3, stop.step)
+    self.assertLess(stop.elapsed_ms, 5000)
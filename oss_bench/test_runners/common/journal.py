@@ -0,0 +1,217 @@
+"""Journal of finished test copies so a crashed run resumes where it stopped.
+
+`tools.tracker` only records a harness once all of its tests are done, so a
+run that crashes part way starts every test of the harness again. Runners of
+a tracked run, `track` in the harness config, also append a line to
+`JOURNAL_FILE` in their workspace before each copy starts and after it
+finishes, and once the suite is reported. Lines are flushed to disk before
+the copy is launched.
+
+On restart the copies already finished are not run again. Their result
+folders are reused, so the suite keeps its folder and is aggregated from the
+old and new copies together. Folders left by a copy that was interrupted are
+moved to `INCOMPLETE_DIR` in the workspace, outside of `results`, so neither
+the suite nor `reprocess` reports them. Suites that
+were reported are skipped. Lines of other framework builds, channels or
+build types are dropped when the journal is opened.
+
+Example:
+  run_journal = journal.open_journal(workspace, auto_test_config)
+  finished = run_journal.resume(test_config)
+  run_journal.start(test_config, copy)
+  result_dir = run_benchmark(test_config, copy)
+  run_journal.finish(test_config, copy, result_dir)
+"""
+from __future__ import print_function
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+JOURNAL_FILE = 'journal.jsonl'
+# Folder of the workspace that interrupted copies are moved to.
+INCOMPLETE_DIR = 'incomplete'
+
+# Events of a journal line.
+START = 'start'
+FINISH = 'finish'
+REPORTED = 'reported'
+
+
+def run_key(auto_test_config):
+  """Returns key of the build under test, None if the run is not tracked."""
+  if not auto_test_config or not auto_test_config.get('track'):
+    return None
+  key_str = '{}{}{}'.format(auto_test_config.get('channel'),
+                            auto_test_config.get('build_type'),
+                            auto_test_config.get('framework_describe'))
+  return hashlib.sha1(key_str.encode()).hexdigest()
+
+
+def open_journal(workspace, auto_test_config):
+  """Returns `Journal` of the runner workspace, disabled if not tracked."""
+  key = run_key(auto_test_config)
+  if key is None:
+    return Journal()
+  return Journal(os.path.join(workspace, JOURNAL_FILE), key)
+
+
+class Journal(object):
+  """Append only record of the copies and reports of one build.
+
+  Safe to use from the scheduler and report threads.
+
+  Args:
+    path (str, optional): File of the journal. Nothing is recorded or
+      resumed if None.
+    key (str, optional): `run_key` of the build under test.
+  """
+
+  def __init__(self, path=None, key=None):
+    self.path = path
+    self.key = key
+    self._lock = threading.Lock()
+    self._entries = []
+    if path:
+      self._load()
+
+  @property
+  def enabled(self):
+    return self.path is not None
+
+  def _load(self):
+    """Reads entries of this build and drops those of other builds."""
+    if not os.path.exists(self.path):
+      return
+    dropped = False
+    with open(self.path) as f:
+      for line in f:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          # Last line of a run that crashed while writing it.
+          dropped = True
+          continue
+        if entry.get('run') == self.key:
+          self._entries.append(entry)
+        else:
+          dropped = True
+    if dropped:
+      tmp_path = self.path + '.tmp'
+      with open(tmp_path, 'w') as f:
+        for entry in self._entries:
+          f.write(json.dumps(entry, sort_keys=True) + '\n')
+      os.rename(tmp_path, self.path)
+
+  def _append(self, event, test_id, **values):
+    if not self.enabled:
+      return
+    entry = dict(values, run=self.key, event=event, test_id=test_id)
+    with self._lock:
+      self._entries.append(entry)
+      with open(self.path, 'a') as f:
+        f.write(json.dumps(entry, sort_keys=True) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+  def _test_entries(self, test_id, event=None):
+    with self._lock:
+      return [
+          e for e in self._entries if e['test_id'] == test_id and
+          (event is None or e['event'] == event)
+      ]
+
+  def reported(self, test_id):
+    """Returns True if the suite of `test_id` was reported."""
+    return bool(self._test_entries(test_id, REPORTED))
+
+  def resume(self, *test_configs):
+    """Picks up the copies of a test finished by an earlier run.
+
+    Sets `test_suite_start_time` of `test_configs` to that of the earlier run
+    so new copies are written to the same suite folder.
+
+    Args:
+      *test_configs: Configs of the copies of one test.
+
+    Returns:
+      List of result folders of the finished copies, in copy order.
+    """
+    if not self.enabled:
+      return []
+    test_id = test_configs[0]['test_id']
+    finished = {}
+    for entry in self._test_entries(test_id, FINISH):
+      finished[entry['copy']] = entry
+    result_dirs = []
+    while (len(result_dirs) in finished and
+           os.path.isdir(finished[len(result_dirs)]['result_dir'])):
+      result_dirs.append(finished[len(result_dirs)]['result_dir'])
+    if not result_dirs:
+      # The test starts over in a new suite, copies left by a crash that hit
+      # before any copy finished are moved out of the old one.
+      started = set(
+          e['suite_start_time'] for e in self._test_entries(test_id, START))
+      for suite_start_time in sorted(started):
+        self._move_incomplete(self._suite_dir(suite_start_time, test_id))
+      return []
+    for test_config in test_configs:
+      test_config['test_suite_start_time'] = finished[0]['suite_start_time']
+    interrupted = [
+        e['copy'] for e in self._test_entries(test_id, START)
+        if e['copy'] >= len(result_dirs)
+    ]
+    if interrupted:
+      suite_dir, last_name = os.path.split(result_dirs[-1])
+      self._move_incomplete(suite_dir, last_name)
+    print('Resuming {} after {} finished copies.'.format(
+        test_id, len(result_dirs)))
+    return result_dirs
+
+  def _suite_dir(self, suite_start_time, test_id):
+    """Returns the suite folder of a test, see `results_directory`."""
+    return os.path.join(
+        os.path.dirname(self.path), 'results',
+        '{}_{}'.format(suite_start_time, test_id))
+
+  def _move_incomplete(self, suite_dir, last_name=''):
+    """Moves result folders named after `last_name` out of `suite_dir`.
+
+    Result folders are named by their start time, see `results_directory`
+    of the runners. A suite left empty is removed.
+    """
+    if not os.path.isdir(suite_dir):
+      return
+    incomplete_dir = os.path.join(
+        os.path.dirname(self.path), INCOMPLETE_DIR, os.path.basename(suite_dir))
+    for name in sorted(os.listdir(suite_dir)):
+      path = os.path.join(suite_dir, name)
+      if name <= last_name or not os.path.isdir(path):
+        continue
+      if not os.path.exists(incomplete_dir):
+        os.makedirs(incomplete_dir)
+      print('Moving interrupted copy {} to {}'.format(path, incomplete_dir))
+      shutil.move(path, os.path.join(incomplete_dir, name))
+    if not os.listdir(suite_dir):
+      os.rmdir(suite_dir)
+
+  def start(self, test_config, copy):
+    """Records that `copy` of a test is about to run."""
+    if not self.enabled:
+      return
+    self._append(START, test_config['test_id'], copy=copy,
+                 suite_start_time=test_config['test_suite_start_time'])
+
+  def finish(self, test_config, copy, result_dir):
+    """Records that `copy` of a test finished with results in `result_dir`."""
+    if not self.enabled:
+      return
+    self._append(FINISH, test_config['test_id'], copy=copy,
+                 suite_start_time=test_config['test_suite_start_time'],
+                 result_dir=os.path.abspath(result_dir))
+
+  def report(self, test_id, fn, *args, **kwargs):
+    """Calls report `fn(*args, **kwargs)` and records the suite reported."""
+    fn(*args, **kwargs)
+    self._append(REPORTED, test_id)
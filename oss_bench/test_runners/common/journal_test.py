@@ -0,0 +1,149 @@
+"""Tests journal module."""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from test_runners.common import journal
+from test_runners.common import reprocess
+
+AUTO_TEST_CONFIG = {
+    'track': True,
+    'channel': 'NIGHTLY',
+    'build_type': 'OTB-GPU',
+    'framework_describe': 'v1.3.0-rc1-2884-g2d5b76169'
+}
+
+
+class TestJournal(unittest.TestCase):
+  """Tests for resuming the copies of a crashed run."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.journal_file = os.path.join(self.tmp_dir, journal.JOURNAL_FILE)
+
+  def _test_config(self, start_time='20180301T010000'):
+    return {'test_id': 'resnet50.gpu_1.32', 'test_suite_start_time': start_time}
+
+  def _result_dir(self, test_config, name):
+    result_dir = os.path.join(
+        self.tmp_dir, 'results',
+        '{}_{}'.format(test_config['test_suite_start_time'],
+                       test_config['test_id']), name)
+    os.makedirs(result_dir)
+    return result_dir
+
+  def _open(self, auto_test_config=None):
+    return journal.open_journal(self.tmp_dir,
+                                auto_test_config or AUTO_TEST_CONFIG)
+
+  def test_not_tracked(self):
+    """Tests runs that are not tracked record and resume nothing."""
+    run_journal = journal.open_journal(self.tmp_dir, {'track': False})
+    self.assertFalse(run_journal.enabled)
+    test_config = self._test_config()
+    run_journal.start(test_config, 0)
+    run_journal.finish(test_config, 0, self._result_dir(test_config, 'a'))
+    self.assertEqual([], run_journal.resume(test_config))
+    self.assertFalse(os.path.exists(self.journal_file))
+    self.assertFalse(journal.open_journal(self.tmp_dir, None).enabled)
+
+  def test_resume(self):
+    """Tests finished copies are resumed into the earlier suite folder."""
+    first_config = self._test_config()
+    run_journal = self._open()
+    result_dirs = []
+    for copy in range(2):
+      run_journal.start(first_config, copy)
+      result_dirs.append(
+          self._result_dir(first_config, '20180301T01000{}'.format(copy)))
+      run_journal.finish(first_config, copy, result_dirs[-1])
+    # Crashes during the third copy.
+    run_journal.start(first_config, 2)
+    interrupted_dir = self._result_dir(first_config, '20180301T010002')
+
+    test_config = self._test_config(start_time='20180301T020000')
+    copy_config = self._test_config(start_time='20180301T020000')
+    self.assertEqual(result_dirs, self._open().resume(test_config,
+                                                      copy_config))
+    self.assertEqual('20180301T010000', test_config['test_suite_start_time'])
+    self.assertEqual('20180301T010000', copy_config['test_suite_start_time'])
+    self.assertFalse(os.path.exists(interrupted_dir))
+    suite_name = os.path.basename(os.path.dirname(interrupted_dir))
+    self.assertTrue(
+        os.path.isdir(
+            os.path.join(self.tmp_dir, journal.INCOMPLETE_DIR, suite_name,
+                         '20180301T010002')))
+    # Backfills do not find the interrupted copy either.
+    self.assertEqual([os.path.dirname(interrupted_dir)],
+                     reprocess.find_suites(self.tmp_dir))
+    self.assertTrue(all(os.path.isdir(d) for d in result_dirs))
+
+  def test_resume_first_copy_interrupted(self):
+    """Tests a crash before any copy finished leaves nothing in results."""
+    first_config = self._test_config()
+    run_journal = self._open()
+    run_journal.start(first_config, 0)
+    interrupted_dir = self._result_dir(first_config, '20180301T010000')
+
+    test_config = self._test_config(start_time='20180301T020000')
+    self.assertEqual([], self._open().resume(test_config))
+    self.assertEqual('20180301T020000', test_config['test_suite_start_time'])
+    suite_name = os.path.basename(os.path.dirname(interrupted_dir))
+    self.assertTrue(
+        os.path.isdir(
+            os.path.join(self.tmp_dir, journal.INCOMPLETE_DIR, suite_name,
+                         '20180301T010000')))
+    self.assertEqual([], reprocess.find_suites(self.tmp_dir))
+
+  def test_resume_missing_result_dir(self):
+    """Tests copies whose results were removed are run again."""
+    test_config = self._test_config()
+    run_journal = self._open()
+    result_dirs = []
+    for copy in range(2):
+      result_dirs.append(
+          self._result_dir(test_config, '20180301T01000{}'.format(copy)))
+      run_journal.finish(test_config, copy, result_dirs[-1])
+    shutil.rmtree(result_dirs[1])
+    self.assertEqual(result_dirs[:1], self._open().resume(test_config))
+
+  def test_reported(self):
+    """Tests suites are recorded once their report succeeds."""
+    run_journal = self._open()
+    reported = []
+
+    def report(suite_dir, report_config=None):
+      if report_config is None:
+        raise ValueError('report failed')
+      reported.append(suite_dir)
+
+    with self.assertRaises(ValueError):
+      run_journal.report('test_a', report, '/results/suite_a')
+    run_journal.report('test_b', report, '/results/suite_b', report_config={})
+    self.assertEqual(['/results/suite_b'], reported)
+    run_journal = self._open()
+    self.assertFalse(run_journal.reported('test_a'))
+    self.assertTrue(run_journal.reported('test_b'))
+
+  def test_other_builds_dropped(self):
+    """Tests lines of other builds and a torn last line are dropped."""
+    self._open().report('test_a', lambda: None)
+    with open(self.journal_file, 'a') as f:
+      f.write('{"event": "fin')
+    self.assertTrue(self._open().reported('test_a'))
+    with open(self.journal_file) as f:
+      self.assertEqual(1, len(f.readlines()))
+
+    other_build = dict(AUTO_TEST_CONFIG, framework_describe='v1.4.0')
+    self.assertFalse(self._open(other_build).reported('test_a'))
+    with open(self.journal_file) as f:
+      self.assertEqual('', f.read())
+    self._open(other_build).report('test_a', lambda: None)
+    with open(self.journal_file) as f:
+      entry = json.loads(f.readline())
+    self.assertEqual(journal.run_key(other_build), entry['run'])
@@ -0,0 +1,200 @@
+"""Single pass parser of benchmark logs driven by precompiled patterns.
+
+Each harness declares the lines it cares about as `Pattern`s and registers
+them under its name. `LogParser` turns a log into typed records, one dict
+per matching line with the pattern's `kind` and the values of its named
+groups converted by `types`.
+
+Stored logs are read in large blocks and each pattern is run over a whole
+block with `finditer`, so the per line work happens in the regex engine
+rather than in Python. Live output, e.g. `LocalCommand.lines()`, is parsed a
+line at a time with the same patterns.
+
+Example:
+  log_parser.register('mxnet', [
+      log_parser.Pattern('step', r'Batch \\[(?P<step>\\d+)\\]',
+                         types={'step': int}, hint='Batch [')])
+  for record in log_parser.get_parser('mxnet').parse_file(log_file):
+    print(record['kind'], record['step'])
+"""
+from __future__ import print_function
+import calendar
+import datetime
+import re
+
+from test_runners.common import log_store
+
+# Characters read from a stored log at a time.
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Common pieces of patterns. Patterns run over blocks of many lines, so they
+# must not match a newline, e.g. use `[ \t]` rather than `\s`.
+FLOAT = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+INT = r'\d+'
+
+_registry = {}
+
+
+class Pattern(object):
+  """Line pattern producing one record per match.
+
+  Args:
+    kind (str): Kind of record, e.g. step, total or eval.
+    regex (str): Regex with named groups for the values to extract. Matched
+      with re.MULTILINE, so `^` anchors at the start of a line.
+    types (dict, optional): Group name to callable converting its text, e.g.
+      int or float. Other groups are kept as str.
+    hint (str, optional): Substring every matching line contains. Lines
+      without it skip the regex when parsing line by line.
+  """
+
+  def __init__(self, kind, regex, types=None, hint=None):
+    self.kind = kind
+    self.regex = re.compile(regex, re.MULTILINE)
+    self.types = types or {}
+    self.hint = hint
+
+  def record(self, match):
+    """Returns record dict built from a match."""
+    record = {'kind': self.kind}
+    for name, value in match.groupdict().items():
+      if value is not None and name in self.types:
+        value = self.types[name](value)
+      record[name] = value
+    return record
+
+  def match_line(self, line):
+    """Returns record for `line` or None if it does not match."""
+    if self.hint is not None and self.hint not in line:
+      return None
+    match = self.regex.search(line)
+    return self.record(match) if match else None
+
+
+class LogParser(object):
+  """Parses logs into records with a list of `Pattern`s.
+
+  Args:
+    patterns (list): `Pattern`s to look for. A line matching more than one
+      pattern produces a record for each, in pattern order.
+    block_size (int, optional): Characters read from a file at a time.
+  """
+
+  def __init__(self, patterns, block_size=BLOCK_SIZE):
+    self.patterns = list(patterns)
+    self.block_size = block_size
+
+  def parse_line(self, line):
+    """Returns list of records for a single line of live output."""
+    records = []
+    for pattern in self.patterns:
+      record = pattern.match_line(line)
+      if record is not None:
+        records.append(record)
+    return records
+
+  def parse(self, lines):
+    """Yields records for each line in an iterable of lines."""
+    for line in lines:
+      for record in self.parse_line(line):
+        yield record
+
+  def parse_text(self, text):
+    """Returns records for a block of complete lines, in line order."""
+    if len(self.patterns) == 1:
+      pattern = self.patterns[0]
+      return [pattern.record(match) for match in pattern.regex.finditer(text)]
+    matches = []
+    for index, pattern in enumerate(self.patterns):
+      for match in pattern.regex.finditer(text):
+        # Orders by line and then by pattern, like `parse_line`.
+        line_start = text.rfind('\n', 0, match.start()) + 1
+        matches.append((line_start, index, match.start(), pattern, match))
+    matches.sort(key=lambda m: m[:3])
+    return [pattern.record(match) for _, _, _, pattern, match in matches]
+
+  def parse_file(self, path):
+    """Yields records from a stored log, plain or compressed.
+
+    Blocks are cut at the last newline so no line is split between two
+    blocks. Stopping the iteration early stops reading the file.
+
+    Args:
+      path: Path of the log, see `log_store.open_log`.
+    """
+    with log_store.open_log(path) as f:
+      rest = ''
+      while True:
+        block = f.read(self.block_size)
+        if not block:
+          break
+        block = rest + block
+        end = block.rfind('\n') + 1
+        if not end:
+          rest = block
+          continue
+        rest = block[end:]
+        for record in self.parse_text(block[:end]):
+          yield record
+      if rest:
+        for record in self.parse_text(rest):
+          yield record
+
+  def parse_reverse(self, path):
+    """Yields records from a stored log in reverse order, last line first.
+
+    Suited to summary lines printed at the end of a run: stopping after the
+    first record reads only the end of the log. Logs that cannot be read
+    from the end, see `log_store.seekable`, are parsed from the start.
+
+    Args:
+      path: Path of the log, see `log_store.open_log`.
+    """
+    if not log_store.seekable(path):
+      for record in reversed(list(self.parse_file(path))):
+        yield record
+      return
+    for block in log_store.read_reverse(path, block_size=self.block_size):
+      for record in reversed(self.parse_text(block.decode('utf-8',
+                                                          'replace'))):
+        yield record
+
+
+def iso_timestamp(text):
+  """Returns seconds since the epoch for a UTC time such as in tf logs.
+
+  Args:
+    text: e.g. 2018-08-17T16:56:21.708468Z.
+  """
+  text = text.rstrip('Z')
+  fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in text else '%Y-%m-%dT%H:%M:%S'
+  value = datetime.datetime.strptime(text, fmt)
+  return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+def register(harness, patterns):
+  """Registers the patterns of a harness, replacing any registered before."""
+  _registry[harness] = list(patterns)
+
+
+def harnesses():
+  """Returns sorted list of the harnesses with registered patterns."""
+  return sorted(_registry)
+
+
+def get_parser(harness, kinds=None):
+  """Returns `LogParser` for a registered harness.
+
+  Args:
+    harness (str): Name the patterns were registered under.
+    kinds (list, optional): Only parse records of these kinds.
+
+  Raises:
+    ValueError: if no patterns are registered for `harness`.
+  """
+  if harness not in _registry:
+    raise ValueError('No log patterns registered for:{}'.format(harness))
+  patterns = _registry[harness]
+  if kinds is not None:
+    patterns = [pattern for pattern in patterns if pattern.kind in kinds]
+  return LogParser(patterns)
@@ -0,0 +1,78 @@
+"""Tests log_parser module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from test_runners.common import log_parser
+from test_runners.common import log_store
+
+STEP = log_parser.Pattern(
+    'step',
+    r'^step (?P<step>\d+) speed (?P<value>{})'.format(log_parser.FLOAT),
+    types={'step': int, 'value': float},
+    hint='step ')
+TOTAL = log_parser.Pattern(
+    'total', r'total (?P<value>{})'.format(log_parser.FLOAT),
+    types={'value': float}, hint='total')
+
+LOG = ('starting\n'
+       'step 1 speed 10.5\n'
+       'step 2 speed 1e2 total 3.5\n'
+       'noise step 3 speed 99\n'
+       'total 7\n')
+
+
+class TestLogParser(unittest.TestCase):
+  """Tests for LogParser."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.log_file = os.path.join(self.tmp_dir, 'worker_0_stdout.log')
+    with open(self.log_file, 'w') as f:
+      f.write(LOG)
+
+  def _expected(self):
+    return [{'kind': 'step', 'step': 1, 'value': 10.5},
+            {'kind': 'step', 'step': 2, 'value': 100.0},
+            {'kind': 'total', 'value': 3.5},
+            {'kind': 'total', 'value': 7.0}]
+
+  def test_parse_file(self):
+    """Tests records come back typed and in line order."""
+    parser = log_parser.LogParser([STEP, TOTAL])
+    self.assertEqual(self._expected(), list(parser.parse_file(self.log_file)))
+
+  def test_parse_file_small_blocks(self):
+    """Tests lines cut by block boundaries are not lost or split."""
+    parser = log_parser.LogParser([STEP, TOTAL], block_size=7)
+    self.assertEqual(self._expected(), list(parser.parse_file(self.log_file)))
+
+  def test_parse_reverse(self):
+    """Tests records come back last first from plain and compressed logs."""
+    parser = log_parser.LogParser([STEP, TOTAL], block_size=7)
+    expected = list(reversed(self._expected()))
+    self.assertEqual(expected, list(parser.parse_reverse(self.log_file)))
+    log_store.compress(self.log_file, frame_size=20)
+    self.assertEqual(expected, list(parser.parse_reverse(self.log_file)))
+    # Without frames the log is parsed from the start.
+    os.remove(self.log_file + '.gz.frames')
+    self.assertFalse(log_store.seekable(self.log_file))
+    self.assertEqual(expected, list(parser.parse_reverse(self.log_file)))
+
+  def test_parse_lines(self):
+    """Tests live lines give the same records as the stored log."""
+    parser = log_parser.LogParser([STEP, TOTAL])
+    self.assertEqual(self._expected(),
+                     list(parser.parse(LOG.splitlines(True))))
+
+  def test_registry(self):
+    log_parser.register('unit_test', [STEP, TOTAL])
+    parser = log_parser.get_parser('unit_test', kinds=['total'])
+    self.assertEqual([3.5, 7.0],
+                     [r['value'] for r in parser.parse_file(self.log_file)])
+    with self.assertRaises(ValueError):
+      log_parser.get_parser('not_registered')
@@ -0,0 +1,206 @@
+"""Compressed storage of run logs that parsers read without extracting.
+
+Runners compress the logs of a run once it finishes, see `compress_run`.
+`worker_0_stdout.log` becomes `worker_0_stdout.log.gz`, a gzip file made of
+independent members (frames) of about `FRAME_SIZE` bytes that each
+start at a line. Any gzip tool reads it as one file. The offsets of the
+frames are saved next to it in `<log>.gz.frames`, so any part of a log can
+be read without decompressing what comes before it, see `read_frame`.
+
+Code reading logs goes through `find` and `open_log`, which take the name
+of the plain log and fall back to the compressed one. Summary lines printed
+at the end of a run are read from the end with `read_reverse`.
+
+Example:
+  log_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  with log_store.open_log(log_file) as f:
+    for line in f:
+      ...
+"""
+from __future__ import print_function
+import gzip
+import io
+import json
+import os
+import zlib
+
+COMPRESSED_SUFFIX = '.gz'
+FRAMES_SUFFIX = '.frames'
+# Uncompressed bytes in each frame.
+FRAME_SIZE = 4 * 1024 * 1024
+COMPRESS_LEVEL = 6
+# Bytes of a plain log read at a time by `read_reverse`.
+REVERSE_BLOCK_SIZE = 1024 * 1024
+# Files of a run folder compressed by `compress_run`.
+LOG_SUFFIXES = ('.log',)
+
+
+def find(path):
+  """Returns path of the log stored for `path`, None if there is none.
+
+  Args:
+    path: Path of the plain log, e.g. .../worker_0_stdout.log, or of the
+      compressed log.
+  """
+  if os.path.isfile(path):
+    return path
+  if (not path.endswith(COMPRESSED_SUFFIX) and
+      os.path.isfile(path + COMPRESSED_SUFFIX)):
+    return path + COMPRESSED_SUFFIX
+  return None
+
+
+def exists(path):
+  """Returns True if the log `path` is stored plain or compressed."""
+  return find(path) is not None
+
+
+def open_log(path):
+  """Returns text file object reading the log stored for `path`.
+
+  Compressed logs are decompressed as they are read. Undecodable bytes are
+  replaced rather than raising.
+
+  Raises:
+    IOError: if neither the plain nor the compressed log exists.
+  """
+  stored = find(path)
+  if stored is None:
+    raise IOError('Log not found:{}'.format(path))
+  if stored.endswith(COMPRESSED_SUFFIX):
+    return io.TextIOWrapper(gzip.open(stored, 'rb'), errors='replace')
+  return io.open(stored, 'r', errors='replace')
+
+
+def compress(path, frame_size=FRAME_SIZE, level=COMPRESS_LEVEL):
+  """Compresses log `path` into framed gzip and removes the plain log.
+
+  The compressed log and its frames are written under temporary names and
+  renamed, so a crash leaves the plain log in place.
+
+  Returns:
+    Path of the compressed log.
+  """
+  compressed = path + COMPRESSED_SUFFIX
+  tmp_file = '{}.{}.tmp'.format(compressed, os.getpid())
+  # Pairs of (compressed offset, uncompressed offset) where frames start.
+  frames = []
+  uncompressed_offset = 0
+  with open(path, 'rb') as src, open(tmp_file, 'wb') as out:
+    while True:
+      chunk = src.read(frame_size)
+      if not chunk:
+        break
+      # Ends the frame at the end of a line.
+      if not chunk.endswith(b'\n'):
+        chunk += src.readline()
+      frames.append([out.tell(), uncompressed_offset])
+      with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=level,
+                         mtime=0) as member:
+        member.write(chunk)
+      uncompressed_offset += len(chunk)
+  frames_tmp = tmp_file + FRAMES_SUFFIX
+  with open(frames_tmp, 'w') as f:
+    json.dump({'size': uncompressed_offset, 'frames': frames}, f)
+  os.rename(frames_tmp, compressed + FRAMES_SUFFIX)
+  os.rename(tmp_file, compressed)
+  os.remove(path)
+  return compressed
+
+
+def compress_run(result_dir):
+  """Compresses the logs of a finished run in `result_dir`.
+
+  Returns:
+    List of paths of the compressed logs.
+  """
+  compressed = []
+  for name in sorted(os.listdir(result_dir)):
+    path = os.path.join(result_dir, name)
+    if name.endswith(LOG_SUFFIXES) and os.path.isfile(path):
+      compressed.append(compress(path))
+  return compressed
+
+
+def load_frames(path):
+  """Returns dict with size and frames of a compressed log, None if unknown.
+
+  Args:
+    path: Path of the compressed log.
+  """
+  frames_file = path + FRAMES_SUFFIX
+  if not os.path.isfile(frames_file):
+    return None
+  with open(frames_file) as f:
+    return json.load(f)
+
+
+def read_frame(path, compressed_offset):
+  """Returns the bytes of the frame starting at `compressed_offset`."""
+  with open(path, 'rb') as f:
+    f.seek(compressed_offset)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = []
+    while True:
+      block = f.read(64 * 1024)
+      if not block:
+        break
+      data.append(decompressor.decompress(block))
+      # Bytes past the end of the frame belong to the next one.
+      if decompressor.unused_data:
+        break
+    return b''.join(data)
+
+
+def seekable(path):
+  """Returns True if the log stored for `path` can be read from the end.
+
+  Plain logs and compressed logs with frames can. Compressed logs without
+  frames, e.g. compressed by another tool, can only be read from the start.
+  """
+  stored = find(path)
+  if stored is None:
+    return False
+  return (not stored.endswith(COMPRESSED_SUFFIX) or
+          os.path.isfile(stored + FRAMES_SUFFIX))
+
+
+def read_reverse(path, block_size=REVERSE_BLOCK_SIZE):
+  """Yields blocks of whole lines from the end of a log back to its start.
+
+  Lines within a block are in file order. Stopping the iteration early
+  stops reading, so finding a line near the end takes the same time for any
+  length of log. Compressed logs are read a frame at a time.
+
+  Args:
+    path: Path of the log, see `find`.
+    block_size: Bytes of a plain log read at a time.
+
+  Raises:
+    IOError: if the log is not found or not `seekable`.
+  """
+  if not seekable(path):
+    raise IOError('Log cannot be read from the end:{}'.format(path))
+  stored = find(path)
+  if stored.endswith(COMPRESSED_SUFFIX):
+    for offset, _ in reversed(load_frames(stored)['frames']):
+      yield read_frame(stored, offset)
+    return
+  with open(stored, 'rb') as f:
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    # End of a line cut at the start of the last block, joined to the block
+    # holding the rest of the line.
+    rest = b''
+    while end > 0:
+      start = max(0, end - block_size)
+      f.seek(start)
+      block = f.read(end - start) + rest
+      end = start
+      if start > 0:
+        first_line_end = block.find(b'\n') + 1
+        rest, block = block[:first_line_end], block[first_line_end:]
+        if not first_line_end:
+          rest, block = block, b''
+      if block:
+        yield block
@@ -0,0 +1,91 @@
+"""Tests log_store module."""
+from __future__ import print_function
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from test_runners.common import log_store
+
+
+class TestLogStore(unittest.TestCase):
+  """Tests for storing run logs compressed."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.log_file = os.path.join(self.tmp_dir, 'worker_0_stdout.log')
+    self.lines = ['step {}: {:.2f} images/sec\n'.format(i, 100.0 + i)
+                  for i in range(500)]
+    with open(self.log_file, 'w') as f:
+      f.write(''.join(self.lines))
+
+  def test_compress_round_trip(self):
+    """Tests the compressed log reads back the same lines."""
+    compressed = log_store.compress(self.log_file, frame_size=1000)
+    self.assertEqual(self.log_file + '.gz', compressed)
+    self.assertFalse(os.path.isfile(self.log_file))
+    with log_store.open_log(self.log_file) as f:
+      self.assertEqual(self.lines, list(f))
+    # Any gzip reader reads the frames as one file.
+    with gzip.open(compressed, 'rt') as f:
+      self.assertEqual(''.join(self.lines), f.read())
+
+  def test_read_frame(self):
+    """Tests each frame decompresses alone and starts at a line."""
+    compressed = log_store.compress(self.log_file, frame_size=1000)
+    frames = log_store.load_frames(compressed)
+    self.assertGreater(len(frames['frames']), 1)
+    text = ''.join(self.lines).encode('utf-8')
+    self.assertEqual(len(text), frames['size'])
+    ends = [start for _, start in frames['frames'][1:]] + [frames['size']]
+    for (offset, start), end in zip(frames['frames'], ends):
+      data = log_store.read_frame(compressed, offset)
+      self.assertEqual(text[start:end], data)
+      self.assertTrue(data.endswith(b'\n'))
+
+  def test_read_reverse(self):
+    """Tests blocks of whole lines come back from the end of the log."""
+    text = ''.join(self.lines).encode('utf-8')
+    blocks = list(log_store.read_reverse(self.log_file, block_size=100))
+    self.assertGreater(len(blocks), 1)
+    self.assertEqual(text, b''.join(reversed(blocks)))
+    for block in blocks:
+      self.assertTrue(block.endswith(b'\n'))
+    # The first block is read from the end of the file.
+    self.assertTrue(text.endswith(blocks[0]))
+    self.assertLessEqual(len(blocks[0]), 100)
+
+    log_store.compress(self.log_file, frame_size=1000)
+    blocks = list(log_store.read_reverse(self.log_file))
+    self.assertEqual(text, b''.join(reversed(blocks)))
+
+  def test_read_reverse_long_line(self):
+    """Tests lines longer than a block and no final newline are kept."""
+    with open(self.log_file, 'w') as f:
+      f.write('a' * 250 + '\nshort\nlast')
+    blocks = list(log_store.read_reverse(self.log_file, block_size=100))
+    self.assertEqual(b'a' * 250 + b'\nshort\nlast', b''.join(reversed(blocks)))
+    self.assertEqual(b'short\nlast', blocks[0])
+
+  def test_find(self):
+    """Tests the plain log is preferred and the compressed one found."""
+    self.assertEqual(self.log_file, log_store.find(self.log_file))
+    log_store.compress(self.log_file)
+    self.assertEqual(self.log_file + '.gz', log_store.find(self.log_file))
+    self.assertTrue(log_store.exists(self.log_file + '.gz'))
+    missing = os.path.join(self.tmp_dir, 'missing.log')
+    self.assertIsNone(log_store.find(missing))
+    self.assertRaises(IOError, log_store.open_log, missing)
+
+  def test_compress_run(self):
+    """Tests only the logs of a run folder are compressed."""
+    config_file = os.path.join(self.tmp_dir, 'config.yaml')
+    with open(config_file, 'w') as f:
+      f.write('test_id: test\n')
+    self.assertEqual([self.log_file + '.gz'],
+                     log_store.compress_run(self.tmp_dir))
+    self.assertTrue(os.path.isfile(config_file))
+    self.assertEqual([], log_store.compress_run(self.tmp_dir))
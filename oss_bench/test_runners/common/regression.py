@@ -0,0 +1,189 @@
+"""Flags throughput regressions of a suite against earlier builds.
+
+Each aggregated suite is stored in the result index, see
+`result_index.ResultIndex.put_suite`. A new suite is compared to the suites
+of the same test from earlier builds, `framework_describe`, as follows:
+
+  1. Suites are grouped by build, in order, and each build is its median.
+  2. Only the last `WINDOW` builds are kept. If their throughput stepped to
+     a new level, see `change_point`, the baseline starts at the step so an
+     accepted change is not flagged again with every build.
+  3. The baseline is the median of the builds. Their spread is the median
+     absolute deviation, which a single bad build barely moves.
+  4. The suite regressed if it is `Z_THRESHOLD` spreads and `MIN_DROP` below
+     the baseline.
+
+Example:
+  result_index.set_index_path('/workspace/cache/result_index.sqlite')
+  regression.check(agg_result, report_config, 'mxnet_benchmark')
+  print(agg_result['regression']['regressed'])
+"""
+from __future__ import print_function
+
+import os
+
+import numpy
+from test_runners.common import result_index
+
+# Most recent builds in the baseline.
+WINDOW = 20
+# Builds needed in the baseline before suites are compared.
+MIN_BUILDS = 3
+# Robust z score at or below which a drop is significant.
+Z_THRESHOLD = 3.0
+# Smallest relative drop flagged, filters tiny but consistent changes.
+MIN_DROP = 0.03
+# Smallest spread, relative to the baseline, for builds that agree exactly.
+MIN_SPREAD = 0.005
+# Scales the median absolute deviation to a std for normal data.
+MAD_SCALE = 1.4826
+
+
+def build_medians(suites, exclude_build=None):
+  """Returns list of (build, median throughput) in the order builds appear.
+
+  Args:
+    suites: Suite dicts from `ResultIndex.query_suites`, oldest first.
+    exclude_build: Build left out, e.g. the one being compared.
+  """
+  builds = []
+  values = {}
+  for suite in suites:
+    # Suites without a known build each stand for a build of their own.
+    build = suite.get('build')
+    if not build or build == 'unknown':
+      build = suite['suite_dir']
+    elif build == exclude_build:
+      continue
+    if build not in values:
+      builds.append(build)
+      values[build] = []
+    values[build].append(suite['throughput'])
+  return [(build, float(numpy.median(values[build]))) for build in builds]
+
+
+def change_point(values, min_size=MIN_BUILDS):
+  """Returns index where `values` step to a new level, None if they do not.
+
+  The split into two segments with the lowest total squared error is a step
+  if the segment means differ by `MIN_DROP` or more and by `Z_THRESHOLD`
+  standard errors.
+
+  Args:
+    values: Throughput of each build, oldest first.
+    min_size: Fewest values in each segment.
+  """
+  x = numpy.asarray(values, dtype=numpy.float64)
+  n = len(x)
+  if n < 2 * min_size:
+    return None
+  best = None
+  for k in range(min_size, n - min_size + 1):
+    left, right = x[:k], x[k:]
+    sse = ((left - left.mean())**2).sum() + ((right - right.mean())**2).sum()
+    if best is None or sse < best[1]:
+      best = (k, sse)
+  k = best[0]
+  left, right = x[:k], x[k:]
+  shift = right.mean() - left.mean()
+  spread = max(numpy.sqrt(left.var(ddof=1) / len(left) +
+                          right.var(ddof=1) / len(right)),
+               MIN_SPREAD * abs(left.mean()))
+  if (abs(shift) >= MIN_DROP * abs(left.mean()) and
+      abs(shift) / spread >= Z_THRESHOLD):
+    return k
+  return None
+
+
+def compare(values, throughput):
+  """Returns dict comparing `throughput` to the baseline of `values`.
+
+  Args:
+    values: Throughput of each earlier build, oldest first.
+    throughput: Throughput of the new suite.
+
+  Returns:
+    dict with baseline, spread, z_score, drop, baseline_builds, change_point
+    and regressed, or None if there are fewer than `MIN_BUILDS` builds.
+  """
+  values = list(values)[-WINDOW:]
+  step = change_point(values)
+  if step is not None:
+    values = values[step:]
+  if len(values) < MIN_BUILDS:
+    return None
+  x = numpy.asarray(values, dtype=numpy.float64)
+  baseline = float(numpy.median(x))
+  if baseline <= 0:
+    return None
+  spread = max(MAD_SCALE * float(numpy.median(numpy.abs(x - baseline))),
+               MIN_SPREAD * baseline)
+  z_score = (throughput - baseline) / spread
+  drop = (baseline - throughput) / baseline
+  return {
+      'baseline': baseline,
+      'spread': spread,
+      'z_score': float(z_score),
+      'drop': float(drop),
+      'baseline_builds': len(values),
+      'change_point': step is not None,
+      'regressed': bool(z_score <= -Z_THRESHOLD and drop >= MIN_DROP),
+  }
+
+
+def check(agg_result, report_config, test_harness, index_path=None):
+  """Compares an aggregated suite to earlier builds and records the suite.
+
+  Sets `agg_result['regression']`, uploaded with the row's extras, when
+  there is a baseline. Only suites run before this one form the baseline,
+  so a backfilled or rerun old build is not judged against later builds.
+  Does nothing without a result index or results.
+
+  Args:
+    agg_result: Result from `util.report_aggregate_results`.
+    report_config: Config of the report, framework_describe is the build.
+    test_harness: Name of the harness, e.g. mxnet_benchmark.
+    index_path: Result index to use, defaults to
+      `result_index.get_index_path`.
+
+  Returns:
+    The comparison dict or None.
+  """
+  index_path = index_path or result_index.get_index_path()
+  if (not index_path or not agg_result.get('result_dir') or
+      not agg_result.get('samples')):
+    return None
+  config = agg_result['config']
+  test_id = config['test_id']
+  build = report_config.get('framework_describe')
+  suite_dir = os.path.abspath(os.path.dirname(agg_result['result_dir']))
+  throughput = float(agg_result['mean'])
+  timestamp = config.get('timestamp')
+  index = result_index.ResultIndex(index_path)
+  try:
+    suites = [suite for suite in index.query_suites(test_id, test_harness)
+              if suite['suite_dir'] != suite_dir and
+              _earlier(suite['timestamp'], timestamp)]
+    builds = build_medians(suites, exclude_build=build)
+    comparison = compare([value for _, value in builds], throughput)
+    index.put_suite(suite_dir, test_id, throughput, harness=test_harness,
+                    build=build, timestamp=timestamp)
+  finally:
+    index.close()
+  if comparison is None:
+    return None
+  comparison['build'] = build
+  agg_result['regression'] = comparison
+  if comparison['regressed']:
+    print('WARNING: {} regressed {:.1%} to {:.2f} from a baseline of {:.2f} '
+          'over {} builds.'.format(test_id, comparison['drop'], throughput,
+                                   comparison['baseline'],
+                                   comparison['baseline_builds']))
+  return comparison
+
+
+def _earlier(suite_timestamp, timestamp):
+  """Returns True if a suite ran before `timestamp`, or it is unknown."""
+  if timestamp is None:
+    return True
+  return suite_timestamp is not None and suite_timestamp < timestamp
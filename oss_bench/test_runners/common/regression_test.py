@@ -0,0 +1,102 @@
+"""Tests regression module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from test_runners.common import regression
+from test_runners.common import result_index
+
+
+class TestRegression(unittest.TestCase):
+  """Tests for flagging regressions against earlier builds."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.index_path = os.path.join(self.tmp_dir, 'result_index.sqlite')
+
+  def _agg_result(self, suite, throughput, timestamp):
+    return {
+        'config': {'test_id': 'resnet50.gpu_1.32', 'timestamp': timestamp},
+        'result_dir': os.path.join(self.tmp_dir, suite, 'copy_0'),
+        'samples': 3,
+        'mean': throughput,
+    }
+
+  def _check(self, suite, throughput, build, timestamp):
+    agg_result = self._agg_result(suite, throughput, timestamp)
+    regression.check(agg_result, {'framework_describe': build}, 'harness',
+                     index_path=self.index_path)
+    return agg_result
+
+  def test_check(self):
+    """Tests a drop is flagged once enough builds form a baseline."""
+    history = [100.0, 101.0, 99.5, 100.5, 100.0]
+    for i, throughput in enumerate(history):
+      agg_result = self._check('suite_{}'.format(i), throughput,
+                               'build_{}'.format(i), i)
+    self.assertFalse(agg_result['regression']['regressed'])
+
+    agg_result = self._check('suite_new', 90.0, 'build_new', 10)
+    comparison = agg_result['regression']
+    self.assertTrue(comparison['regressed'])
+    self.assertEqual(100.0, comparison['baseline'])
+    self.assertAlmostEqual(0.1, comparison['drop'])
+    self.assertEqual('build_new', comparison['build'])
+
+  def test_check_without_baseline(self):
+    """Tests nothing is flagged before there are `MIN_BUILDS` builds."""
+    agg_result = self._check('suite_0', 100.0, 'build_0', 0)
+    self.assertNotIn('regression', agg_result)
+
+  def test_check_reprocessed_suite(self):
+    """Tests processing a suite again does not compare it with itself."""
+    for i, throughput in enumerate([100.0, 100.0, 100.0]):
+      self._check('suite_{}'.format(i), throughput, 'build_{}'.format(i), i)
+    self._check('suite_new', 80.0, 'build_new', 10)
+    agg_result = self._check('suite_new', 80.0, 'build_new', 10)
+    self.assertEqual(3, agg_result['regression']['baseline_builds'])
+    index = result_index.ResultIndex(self.index_path)
+    self.addCleanup(index.close)
+    self.assertEqual(4, len(index.query_suites('resnet50.gpu_1.32')))
+
+  def test_check_later_builds(self):
+    """Tests an old build reported late is only compared to earlier ones."""
+    for i, throughput in enumerate([100.0, 100.0, 100.0]):
+      self._check('suite_{}'.format(i), throughput, 'build_{}'.format(i), i)
+    for i, throughput in enumerate([50.0, 50.0, 50.0]):
+      self._check('suite_late_{}'.format(i), throughput,
+                  'build_late_{}'.format(i), 10 + i)
+    agg_result = self._check('suite_old', 100.0, 'build_old', 5)
+    comparison = agg_result['regression']
+    self.assertEqual(3, comparison['baseline_builds'])
+    self.assertEqual(100.0, comparison['baseline'])
+    self.assertFalse(comparison['regressed'])
+
+  def test_check_without_index(self):
+    """Tests nothing is done without a result index."""
+    agg_result = self._agg_result('suite_0', 100.0, 0)
+    self.assertIsNone(regression.check(agg_result, {}, 'harness'))
+
+  def test_build_medians(self):
+    """Tests suites of a build collapse to their median."""
+    suites = [{'suite_dir': 's0', 'build': 'b1', 'throughput': 100.0},
+              {'suite_dir': 's1', 'build': 'b1', 'throughput': 90.0},
+              {'suite_dir': 's2', 'build': 'b1', 'throughput': 95.0},
+              {'suite_dir': 's3', 'build': 'unknown', 'throughput': 80.0},
+              {'suite_dir': 's4', 'build': 'b2', 'throughput': 70.0}]
+    self.assertEqual([('b1', 95.0), ('s3', 80.0)],
+                     regression.build_medians(suites, exclude_build='b2'))
+
+  def test_change_point(self):
+    """Tests a step to a new level moves the baseline past it."""
+    values = [100.0, 100.5, 99.5, 100.0, 90.0, 90.5, 89.5, 90.0]
+    self.assertEqual(4, regression.change_point(values))
+    self.assertIsNone(regression.change_point([100.0, 100.5, 99.5, 100.0]))
+    comparison = regression.compare(values, 89.0)
+    self.assertTrue(comparison['change_point'])
+    self.assertEqual(90.0, comparison['baseline'])
+    self.assertFalse(comparison['regressed'])
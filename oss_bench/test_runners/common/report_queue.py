@@ -0,0 +1,96 @@
+"""Reports finished suites in the background while the next test runs.
+
+Runners submit `reporting.process_folder` for a suite once its last copy
+finishes and go straight on to the next test. A single worker thread parses,
+aggregates and uploads suites one at a time in the order they were
+submitted, so the regression history still sees suites oldest first.
+
+`flush` waits for every submitted suite and is called by the runners before
+they return, so no suite is left unreported when the harness exits. Runners
+pass its errors to `raise_errors`, so a harness with a suite that failed to
+report is not marked as run by the controller.
+
+Example:
+  report_queue.submit(reporting.process_folder, suite_dir,
+                      report_config=report_config)
+  ...
+  report_queue.raise_errors(report_queue.flush())
+"""
+from __future__ import print_function
+import threading
+
+from six.moves import queue
+
+
+class ReportError(Exception):
+  """Raised when suites failed to report."""
+
+
+class ReportQueue(object):
+  """Runs report calls in order on a worker thread.
+
+  The thread is started by the first `submit`. A call that raises is
+  printed and recorded, and the calls after it still run.
+  """
+
+  def __init__(self):
+    self._queue = queue.Queue()
+    self._lock = threading.Lock()
+    self._thread = None
+    self._errors = []
+
+  def submit(self, fn, *args, **kwargs):
+    """Queues `fn(*args, **kwargs)` and returns right away."""
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    self._queue.put((fn, args, kwargs))
+
+  def join(self):
+    """Blocks until every queued call has finished.
+
+    Returns:
+      List of (args, error) for calls that raised since the last join.
+    """
+    self._queue.join()
+    with self._lock:
+      errors, self._errors = self._errors, []
+    return errors
+
+  def _run(self):
+    while True:
+      fn, args, kwargs = self._queue.get()
+      try:
+        fn(*args, **kwargs)
+      except Exception as e:  # pylint: disable=broad-except
+        print('Error reporting {}: {}'.format(args, e))
+        with self._lock:
+          self._errors.append((args, e))
+      finally:
+        self._queue.task_done()
+
+
+_report_queue = ReportQueue()
+
+
+def submit(fn, *args, **kwargs):
+  """Queues a report call on the shared `ReportQueue`."""
+  _report_queue.submit(fn, *args, **kwargs)
+
+
+def flush():
+  """Waits for every report call submitted so far.
+
+  Returns:
+    List of (args, error) for calls that raised.
+  """
+  return _report_queue.join()
+
+
+def raise_errors(errors):
+  """Raises `ReportError` if `errors` from `flush` is not empty."""
+  if errors:
+    raise ReportError('{} suites failed to report: {}'.format(
+        len(errors), '; '.join('{}: {}'.format(args, e) for args, e in errors)))
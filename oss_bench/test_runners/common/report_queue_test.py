@@ -0,0 +1,63 @@
+"""Tests report_queue module."""
+from __future__ import print_function
+
+import threading
+import unittest
+
+from test_runners.common import report_queue
+
+
+class TestReportQueue(unittest.TestCase):
+  """Tests for reporting suites in the background."""
+
+  def test_submit_returns_before_report(self):
+    """Tests submit does not wait and flush waits for every report."""
+    started = threading.Event()
+    release = threading.Event()
+    reported = []
+
+    def report(suite_dir, report_config=None):
+      started.set()
+      release.wait()
+      reported.append((suite_dir, report_config))
+
+    queue = report_queue.ReportQueue()
+    queue.submit(report, '/results/suite_0', report_config={'a': 1})
+    queue.submit(report, '/results/suite_1')
+    self.assertTrue(started.wait(5))
+    self.assertEqual([], reported)
+    release.set()
+    self.assertEqual([], queue.join())
+    self.assertEqual([('/results/suite_0', {'a': 1}),
+                      ('/results/suite_1', None)], reported)
+
+  def test_error_does_not_stop_queue(self):
+    """Tests a failed report is returned and later reports still run."""
+    reported = []
+
+    def report(suite_dir):
+      if suite_dir == 'bad':
+        raise ValueError('bad log')
+      reported.append(suite_dir)
+
+    queue = report_queue.ReportQueue()
+    for suite_dir in ['first', 'bad', 'last']:
+      queue.submit(report, suite_dir)
+    errors = queue.join()
+    self.assertEqual(['first', 'last'], reported)
+    self.assertEqual(1, len(errors))
+    self.assertEqual(('bad',), errors[0][0])
+    self.assertEqual([], queue.join())
+
+  def test_shared_queue(self):
+    """Tests the module functions use one shared queue."""
+    reported = []
+    report_queue.submit(reported.append, 'suite')
+    self.assertEqual([], report_queue.flush())
+    self.assertEqual(['suite'], reported)
+
+  def test_raise_errors(self):
+    """Tests errors returned by flush are raised."""
+    report_queue.raise_errors([])
+    with self.assertRaises(report_queue.ReportError):
+      report_queue.raise_errors([(('bad',), ValueError('bad log'))])
@@ -0,0 +1,246 @@
+"""Parses, aggregates and reports every suite found in a workspace.
+
+Used to backfill results after a parser is fixed. Each folder under
+`<workspace>/results` is a suite, one test with a subfolder per copy. The
+harness of a suite is found from its logs with the patterns registered in
+`log_parser`. Suites are parsed into the result index by a pool of
+processes and then reported one at a time, oldest first, from the index
+through the same path as a normal run, e.g. to BigQuery or to stdout with
+--report_project=LOCAL.
+
+Suites whose runs are all indexed and unchanged were reported before and are
+skipped unless --force is passed. Bumping `result_index.INDEX_VERSION` with
+a parser change makes every suite stale.
+
+Example:
+  python -m test_runners.common.reprocess --workspace=/workspace \\
+    --config=/workspace/git/benchmark_harness/oss_bench/harness/configs/prod/dgx_v100.yaml
+"""
+from __future__ import print_function
+import argparse
+import importlib
+import multiprocessing
+import os
+
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+import yaml
+
+# Reporting module of each harness. Importing a module registers its
+# patterns with `log_parser`.
+REPORTING_MODULES = {
+    'keras_tf_models': 'test_runners.keras_tf_models.reporting',
+    'mxnet_benchmark': 'test_runners.mxnet.reporting',
+    'pytorch': 'test_runners.pytorch.reporting',
+    'tf_cnn_benchmark': 'test_runners.tf_cnn_bench.reporting',
+    'tf_models': 'test_runners.tf_models.reporting',
+}
+# Log of a run read to find the harness.
+LOG_FILE = 'worker_0_stdout.log'
+# Characters of the log read to find the harness.
+SNIFF_CHARS = 1024 * 1024
+
+# Outcomes of reprocessing a suite.
+REPORTED = 'reported'
+SKIPPED = 'skipped'
+UNKNOWN = 'unknown_harness'
+ERROR = 'error'
+
+
+def get_reporting(harness):
+  """Returns the reporting module of `harness`."""
+  return importlib.import_module(REPORTING_MODULES[harness])
+
+
+def find_suites(workspace):
+  """Returns sorted list of suite folders under `<workspace>/results`.
+
+  Suite folders start with the time the suite started, so sorting them
+  orders suites oldest first.
+  """
+  results_dir = os.path.join(workspace, 'results')
+  if not os.path.isdir(results_dir):
+    return []
+  return [os.path.join(results_dir, name)
+          for name in sorted(os.listdir(results_dir))
+          if os.path.isdir(os.path.join(results_dir, name))]
+
+
+def detect_harness(suite_dir):
+  """Returns the harness whose patterns match most of a suite's log.
+
+  Returns:
+    str name registered with `log_parser` or None if no log matches.
+  """
+  for harness in REPORTING_MODULES:
+    get_reporting(harness)
+  for r, _, _ in os.walk(suite_dir):
+    log_file = os.path.join(r, LOG_FILE)
+    if not log_store.exists(log_file):
+      continue
+    with log_store.open_log(log_file) as f:
+      text = f.read(SNIFF_CHARS)
+    # Drops a partial last line.
+    text = text[:text.rfind('\n') + 1]
+    counts = {}
+    for harness in REPORTING_MODULES:
+      counts[harness] = len(log_parser.get_parser(harness).parse_text(text))
+    best = max(sorted(counts), key=lambda harness: counts[harness])
+    if counts[best]:
+      return best
+  return None
+
+
+def index_suite(suite_dir, index_path, force=False):
+  """Parses the runs of a suite into the result index.
+
+  Args:
+    suite_dir: Folder of the suite.
+    index_path: SQLite file of the result index.
+    force: Parse suites that are already indexed.
+
+  Returns:
+    Tuple of (suite_dir, harness, outcome), where outcome is REPORTED if the
+    suite needs to be reported.
+  """
+  result_index.set_index_path(index_path)
+  try:
+    harness = detect_harness(suite_dir)
+    if harness is None:
+      return suite_dir, None, UNKNOWN
+    reporting = get_reporting(harness)
+    if not force and result_index.indexed(suite_dir, reporting.RESULT_FILES):
+      return suite_dir, harness, SKIPPED
+    reporting.collect_results(suite_dir)
+    return suite_dir, harness, REPORTED
+  except Exception as e:  # pylint: disable=broad-except
+    print('Error indexing {}: {}'.format(suite_dir, e))
+    return suite_dir, None, ERROR
+
+
+def _index_suite(args):
+  """Unpacks the args of `index_suite` for `multiprocessing.Pool`."""
+  return index_suite(*args)
+
+
+def reprocess(workspace, report_config, index_path=None, processes=None,
+              force=False):
+  """Parses every suite in `workspace` in parallel and reports new ones.
+
+  Args:
+    workspace: Workspace holding the results folder.
+    report_config: Config of the report, the same as for a normal run, e.g.
+      report_project and cpu_info.
+    index_path: SQLite file of the result index. Defaults to
+      `<workspace>/cache/result_index.sqlite`.
+    processes: Processes parsing suites, defaults to the number of CPUs.
+    force: Report suites that were already indexed.
+
+  Returns:
+    List of (suite_dir, harness, outcome) in the order suites were reported.
+  """
+  index_path = index_path or os.path.join(workspace, 'cache',
+                                          result_index.INDEX_FILE)
+  # Creates the index before the workers race to.
+  result_index.ResultIndex(index_path).close()
+  suites = find_suites(workspace)
+  print('Parsing {} suites in {}'.format(len(suites), workspace))
+  pool = multiprocessing.Pool(processes)
+  try:
+    indexed = pool.map(_index_suite,
+                       [(suite_dir, index_path, force) for suite_dir in suites])
+  finally:
+    pool.close()
+    pool.join()
+
+  # Reports from the index in this process, so rows go through one uploader
+  # and suites reach the regression history oldest first.
+  result_index.set_index_path(index_path)
+  outcomes = []
+  for suite_dir, harness, outcome in indexed:
+    if outcome == REPORTED:
+      try:
+        get_reporting(harness).process_folder(
+            suite_dir, report_config=report_config)
+      except Exception as e:  # pylint: disable=broad-except
+        print('Error reporting {}: {}'.format(suite_dir, e))
+        outcome = ERROR
+    print('{}: {} {}'.format(outcome, harness, suite_dir))
+    outcomes.append((suite_dir, harness, outcome))
+  return outcomes
+
+
+def load_report_config(config_path, cache_dir=None):
+  """Returns report config from a harness config with system info added.
+
+  Args:
+    config_path: Harness config YAML, e.g. harness/configs/prod/dgx_v100.yaml.
+    cache_dir: Folder holding the inventory cache, see `tools.inventory`.
+  """
+  # pylint: disable=C6204
+  import tools.cpu as cpu_info
+  report_config = {}
+  if config_path:
+    with open(config_path) as f:
+      report_config = yaml.safe_load(f)
+  if 'cpu_info' not in report_config:
+    cpu_data = {}
+    cpu_data['model_name'], cpu_data['socket_count'], cpu_data[
+        'core_count'], cpu_data['cpu_info'] = cpu_info.get_cpu_info(
+            cache_dir=cache_dir)
+    report_config['cpu_info'] = cpu_data
+  return report_config
+
+
+def main():
+  """Program main, called after args are parsed into FLAGS."""
+  # pylint: disable=C6204
+  import upload.result_upload as result_upload
+  cache_dir = os.path.join(FLAGS.workspace, 'cache')
+  report_config = load_report_config(FLAGS.config, cache_dir=cache_dir)
+  if FLAGS.report_project:
+    report_config['report_project'] = FLAGS.report_project
+  if (report_config.get('report_project', 'LOCAL') != 'LOCAL' and
+      report_config.get('report_auth')):
+    auth_token_path = report_config['report_auth']
+    if not auth_token_path.startswith('/'):
+      auth_token_path = os.path.join('/auth_tokens/', auth_token_path)
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = auth_token_path
+  result_upload.set_spool_dir(os.path.join(FLAGS.workspace, 'spool'))
+  reprocess(FLAGS.workspace, report_config, processes=FLAGS.processes,
+            force=FLAGS.force)
+  result_upload.flush_all()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+
+  parser.add_argument(
+      '--workspace',
+      type=str,
+      default='/workspace',
+      help='Workspace whose results folder is reprocessed')
+  parser.add_argument(
+      '--config',
+      type=str,
+      default=None,
+      help='Harness config YAML with the report settings')
+  parser.add_argument(
+      '--report_project',
+      type=str,
+      default=None,
+      help='Overrides report_project of the config, LOCAL prints rows')
+  parser.add_argument(
+      '--processes',
+      type=int,
+      default=None,
+      help='Processes parsing suites. Default is the number of CPUs')
+  parser.add_argument(
+      '--force',
+      action='store_true',
+      help='Report suites that are already indexed')
+
+  FLAGS, unparsed = parser.parse_known_args()
+
+  main()
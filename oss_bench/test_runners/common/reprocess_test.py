@@ -0,0 +1,86 @@
+"""Tests reprocess module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from test_runners.common import log_store
+from test_runners.common import reprocess
+from test_runners.common import result_index
+import yaml
+
+
+class TestReprocess(unittest.TestCase):
+  """Tests for reprocessing every suite of a workspace."""
+
+  def setUp(self):
+    self.workspace = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.workspace)
+    self.addCleanup(result_index.set_index_path, None)
+    results_dir = os.path.join(self.workspace, 'results')
+    self.mxnet_suite = self._copy_run(
+        'test_runners/mxnet/unittest_files/basic_synth', 'test_result.txt',
+        os.path.join(results_dir, '20180101T000000_mxnet', 'copy_0'))
+    # Suites are read the same whether or not the run compressed its logs.
+    log_store.compress_run(os.path.join(self.mxnet_suite, 'copy_0'))
+    self.pytorch_suite = self._copy_run(
+        'test_runners/pytorch/unittest_files/results/basic',
+        'worker_0_stdout.txt',
+        os.path.join(results_dir, '20180102T000000_pytorch', 'copy_0'))
+    self.empty_suite = os.path.join(results_dir, '20180103T000000_empty')
+    os.makedirs(self.empty_suite)
+
+  def _copy_run(self, src_dir, log_file, run_dir):
+    """Copies a run from the unittest files and returns its suite folder."""
+    os.makedirs(run_dir)
+    with open(os.path.join(src_dir, 'config.yaml')) as f:
+      config = yaml.safe_load(f)
+    # Fields the uploaded row needs that the unittest configs leave out.
+    config.setdefault('model', 'resnet50')
+    config.setdefault('cmd', 'python train.py')
+    with open(os.path.join(run_dir, 'config.yaml'), 'w') as f:
+      f.write(yaml.dump(config))
+    shutil.copy(os.path.join(src_dir, log_file),
+                os.path.join(run_dir, reprocess.LOG_FILE))
+    return os.path.dirname(run_dir)
+
+  def test_find_suites(self):
+    """Tests suites are found oldest first."""
+    self.assertEqual([self.mxnet_suite, self.pytorch_suite, self.empty_suite],
+                     reprocess.find_suites(self.workspace))
+    self.assertEqual([], reprocess.find_suites(self.empty_suite))
+
+  def test_detect_harness(self):
+    """Tests the harness is found from the patterns matching the log."""
+    self.assertEqual('mxnet_benchmark',
+                     reprocess.detect_harness(self.mxnet_suite))
+    self.assertEqual('pytorch', reprocess.detect_harness(self.pytorch_suite))
+    self.assertIsNone(reprocess.detect_harness(self.empty_suite))
+
+  @patch('upload.result_upload.upload_result')
+  def test_reprocess(self, mock_upload):
+    """Tests new suites are reported and indexed suites are skipped."""
+    report_config = {'report_project': 'LOCAL', 'cpu_info': {
+        'model_name': 'cpu', 'core_count': 1, 'socket_count': 1}}
+    outcomes = reprocess.reprocess(self.workspace, report_config, processes=2)
+    self.assertEqual(
+        [(self.mxnet_suite, 'mxnet_benchmark', reprocess.REPORTED),
+         (self.pytorch_suite, 'pytorch', reprocess.REPORTED),
+         (self.empty_suite, None, reprocess.UNKNOWN)], outcomes)
+    self.assertEqual(2, mock_upload.call_count)
+    index_path = os.path.join(self.workspace, 'cache',
+                              result_index.INDEX_FILE)
+    self.assertTrue(os.path.isfile(index_path))
+
+    outcomes = reprocess.reprocess(self.workspace, report_config, processes=2)
+    self.assertEqual([reprocess.SKIPPED, reprocess.SKIPPED, reprocess.UNKNOWN],
+                     [outcome for _, _, outcome in outcomes])
+    self.assertEqual(2, mock_upload.call_count)
+
+    outcomes = reprocess.reprocess(self.workspace, report_config, processes=1,
+                                   force=True)
+    self.assertEqual(reprocess.REPORTED, outcomes[0][2])
+    self.assertEqual(4, mock_upload.call_count)
@@ -0,0 +1,243 @@
+"""SQLite index of parsed results keyed by result folder and file stats.
+
+Reporting walks a suite folder for runs and parses each run's config.yaml,
+extra_results.yaml and logs. With an index set, a run is only parsed when a
+file in its folder was added, removed or changed size or mtime since it was
+indexed. Every other run is read back from the index, which also allows
+queries across suites without touching the folders.
+
+Example:
+  result_index.set_index_path('/workspace/cache/result_index.sqlite')
+  results = result_index.collect(folder_path, 'mxnet',
+                                 ('worker_0_stdout.log',), parse_fn)
+"""
+from __future__ import print_function
+import json
+import os
+import sqlite3
+import threading
+
+INDEX_FILE = 'result_index.sqlite'
+# Bump when parsing changes so stale entries are parsed again.
+INDEX_VERSION = 3
+# Seconds to wait on another process or thread writing the index.
+LOCK_TIMEOUT = 60.0
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS results (
+               result_file TEXT PRIMARY KEY,
+               result_dir TEXT NOT NULL,
+               harness TEXT NOT NULL,
+               signature TEXT NOT NULL,
+               test_id TEXT,
+               timestamp INTEGER,
+               result TEXT NOT NULL)"""
+# Aggregate throughput of each suite, the history `regression` compares to.
+_SUITES_SCHEMA = """CREATE TABLE IF NOT EXISTS suites (
+                      suite_dir TEXT PRIMARY KEY,
+                      test_id TEXT NOT NULL,
+                      harness TEXT,
+                      build TEXT,
+                      timestamp INTEGER,
+                      throughput REAL NOT NULL)"""
+_INDEXES = ('CREATE INDEX IF NOT EXISTS results_test_id ON results (test_id)',
+            'CREATE INDEX IF NOT EXISTS results_dir ON results (result_dir)',
+            'CREATE INDEX IF NOT EXISTS suites_test_id ON suites (test_id)')
+
+# Index used by `collect` when none is passed, see `set_index_path`.
+_index_path = None
+_schema_lock = threading.Lock()
+
+
+def set_index_path(index_path):
+  """Sets the index `collect` uses by default, None to parse every run."""
+  global _index_path
+  _index_path = index_path
+
+
+def get_index_path():
+  """Returns the index set with `set_index_path`, None if there is none."""
+  return _index_path
+
+
+class ResultIndex(object):
+  """Parsed results stored in SQLite.
+
+  Open one per thread, sqlite3 connections are not shared between threads.
+
+  Args:
+    index_path (str): Path of the SQLite file, created if needed.
+  """
+
+  def __init__(self, index_path):
+    index_dir = os.path.dirname(index_path)
+    if index_dir and not os.path.isdir(index_dir):
+      try:
+        os.makedirs(index_dir)
+      except OSError:
+        # Created by another thread in the meantime.
+        if not os.path.isdir(index_dir):
+          raise
+    self.index_path = index_path
+    self.conn = sqlite3.connect(index_path, timeout=LOCK_TIMEOUT)
+    with _schema_lock, self.conn:
+      self.conn.execute(_SCHEMA)
+      self.conn.execute(_SUITES_SCHEMA)
+      for sql in _INDEXES:
+        self.conn.execute(sql)
+
+  def get(self, result_file, signature):
+    """Returns the result indexed for `result_file` or None if it is stale."""
+    row = self.conn.execute(
+        'SELECT signature, result FROM results WHERE result_file = ?',
+        (result_file,)).fetchone()
+    if row and row[0] == signature:
+      return json.loads(row[1])
+    return None
+
+  def put(self, result_file, harness, signature, result):
+    """Stores `result` parsed from `result_file`."""
+    config = result.get('config') or {}
+    with self.conn:
+      self.conn.execute(
+          'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+          (result_file, os.path.dirname(result_file), harness, signature,
+           result.get('test_id'), config.get('timestamp'),
+           json.dumps(result, default=str)))
+
+  def query(self, test_id=None, harness=None):
+    """Returns results indexed for `test_id` and `harness`, oldest first.
+
+    Args:
+      test_id (str, optional): Only return results of this test.
+      harness (str, optional): Only return results of this harness.
+    """
+    sql = 'SELECT result FROM results'
+    where = []
+    params = []
+    if test_id is not None:
+      where.append('test_id = ?')
+      params.append(test_id)
+    if harness is not None:
+      where.append('harness = ?')
+      params.append(harness)
+    if where:
+      sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY timestamp, result_dir'
+    return [json.loads(row[0]) for row in self.conn.execute(sql, params)]
+
+  def put_suite(self, suite_dir, test_id, throughput, harness=None,
+                build=None, timestamp=None):
+    """Stores the aggregate throughput of a suite, replacing an older one.
+
+    Args:
+      suite_dir (str): Folder of the suite, the copies are in its subfolders.
+      test_id (str): Test the suite ran.
+      throughput (float): Mean throughput of the copies.
+      harness (str, optional): Name of the harness, e.g. mxnet_benchmark.
+      build (str, optional): Build tested, e.g. framework_describe.
+      timestamp (int, optional): Seconds since the epoch the suite started.
+    """
+    with self.conn:
+      self.conn.execute(
+          'INSERT OR REPLACE INTO suites VALUES (?, ?, ?, ?, ?, ?)',
+          (os.path.abspath(suite_dir), test_id, harness, build, timestamp,
+           throughput))
+
+  def query_suites(self, test_id, harness=None):
+    """Returns list of suite dicts stored for `test_id`, oldest first."""
+    sql = ('SELECT suite_dir, test_id, harness, build, timestamp, throughput '
+           'FROM suites WHERE test_id = ?')
+    params = [test_id]
+    if harness is not None:
+      sql += ' AND harness = ?'
+      params.append(harness)
+    sql += ' ORDER BY timestamp, suite_dir'
+    keys = ('suite_dir', 'test_id', 'harness', 'build', 'timestamp',
+            'throughput')
+    return [dict(zip(keys, row)) for row in self.conn.execute(sql, params)]
+
+  def close(self):
+    self.conn.close()
+
+
+def collect(folder_path, harness, result_files, parse_fn, index_path=None):
+  """Walks `folder_path` and returns a result for each run folder found.
+
+  Args:
+    folder_path: Folder to recursively search for runs.
+    harness: Name of the harness, e.g. tf_cnn_benchmark.
+    result_files: File names marking a run folder, e.g. config.yaml.
+    parse_fn: Called with the path of a file in `result_files` and returns
+      the result `dict` of the run.
+    index_path: SQLite file to reuse results from. Defaults to the path from
+      `set_index_path`.
+
+  Returns:
+    List of results in the order the folders were walked.
+  """
+  index_path = index_path or _index_path
+  index = ResultIndex(index_path) if index_path else None
+  results = []
+  try:
+    for r, _, files in os.walk(folder_path):
+      for f in files:
+        if f not in result_files:
+          continue
+        result_file = os.path.abspath(os.path.join(r, f))
+        if index is None:
+          results.append(parse_fn(os.path.join(r, f)))
+          continue
+        signature = _signature(r, files)
+        result = index.get(result_file, signature)
+        if result is None:
+          result = parse_fn(os.path.join(r, f))
+          if result is not None:
+            index.put(result_file, harness, signature, result)
+        results.append(result)
+  finally:
+    if index:
+      index.close()
+  return results
+
+
+def indexed(folder_path, result_files, index_path=None):
+  """Returns True if every run in `folder_path` is indexed and unchanged.
+
+  Args:
+    folder_path: Folder to recursively search for runs.
+    result_files: File names marking a run folder, e.g. config.yaml.
+    index_path: SQLite file to check. Defaults to the path from
+      `set_index_path`.
+
+  Returns:
+    False if there is no index, no run or a run that `collect` would parse.
+  """
+  index_path = index_path or _index_path
+  if not index_path or not os.path.isfile(index_path):
+    return False
+  index = ResultIndex(index_path)
+  found = False
+  try:
+    for r, _, files in os.walk(folder_path):
+      for f in files:
+        if f not in result_files:
+          continue
+        result_file = os.path.abspath(os.path.join(r, f))
+        if index.get(result_file, _signature(r, files)) is None:
+          return False
+        found = True
+  finally:
+    index.close()
+  return found
+
+
+def _signature(result_dir, files):
+  """Returns str that changes when any file in `result_dir` changes."""
+  stats = [INDEX_VERSION]
+  for f in sorted(files):
+    try:
+      stat = os.stat(os.path.join(result_dir, f))
+    except OSError:
+      continue
+    stats.append([f, stat.st_size, stat.st_mtime])
+  return json.dumps(stats)
@@ -0,0 +1,112 @@
+"""Tests result_index module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from test_runners.common import result_index
+
+
+class TestResultIndex(unittest.TestCase):
+  """Tests for collect and ResultIndex."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.index_path = os.path.join(self.tmp_dir, 'cache',
+                                   result_index.INDEX_FILE)
+    self.results_dir = os.path.join(self.tmp_dir, 'results')
+    self.parsed = []
+
+  def _write_run(self, name, test_id, log='images/sec: 10\n'):
+    run_dir = os.path.join(self.results_dir, name)
+    if not os.path.isdir(run_dir):
+      os.makedirs(run_dir)
+    with open(os.path.join(run_dir, 'config.yaml'), 'w') as f:
+      f.write('test_id: {}\n'.format(test_id))
+    with open(os.path.join(run_dir, 'worker_0_stdout.log'), 'w') as f:
+      f.write(log)
+    return run_dir
+
+  def _parse(self, config_file):
+    self.parsed.append(config_file)
+    with open(os.path.join(os.path.dirname(config_file),
+                           'worker_0_stdout.log')) as f:
+      log = f.read()
+    return {'test_id': os.path.basename(os.path.dirname(config_file)),
+            'log': log}
+
+  def _collect(self):
+    return result_index.collect(self.results_dir, 'harness', ('config.yaml',),
+                                self._parse, index_path=self.index_path)
+
+  def test_collect_parses_new_and_changed_runs(self):
+    """Tests only runs that are new or changed are parsed again."""
+    self._write_run('run_0', 'test_a')
+    self._write_run('run_1', 'test_b')
+    first = self._collect()
+    self.assertEqual(2, len(self.parsed))
+
+    self.parsed = []
+    by_test_id = lambda result: result['test_id']
+    self.assertEqual(sorted(first, key=by_test_id),
+                     sorted(self._collect(), key=by_test_id))
+    self.assertEqual([], self.parsed)
+
+    self._write_run('run_1', 'test_b', log='images/sec: 10\nimages/sec: 12\n')
+    self._write_run('run_2', 'test_c')
+    results = self._collect()
+    self.assertEqual(3, len(results))
+    self.assertEqual(
+        sorted(['run_1', 'run_2']),
+        sorted(os.path.basename(os.path.dirname(path))
+               for path in self.parsed))
+
+  def test_collect_without_index(self):
+    """Tests every run is parsed when no index is set."""
+    self._write_run('run_0', 'test_a')
+    for _ in range(2):
+      result_index.collect(self.results_dir, 'harness', ('config.yaml',),
+                           self._parse)
+    self.assertEqual(2, len(self.parsed))
+    self.assertFalse(os.path.exists(self.index_path))
+
+  def test_query(self):
+    """Tests results can be queried across suites by test_id."""
+    self._write_run('suite_0/run_0', 'test_a')
+    self._write_run('suite_1/run_0', 'test_a')
+    self._collect()
+    index = result_index.ResultIndex(self.index_path)
+    self.addCleanup(index.close)
+    self.assertEqual(2, len(index.query(harness='harness')))
+    self.assertEqual(2, len(index.query(test_id='run_0')))
+    self.assertEqual([], index.query(harness='other'))
+
+  def test_suites(self):
+    """Tests suites are stored once per folder and returned oldest first."""
+    index = result_index.ResultIndex(self.index_path)
+    self.addCleanup(index.close)
+    index.put_suite('/results/suite_1', 'test_a', 110.0, harness='harness',
+                    build='b2', timestamp=2)
+    index.put_suite('/results/suite_0', 'test_a', 100.0, harness='harness',
+                    build='b1', timestamp=1)
+    index.put_suite('/results/suite_1', 'test_a', 120.0, harness='harness',
+                    build='b2', timestamp=2)
+    suites = index.query_suites('test_a')
+    self.assertEqual([100.0, 120.0], [s['throughput'] for s in suites])
+    self.assertEqual('b1', suites[0]['build'])
+    self.assertEqual([], index.query_suites('test_a', harness='other'))
+
+  def test_indexed(self):
+    """Tests a folder is indexed only while every run in it is unchanged."""
+    self.assertFalse(result_index.indexed(self.results_dir, ('config.yaml',),
+                                          index_path=self.index_path))
+    self._write_run('run_0', 'test_a')
+    self._collect()
+    self.assertTrue(result_index.indexed(self.results_dir, ('config.yaml',),
+                                         index_path=self.index_path))
+    self._write_run('run_1', 'test_a')
+    self.assertFalse(result_index.indexed(self.results_dir, ('config.yaml',),
+                                          index_path=self.index_path))
@@ -0,0 +1,219 @@
+"""Packs independent single GPU tests onto disjoint GPUs and CPU cores."""
+from __future__ import print_function
+import multiprocessing
+import os
+import re
+import threading
+import traceback
+
+from six.moves import queue
+
+# Matches a CUDA_VISIBLE_DEVICES assignment in a config's `env_vars`.
+CUDA_VISIBLE_RE = re.compile(r'CUDA_VISIBLE_DEVICES=\S*\s*')
+
+
+def is_exclusive(config):
+  """Returns True if the test described by `config` must run by itself.
+
+  Isolation policy:
+    - `exclusive: True` in the config always wins.
+    - Tests on anything other than exactly one GPU run alone. Multi-GPU tests
+      (NCCL, replicated, parameter server) share PCIe/NVLink and host memory
+      bandwidth across GPUs and CPU only tests want every core.
+    - Tests reading real data (`data_dir`) run alone because they compete for
+      disk and page cache.
+
+  Args:
+    config: Test config, e.g. one entry from a tf_cnn_bench test suite.
+  """
+  if config.get('exclusive'):
+    return True
+  if config.get('gpus') != 1:
+    return True
+  if config.get('data_dir'):
+    return True
+  return False
+
+
+def available_cpus():
+  """Returns sorted list of CPU ids this process is allowed to run on."""
+  if hasattr(os, 'sched_getaffinity'):
+    return sorted(os.sched_getaffinity(0))
+  return list(range(multiprocessing.cpu_count()))
+
+
+def numa_cpu_sets(gpus, system):
+  """Returns a CPU set for each GPU taken from the GPU's NUMA node.
+
+  CPUs are ordered by core so hyperthread siblings end up in the same set.
+
+  Args:
+    gpus: GPU indexes.
+    system: `tools.inventory.get_inventory` result.
+
+  Returns:
+    List with a list of CPU ids for each GPU, or None if the topology is
+    unknown for any of the GPUs.
+  """
+  allowed = set(available_cpus())
+  node_cpus = {}
+  by_core = lambda c: (c['node'], c['socket'], c['core'], c['cpu'])
+  for cpu in sorted(system['cpus'], key=by_core):
+    if cpu['cpu'] in allowed:
+      node_cpus.setdefault(cpu['node'], []).append(cpu['cpu'])
+  gpu_nodes = dict(
+      (gpu['index'], gpu.get('numa_node', 0)) for gpu in system['gpus'])
+  node_gpus = {}
+  for gpu in gpus:
+    node = gpu_nodes.get(gpu)
+    if node not in node_cpus:
+      return None
+    node_gpus.setdefault(node, []).append(gpu)
+  gpu_cpus = {}
+  for node, node_gpu_list in node_gpus.items():
+    for gpu, cpu_set in zip(node_gpu_list,
+                            partition(node_cpus[node], len(node_gpu_list))):
+      gpu_cpus[gpu] = cpu_set
+  return [gpu_cpus[gpu] for gpu in gpus]
+
+
+def partition(items, parts):
+  """Splits `items` into `parts` contiguous lists of near equal size."""
+  size, extra = divmod(len(items), parts)
+  chunks = []
+  start = 0
+  for i in range(parts):
+    end = start + size + (1 if i < extra else 0)
+    chunks.append(items[start:end])
+    start = end
+  return chunks
+
+
+class Slot(object):
+  """GPUs and CPU cores handed to one test running alongside others.
+
+  Args:
+    gpus (list): GPU indexes the test may see.
+    cpus (list): CPU ids the test is pinned to. Empty list to not pin.
+  """
+
+  def __init__(self, gpus, cpus):
+    self.gpus = gpus
+    self.cpus = cpus
+
+  def env_vars(self, env_vars=None):
+    """Returns `env_vars` restricted to this slot's GPUs and CPUs.
+
+    Any CUDA_VISIBLE_DEVICES already in `env_vars` is replaced, so a config
+    written as `CUDA_VISIBLE_DEVICES=0` lands on the slot's GPU instead. The
+    result is placed in front of the python command, which means `taskset`
+    goes last.
+
+    Args:
+      env_vars (str): Environment variables from the test config.
+
+    Returns:
+      str to prefix the command with.
+    """
+    parts = ['CUDA_VISIBLE_DEVICES={}'.format(','.join(
+        str(gpu) for gpu in self.gpus))]
+    if env_vars:
+      env_vars = CUDA_VISIBLE_RE.sub('', env_vars).strip()
+      if env_vars:
+        parts.append(env_vars)
+    if self.cpus:
+      parts.append('taskset -c {}'.format(','.join(
+          str(cpu) for cpu in self.cpus)))
+    return ' '.join(parts)
+
+  def __str__(self):
+    return 'gpus:{} cpus:{}'.format(self.gpus, self.cpus)
+
+
+class GpuScheduler(object):
+  """Runs a suite of tests concurrently where the isolation policy allows.
+
+  Each GPU becomes a slot with an even share of the CPU cores, or the cores
+  in `cpu_sets`. Tests that are not exclusive are started on the next free
+  slot. An exclusive test waits for everything running to finish, runs alone
+  and then packing resumes. Copies of one test stay together and run in order.
+
+  Example:
+    gpu_scheduler = GpuScheduler(list(range(8)))
+    gpu_scheduler.run(test_suite, run_test_configs)
+
+  Args:
+    gpus (list): GPU indexes to pack tests onto.
+    cpus (list, optional): CPU ids shared out between the GPUs. Defaults to
+      every CPU available to the process. Pass an empty list to not pin tests
+      to cores.
+    exclusive_fn (callable, optional): Isolation policy taking a test config
+      and returning True if it must run alone. Defaults to `is_exclusive`.
+    cpu_sets (list, optional): CPU ids for each GPU, e.g. from
+      `numa_cpu_sets`. Overrides `cpus`.
+  """
+
+  def __init__(self, gpus, cpus=None, exclusive_fn=is_exclusive,
+               cpu_sets=None):
+    if cpus is None:
+      cpus = available_cpus()
+    self.exclusive_fn = exclusive_fn
+    self.slots = []
+    if gpus:
+      if cpu_sets is None:
+        cpu_sets = partition(cpus, len(gpus)) if cpus else [[]] * len(gpus)
+      for gpu, cpu_set in zip(gpus, cpu_sets):
+        self.slots.append(Slot([gpu], cpu_set))
+
+  def run(self, test_suite, run_fn):
+    """Runs every group of test configs in `test_suite`.
+
+    Args:
+      test_suite: List of lists of test configs. Each inner list holds the
+        copies of one test, see `command_builder.build_test_config_suite`.
+      run_fn: Called as run_fn(test_configs, slot) for each inner list. `slot`
+        is a `Slot` for tests packed with others and None for tests running
+        alone.
+
+    Raises:
+      Exception: the first error raised by `run_fn` in a packed test, after
+        all running tests have finished.
+    """
+    free_slots = queue.Queue()
+    for slot in self.slots:
+      free_slots.put(slot)
+    threads = []
+    errors = []
+    for test_configs in test_suite:
+      if not test_configs:
+        continue
+      if not self.slots or self.exclusive_fn(test_configs[0]):
+        self._join(threads)
+        print('Running {} exclusively'.format(test_configs[0].get('test_id')))
+        run_fn(test_configs, None)
+        continue
+      slot = free_slots.get()
+      print('Running {} on {}'.format(test_configs[0].get('test_id'), slot))
+      t = threading.Thread(
+          target=self._run_in_slot,
+          args=[run_fn, test_configs, slot, free_slots, errors])
+      t.start()
+      threads.append(t)
+    self._join(threads)
+    if errors:
+      raise errors[0]
+
+  def _run_in_slot(self, run_fn, test_configs, slot, free_slots, errors):
+    try:
+      run_fn(test_configs, slot)
+    except Exception as e:  # pylint: disable=broad-except
+      traceback.print_exc()
+      errors.append(e)
+    finally:
+      free_slots.put(slot)
+
+  def _join(self, threads):
+    """Waits for every running test, the barrier before exclusive tests."""
+    for t in threads:
+      t.join()
+    del threads[:]
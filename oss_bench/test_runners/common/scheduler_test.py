@@ -0,0 +1,100 @@
+"""Tests scheduler module."""
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+from mock import patch
+from test_runners.common import scheduler
+
+
+class TestScheduler(unittest.TestCase):
+  """Tests for GpuScheduler and the isolation policy."""
+
+  def test_is_exclusive(self):
+    """Tests multi-GPU, CPU, real data and flagged tests run alone."""
+    self.assertFalse(scheduler.is_exclusive({'gpus': 1}))
+    self.assertTrue(scheduler.is_exclusive({'gpus': 8}))
+    self.assertTrue(scheduler.is_exclusive({}))
+    self.assertTrue(scheduler.is_exclusive({'gpus': 1, 'data_dir': '/data'}))
+    self.assertTrue(scheduler.is_exclusive({'gpus': 1, 'exclusive': True}))
+
+  def test_partition(self):
+    """Tests cores are split into contiguous near equal sets."""
+    self.assertEqual([[0, 1], [2, 3], [4]],
+                     scheduler.partition(list(range(5)), 3))
+
+  @patch('test_runners.common.scheduler.available_cpus')
+  def test_numa_cpu_sets(self, available_cpus_mock):
+    """Tests GPUs get cores from their NUMA node with siblings together."""
+    available_cpus_mock.return_value = list(range(8))
+    cpus = []
+    for cpu in range(8):
+      cpus.append({'cpu': cpu, 'socket': (cpu % 4) // 2, 'core': cpu % 2,
+                   'node': (cpu % 4) // 2})
+    system = {
+        'cpus': cpus,
+        'gpus': [{'index': 0, 'numa_node': 0}, {'index': 1, 'numa_node': 0},
+                 {'index': 2, 'numa_node': 1}]
+    }
+    self.assertEqual([[0, 4], [1, 5], [2, 6, 3, 7]],
+                     scheduler.numa_cpu_sets([0, 1, 2], system))
+    self.assertIsNone(scheduler.numa_cpu_sets([3], system))
+
+  def test_slot_env_vars(self):
+    """Tests existing CUDA_VISIBLE_DEVICES is replaced and taskset added."""
+    slot = scheduler.Slot([3], [6, 7])
+    self.assertEqual(
+        'CUDA_VISIBLE_DEVICES=3 TF_FOO=1 taskset -c 6,7',
+        slot.env_vars('CUDA_VISIBLE_DEVICES=0 TF_FOO=1'))
+    slot = scheduler.Slot([1], [])
+    self.assertEqual('CUDA_VISIBLE_DEVICES=1', slot.env_vars())
+
+  def test_run(self):
+    """Tests single GPU tests overlap and exclusive tests run alone."""
+    lock = threading.Lock()
+    running = []
+    events = []
+
+    def run_fn(test_configs, slot):
+      test_id = test_configs[0]['test_id']
+      with lock:
+        running.append(test_id)
+        events.append((test_id, list(running), slot))
+      time.sleep(0.1)
+      with lock:
+        running.remove(test_id)
+
+    test_suite = [[{'test_id': 'a', 'gpus': 1}], [{'test_id': 'b', 'gpus': 1}],
+                  [{'test_id': 'c', 'gpus': 8}], [{'test_id': 'd', 'gpus': 1}]]
+    gpu_scheduler = scheduler.GpuScheduler([0, 1], cpus=list(range(4)))
+    gpu_scheduler.run(test_suite, run_fn)
+
+    seen = dict((test_id, (others, slot)) for test_id, others, slot in events)
+    # a and b were started together, c waited for both and ran alone.
+    self.assertEqual(['a', 'b'], seen['b'][0])
+    self.assertEqual(['c'], seen['c'][0])
+    self.assertIsNone(seen['c'][1])
+    self.assertEqual(['d'], seen['d'][0])
+    self.assertEqual([0], seen['a'][1].gpus)
+    self.assertEqual([0, 1], seen['a'][1].cpus)
+    self.assertEqual([1], seen['b'][1].gpus)
+    self.assertEqual([2, 3], seen['b'][1].cpus)
+
+  def test_run_error(self):
+    """Tests an error in a packed test is raised once all tests finish."""
+    finished = []
+
+    def run_fn(test_configs, _):
+      if test_configs[0]['test_id'] == 'bad':
+        raise ValueError('bad test')
+      time.sleep(0.05)
+      finished.append(test_configs[0]['test_id'])
+
+    test_suite = [[{'test_id': 'bad', 'gpus': 1}],
+                  [{'test_id': 'good', 'gpus': 1}]]
+    gpu_scheduler = scheduler.GpuScheduler([0, 1], cpus=[])
+    with self.assertRaises(ValueError):
+      gpu_scheduler.run(test_suite, run_fn)
+    self.assertEqual(['good'], finished)
@@ -0,0 +1,88 @@
+"""Detects where a benchmark's per step series leaves warmup.
+
+Reporting used to drop a fixed number of batches per framework. How long
+warmup lasts depends on the model, batch size, XLA, the input pipeline and
+more, so the boundary is instead found from the series with the Marginal
+Standard Error Rule (MSER). MSER picks the truncation point `d` minimizing
+
+  sum((x[d:] - mean(x[d:]))**2) / (n - d)**2
+
+which trades dropping the transient at the start against keeping enough
+samples for a tight mean.
+
+Example:
+  warmup = steady_state.detect_warmup(speeds)
+  stats = util.throughput_stats(util.rate_windows(speeds[warmup:]))
+"""
+from __future__ import print_function
+
+import numpy
+
+# Series shorter than this are used whole.
+MIN_SAMPLES = 5
+# Never drop more than this fraction of a series as warmup.
+MAX_WARMUP_FRACTION = 0.5
+# Two sided normal quantiles of supported confidence levels.
+Z_SCORES = {0.9: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+
+def mser(values, max_fraction=MAX_WARMUP_FRACTION):
+  """Returns list of the MSER statistic for each truncation point.
+
+  Args:
+    values: Per step values, e.g. examples/sec or step times.
+    max_fraction: Fraction of the series truncation points are tried in.
+  """
+  x = numpy.asarray(values, dtype=numpy.float64)
+  n = len(x)
+  last = max(int(n * max_fraction), 0)
+  # Sums of x[d:] and x[d:]**2 for every d.
+  sums = numpy.cumsum(x[::-1])[::-1]
+  squares = numpy.cumsum((x * x)[::-1])[::-1]
+  remaining = numpy.arange(n, 0, -1, dtype=numpy.float64)
+  sse = squares - sums * sums / remaining
+  return list((sse / (remaining * remaining))[:last + 1])
+
+
+def detect_warmup(values, min_samples=MIN_SAMPLES,
+                  max_fraction=MAX_WARMUP_FRACTION):
+  """Returns index of the first value of the steady state.
+
+  Args:
+    values: Per step values in the order they were logged, e.g. the rate of
+      each window.
+    min_samples: Series shorter than this have no warmup removed.
+    max_fraction: Most of the series that can be warmup.
+
+  Returns:
+    int index into `values`, 0 if nothing is dropped.
+  """
+  if len(values) < min_samples:
+    return 0
+  stats = mser(values, max_fraction=max_fraction)
+  return int(numpy.argmin(stats))
+
+
+def relative_ci(values, confidence=0.95):
+  """Returns half width of the confidence interval of the mean over the mean.
+
+  Uses the normal approximation, so it needs a few dozen values to be
+  meaningful. Steps next to each other are correlated, which makes it
+  optimistic, callers should require a minimum number of values.
+
+  Args:
+    values: Per step values after warmup, e.g. seconds per window.
+    confidence: One of `Z_SCORES`.
+
+  Returns:
+    float, e.g. 0.01 for a mean known to within 1%. inf for fewer than two
+    values or a mean of 0.
+  """
+  x = numpy.asarray(values, dtype=numpy.float64)
+  if len(x) < 2:
+    return float('inf')
+  mean = x.mean()
+  if mean == 0:
+    return float('inf')
+  half_width = Z_SCORES[confidence] * x.std(ddof=1) / numpy.sqrt(len(x))
+  return float(abs(half_width / mean))
@@ -0,0 +1,44 @@
+"""Tests steady_state module."""
+from __future__ import print_function
+
+import unittest
+
+import numpy
+
+from test_runners.common import steady_state
+
+
+class TestSteadyState(unittest.TestCase):
+  """Tests for detecting the end of warmup."""
+
+  def test_detect_warmup(self):
+    """Tests slow first steps are found as warmup."""
+    values = [5, 40, 80] + [100, 102, 98, 101, 99] * 4
+    self.assertEqual(3, steady_state.detect_warmup(values))
+
+  def test_detect_warmup_stable(self):
+    """Tests nothing is dropped from a series without warmup."""
+    values = [100, 102, 98, 101, 99] * 4
+    self.assertEqual(0, steady_state.detect_warmup(values))
+
+  def test_detect_warmup_short(self):
+    """Tests series shorter than min_samples are used whole."""
+    self.assertEqual(0, steady_state.detect_warmup([1, 100, 100]))
+    self.assertEqual(0, steady_state.detect_warmup([]))
+
+  def test_detect_warmup_max_fraction(self):
+    """Tests at most max_fraction of the series is dropped."""
+    values = list(range(1, 21))
+    self.assertLessEqual(steady_state.detect_warmup(values), 10)
+    self.assertLessEqual(
+        steady_state.detect_warmup(values, max_fraction=0.25), 5)
+
+
+  def test_relative_ci(self):
+    """Tests the interval shrinks with more values and handles few values."""
+    values = [0.9, 1.1] * 10
+    self.assertAlmostEqual(1.96 * numpy.std(values, ddof=1) / numpy.sqrt(20),
+                           steady_state.relative_ci(values))
+    self.assertLess(steady_state.relative_ci(values * 4),
+                    steady_state.relative_ci(values))
+    self.assertEqual(float('inf'), steady_state.relative_ci([1.0]))
@@ -0,0 +1,248 @@
+"""Conditions checked against live benchmark output to end a run early."""
+from __future__ import print_function
+import re
+import time
+
+from test_runners.common import steady_state
+
+
+class StopCondition(object):
+  """Base class for a predicate checked against each line of output.
+
+  `LocalInstance` calls `start` when the command starts and `check` for every
+  line it reads. The first matching line records the step, if one can be
+  parsed from the line, and the time the condition fired.
+
+  Args:
+    description (str): Short description used when printing.
+  """
+
+  def __init__(self, description):
+    self.description = description
+    self.start_time = None
+    self.fired = False
+    self.fired_time = None
+    self.step = None
+    self.line = None
+
+  def start(self, start_time=None):
+    """Resets the condition for a new run starting at `start_time`."""
+    self.start_time = time.time() if start_time is None else start_time
+    self.fired = False
+    self.fired_time = None
+    self.step = None
+    self.line = None
+
+  def check(self, line):
+    """Returns True if `line` satisfies the condition, recording the match."""
+    if self.fired:
+      return True
+    matched, step = self._match(line)
+    if matched:
+      self.fired = True
+      self.fired_time = time.time()
+      self.step = step
+      self.line = line
+    return matched
+
+  @property
+  def elapsed_ms(self):
+    """Milliseconds from `start` until the condition fired."""
+    if not self.fired or self.start_time is None:
+      return None
+    return int(round((self.fired_time - self.start_time) * 1000))
+
+  def _match(self, line):
+    """Returns tuple of (matched, step) for the line."""
+    raise NotImplementedError()
+
+  def __str__(self):
+    if self.fired:
+      return '{} fired at step {} after {}ms'.format(self.description,
+                                                     self.step,
+                                                     self.elapsed_ms)
+    return self.description
+
+
+class SubstringStop(StopCondition):
+  """Fires on the first line containing `substring`.
+
+  Args:
+    substring (str): Text to look for.
+    step (int, optional): Step recorded when the condition fires.
+  """
+
+  def __init__(self, substring, step=None):
+    super(SubstringStop, self).__init__('substring "{}"'.format(substring))
+    self.substring = substring
+    self.fire_step = step
+
+  def _match(self, line):
+    return self.substring in line, self.fire_step
+
+
+class RegexStop(StopCondition):
+  """Fires on the first line matching `pattern`.
+
+  Args:
+    pattern (str): Regex searched for in each line.
+    step_group (int or str, optional): Group holding the step number.
+    hint (str, optional): Substring every matching line contains. Lines
+      without it skip the regex, which keeps the per line cost low.
+  """
+
+  def __init__(self, pattern, step_group=None, hint=None):
+    super(RegexStop, self).__init__('regex "{}"'.format(pattern))
+    self.regex = re.compile(pattern)
+    self.step_group = step_group
+    self.hint = hint
+
+  def _search(self, line):
+    if self.hint is not None and self.hint not in line:
+      return None
+    return self.regex.search(line)
+
+  def _step(self, match):
+    if self.step_group is None:
+      return None
+    return int(match.group(self.step_group))
+
+  def _match(self, line):
+    match = self._search(line)
+    if match is None:
+      return False, None
+    return True, self._step(match)
+
+
+class StepStop(RegexStop):
+  """Fires once the step parsed from a line reaches `total_steps`.
+
+  Args:
+    pattern (str): Regex whose first group is the step number.
+    total_steps (int): Step at or after which the run is stopped.
+    hint (str, optional): Substring every matching line contains.
+  """
+
+  def __init__(self, pattern, total_steps, hint=None):
+    super(StepStop, self).__init__(pattern, step_group=1, hint=hint)
+    self.total_steps = total_steps
+    self.description = 'step {} of "{}"'.format(total_steps, pattern)
+
+  def _match(self, line):
+    match = self._search(line)
+    if match is None:
+      return False, None
+    step = self._step(match)
+    return step >= self.total_steps, step
+
+
+class ConvergenceStop(StopCondition):
+  """Fires once steady state throughput is known to within `tolerance`.
+
+  Each line is parsed with the harness's step pattern. The seconds each
+  logged window took are collected, warmup is dropped with
+  `steady_state.detect_warmup` and the run is stopped when the relative
+  confidence interval of the mean of the rest is within `tolerance`.
+  Throughput is examples over seconds, so this bounds its interval too.
+  The run is stopped at `max_steps` whether it converged or not. The
+  interval is computed over all windows so it is only checked again once
+  `eval_every` more windows are logged, which keeps frequent step lines cheap.
+
+  Args:
+    parser (log_parser.LogParser): Parser of the harness's step records.
+      Records need a step and either a time or a value, examples/sec.
+    tolerance (float): Relative half width to stop at, e.g. 0.01 for 1%.
+    max_steps (int): Step at or after which the run is always stopped.
+    min_steps (int, optional): Step before which the run is never stopped.
+    min_windows (int, optional): Windows after warmup needed to stop.
+    confidence (float, optional): One of `steady_state.Z_SCORES`.
+    eval_every (int, optional): Windows logged between checks of the
+      interval, the first check is once `min_steps` is reached.
+  """
+
+  def __init__(self, parser, tolerance, max_steps, min_steps=0,
+               min_windows=20, confidence=0.95, eval_every=10):
+    super(ConvergenceStop, self).__init__(
+        'throughput within {:.2%} or step {}'.format(tolerance, max_steps))
+    self.parser = parser
+    self.tolerance = tolerance
+    self.max_steps = max_steps
+    self.min_steps = min_steps
+    self.min_windows = min_windows
+    self.confidence = confidence
+    self.eval_every = eval_every
+    self.window_seconds = []
+    self.converged = False
+    self.relative_ci = None
+    # Number of windows at the last check, None before the first.
+    self._checked_windows = None
+
+  def start(self, start_time=None):
+    super(ConvergenceStop, self).start(start_time)
+    self.window_seconds = []
+    self.converged = False
+    self.relative_ci = None
+    self._checked_windows = None
+
+  def _match(self, line):
+    step = None
+    for record in self.parser.parse_line(line):
+      seconds = _window_seconds(record)
+      if seconds is None:
+        continue
+      self.window_seconds.append(seconds)
+      step = record['step']
+    if step is None:
+      return False, None
+    if step >= self.max_steps:
+      return True, step
+    if step < self.min_steps:
+      return False, step
+    windows = len(self.window_seconds)
+    if (self._checked_windows is not None and
+        windows - self._checked_windows < self.eval_every):
+      return False, step
+    self._checked_windows = windows
+    warmup = steady_state.detect_warmup(self.window_seconds)
+    steady = self.window_seconds[warmup:]
+    if len(steady) < self.min_windows:
+      return False, step
+    self.relative_ci = steady_state.relative_ci(steady, self.confidence)
+    self.converged = self.relative_ci <= self.tolerance
+    return self.converged, step
+
+  def __str__(self):
+    if self.converged:
+      return 'throughput within {:.2%} at step {} after {}ms'.format(
+          self.relative_ci, self.step, self.elapsed_ms)
+    return super(ConvergenceStop, self).__str__()
+
+
+def _window_seconds(record):
+  """Returns seconds of a logged window, for rates seconds per example."""
+  if record.get('time'):
+    return record['time']
+  if record.get('value'):
+    return 1.0 / record['value']
+  return None
+
+
+def build_step_stop(test_config, parser, pattern, hint=None):
+  """Returns the condition ending a run at `test_config['total_batches']`.
+
+  Runs whose config sets `convergence_tolerance` stop early with
+  `ConvergenceStop`, not before `min_batches` if set. Other runs stop at the
+  total with `StepStop`.
+
+  Args:
+    test_config (dict): Config of the test.
+    parser (log_parser.LogParser): Parser of the harness's step records.
+    pattern (str): Regex whose first group is the step, for `StepStop`.
+    hint (str, optional): Substring every matching line contains.
+  """
+  total_batches = test_config['total_batches']
+  tolerance = test_config.get('convergence_tolerance')
+  if tolerance:
+    return ConvergenceStop(parser, tolerance, total_batches,
+                           min_steps=test_config.get('min_batches', 0))
+  return StepStop(pattern, total_batches, hint=hint)
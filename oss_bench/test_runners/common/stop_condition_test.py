@@ -0,0 +1,122 @@
+"""Tests stop_condition module."""
+from __future__ import print_function
+
+import unittest
+
+from mock import patch
+from test_runners.common import log_parser
+from test_runners.common import stop_condition
+from test_runners.mxnet import reporting as mxnet_reporting
+
+MXNET_LINE = 'INFO:root:Epoch[0] Batch [{}]\tSpeed: {} samples/sec'
+
+
+class TestStopCondition(unittest.TestCase):
+  """Tests for stop conditions."""
+
+  def test_substring_stop(self):
+    """Tests substring fires once and records the step it was given."""
+    stop = stop_condition.SubstringStop('[150]', step=150)
+    stop.start(start_time=0)
+    self.assertFalse(stop.check('Epoch[0] Batch [145] Speed: 178.18'))
+    self.assertTrue(stop.check('Epoch[0] Batch [150] Speed: 178.18'))
+    self.assertTrue(stop.fired)
+    self.assertEqual(150, stop.step)
+    self.assertIn('[150]', stop.line)
+
+  def test_regex_stop(self):
+    """Tests regex records the step from the step group."""
+    stop = stop_condition.RegexStop(r'step = (\d+)', step_group=1)
+    stop.start()
+    self.assertFalse(stop.check('loss = 8.39'))
+    self.assertTrue(stop.check('loss = 8.50, step = 100 (47.855 sec)'))
+    self.assertEqual(100, stop.step)
+    self.assertGreaterEqual(stop.elapsed_ms, 0)
+
+  def test_step_stop(self):
+    """Tests step threshold fires on the first step at or past the total."""
+    stop = stop_condition.StepStop(
+        r'Epoch: \[\d+\]\[\s*(\d+)/', 300, hint='Epoch')
+    stop.start()
+    self.assertFalse(stop.check('Epoch: [0][  290/10010] Time  0.361'))
+    self.assertFalse(stop.check('Test: [0][  300/10010] Time  0.361'))
+    self.assertTrue(stop.check('Epoch: [0][  310/10010] Time  0.361'))
+    self.assertEqual(310, stop.step)
+
+  def test_step_stop_no_partial_match(self):
+    """Tests 1300 does not look like 300 the way a substring match would."""
+    stop = stop_condition.StepStop(r'\[\s*(\d+)/', 3000)
+    stop.start()
+    self.assertFalse(stop.check('Epoch: [0][ 300/10010]'))
+    self.assertFalse(stop.fired)
+    self.assertIsNone(stop.elapsed_ms)
+
+  def test_start_resets(self):
+    """Tests start clears a previous run."""
+    stop = stop_condition.SubstringStop('done')
+    stop.start()
+    stop.check('done')
+    stop.start()
+    self.assertFalse(stop.fired)
+    self.assertIsNone(stop.line)
+
+  def _mxnet_stop(self, **kwargs):
+    parser = log_parser.LogParser(mxnet_reporting.LOG_PATTERNS)
+    stop = stop_condition.ConvergenceStop(parser, 0.01, 1000, **kwargs)
+    stop.start()
+    return stop
+
+  def test_convergence_stop(self):
+    """Tests a run stops once throughput after warmup has settled."""
+    stop = self._mxnet_stop(min_windows=10)
+    speeds = [20, 80, 150] + [180, 181, 179] * 10
+    step = 0
+    for step, speed in enumerate(speeds):
+      if stop.check(MXNET_LINE.format(step, speed)):
+        break
+    self.assertTrue(stop.converged)
+    self.assertLess(step, len(speeds) - 1)
+    self.assertLessEqual(stop.relative_ci, 0.01)
+    self.assertEqual(step, stop.step)
+
+  def test_convergence_stop_min_steps(self):
+    """Tests a run is not stopped before min_steps even if it converged."""
+    stop = self._mxnet_stop(min_steps=50, min_windows=5)
+    for step in range(50):
+      self.assertFalse(stop.check(MXNET_LINE.format(step, 180)))
+    self.assertTrue(stop.check(MXNET_LINE.format(50, 180)))
+
+  @patch('test_runners.common.steady_state.detect_warmup')
+  def test_convergence_stop_eval_every(self, detect_warmup_mock):
+    """Tests the interval is checked every `eval_every` windows."""
+    detect_warmup_mock.return_value = 0
+    stop = self._mxnet_stop(min_steps=5, eval_every=10)
+    for step in range(36):
+      stop.check(MXNET_LINE.format(step, 100 + 200 * (step % 2)))
+    self.assertFalse(stop.converged)
+    # Checked at steps 5, 15, 25 and 35.
+    self.assertEqual(4, detect_warmup_mock.call_count)
+    stop.start()
+    stop.check(MXNET_LINE.format(5, 180))
+    self.assertEqual(5, detect_warmup_mock.call_count)
+
+  def test_convergence_stop_max_steps(self):
+    """Tests a noisy run is stopped at max_steps without converging."""
+    stop = self._mxnet_stop()
+    self.assertFalse(stop.check(MXNET_LINE.format(10, 100)))
+    self.assertFalse(stop.check('unrelated line'))
+    self.assertTrue(stop.check(MXNET_LINE.format(1000, 300)))
+    self.assertFalse(stop.converged)
+    self.assertEqual(1000, stop.step)
+
+  def test_build_step_stop(self):
+    """Tests the tolerance in the config selects convergence stopping."""
+    parser = log_parser.LogParser(mxnet_reporting.LOG_PATTERNS)
+    config = {'total_batches': 150}
+    stop = stop_condition.build_step_stop(config, parser, r'Batch \[(\d+)\]')
+    self.assertIsInstance(stop, stop_condition.StepStop)
+    config.update({'convergence_tolerance': 0.02, 'min_batches': 40})
+    stop = stop_condition.build_step_stop(config, parser, r'Batch \[(\d+)\]')
+    self.assertIsInstance(stop, stop_condition.ConvergenceStop)
+    self.assertEqual(150, stop.max_steps)
+    self.assertEqual(40, stop.min_steps)
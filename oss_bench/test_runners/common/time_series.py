@@ -0,0 +1,110 @@
+"""Per step time series of a run stored as a NumPy structured array.
+
+Reporting keeps one number per run. The steps behind it are saved next to
+config.yaml in `STEPS_FILE`, one row per logged step with the columns in
+`DTYPE`. Values a framework does not log are NaN. Files are loaded memory
+mapped, so reading thousands of runs only touches the pages used.
+
+Example:
+  runs = time_series.load_runs('/workspace/results')
+  for result_dir, steps in runs.items():
+    print(result_dir, numpy.nanstd(steps['step_time']))
+"""
+from __future__ import print_function
+import os
+
+import numpy
+
+STEPS_FILE = 'steps.npy'
+
+DTYPE = numpy.dtype([
+    ('step', numpy.int64),
+    # Seconds since the epoch the step was logged at.
+    ('timestamp', numpy.float64),
+    # Seconds the step, or the window of steps, took.
+    ('step_time', numpy.float64),
+    # Examples per second.
+    ('throughput', numpy.float64),
+    ('loss', numpy.float64),
+])
+
+# Key of each column in `log_parser` records.
+RECORD_KEYS = {
+    'step': 'step',
+    'timestamp': 'timestamp',
+    'step_time': 'time',
+    'throughput': 'value',
+    'loss': 'loss',
+}
+
+
+def from_records(records, examples_per_step=None):
+  """Returns array of `DTYPE` built from `log_parser` step records.
+
+  Args:
+    records: list of dicts with step and any of timestamp, time, value
+      (throughput) and loss.
+    examples_per_step: Examples in a step. Used to fill in the throughput of
+      records that only have a time.
+  """
+  steps = numpy.zeros(len(records), dtype=DTYPE)
+  steps['step'] = -1
+  for column in DTYPE.names[1:]:
+    steps[column] = numpy.nan
+  for i, record in enumerate(records):
+    for column, key in RECORD_KEYS.items():
+      value = record.get(key)
+      if value is not None:
+        steps[column][i] = value
+  if examples_per_step:
+    missing = numpy.isnan(steps['throughput']) & (steps['step_time'] > 0)
+    steps['throughput'][missing] = (
+        examples_per_step / steps['step_time'][missing])
+  return steps
+
+
+def write(result_dir, steps):
+  """Writes `steps` to `STEPS_FILE` in `result_dir`, replacing it atomically.
+
+  Returns:
+    Path of the file written.
+  """
+  path = os.path.join(result_dir, STEPS_FILE)
+  tmp_file = '{}.{}.tmp'.format(path, os.getpid())
+  with open(tmp_file, 'wb') as f:
+    numpy.save(f, numpy.asarray(steps, dtype=DTYPE))
+  os.rename(tmp_file, path)
+  return path
+
+
+def write_records(result_dir, records, examples_per_step=None):
+  """Writes `log_parser` step records of a run, see `from_records`."""
+  return write(result_dir, from_records(records, examples_per_step))
+
+
+def load(result_dir, mmap_mode='r'):
+  """Returns the steps of a run, memory mapped, or None if there are none.
+
+  Args:
+    result_dir: Folder of a run.
+    mmap_mode: Passed to `numpy.load`. None to read the file into memory.
+  """
+  path = os.path.join(result_dir, STEPS_FILE)
+  if not os.path.isfile(path):
+    return None
+  return numpy.load(path, mmap_mode=mmap_mode)
+
+
+def load_runs(folder_path, mmap_mode='r'):
+  """Returns dict of result_dir to memory mapped steps for runs in a folder.
+
+  Args:
+    folder_path: Folder searched recursively, e.g. a suite or the workspace
+      results folder.
+    mmap_mode: Passed to `numpy.load`.
+  """
+  runs = {}
+  for r, _, files in os.walk(folder_path):
+    if STEPS_FILE in files:
+      runs[r] = load(r, mmap_mode=mmap_mode)
+  return runs
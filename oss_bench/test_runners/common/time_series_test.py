@@ -0,0 +1,51 @@
+"""Tests time_series module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+from test_runners.common import time_series
+
+
+class TestTimeSeries(unittest.TestCase):
+  """Tests for writing and loading per step time series."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+  def test_from_records(self):
+    """Tests columns are filled from records and missing values are NaN."""
+    steps = time_series.from_records(
+        [{'step': 1, 'time': 0.5, 'loss': 7.1},
+         {'step': 2, 'value': 300.0, 'timestamp': 1534524981.7}],
+        examples_per_step=64)
+    self.assertEqual([1, 2], list(steps['step']))
+    self.assertEqual(128, steps['throughput'][0])
+    self.assertEqual(300, steps['throughput'][1])
+    self.assertTrue(numpy.isnan(steps['loss'][1]))
+    self.assertTrue(numpy.isnan(steps['timestamp'][0]))
+
+  def test_write_load_runs(self):
+    """Tests runs come back memory mapped from a folder of runs."""
+    for name in ('run_0', 'run_1'):
+      run_dir = os.path.join(self.tmp_dir, name)
+      os.makedirs(run_dir)
+      time_series.write_records(run_dir, [{'step': i, 'value': 10.0 * i}
+                                          for i in range(3)])
+    os.makedirs(os.path.join(self.tmp_dir, 'no_steps'))
+
+    runs = time_series.load_runs(self.tmp_dir)
+    self.assertEqual(2, len(runs))
+    steps = runs[os.path.join(self.tmp_dir, 'run_1')]
+    self.assertIsInstance(steps, numpy.memmap)
+    self.assertEqual([0, 10, 20], list(steps['throughput']))
+    self.assertIsNone(
+        time_series.load(os.path.join(self.tmp_dir, 'no_steps')))
+
+  def test_empty(self):
+    time_series.write_records(self.tmp_dir, [])
+    self.assertEqual(0, len(time_series.load(self.tmp_dir)))
@@ -4,8 +4,23 @@ from __future__ import print_function
 import os
 
 import numpy
+from test_runners.common import log_store
+from test_runners.common import regression
+from test_runners.common import steady_state
+import tools.proc_stats as proc_stats
 from upload import result_info
 from upload import result_upload
+import yaml
+
+# Harness config keys to stop runs once throughput converges, see
+# `stop_condition.build_step_stop`.
+CONVERGENCE_KEYS = ('convergence_tolerance', 'min_batches')
+# Harness config keys to run copies until they agree, see `adaptive_repeat`.
+REPEAT_KEYS = ('min_repeat', 'max_repeat', 'repeat_cv', 'repeat_ci')
+# Harness config keys for how run logs are stored, see `log_store`.
+LOG_KEYS = ('compress_logs',)
+# Written to the suite folder by tests with adaptive repeats.
+REPEAT_FILE = 'repeat.yaml'
 
 
 def report_config_defaults(report_config, test_harness=None):
@@ -47,6 +62,8 @@ def upload_results(report_config, agg_result, framework=None,
 
   report_config = report_config_defaults(
       report_config, test_harness=test_harness)
+  # Flags a drop against earlier builds in the row's extras.
+  regression.check(agg_result, report_config, report_config['test_harness'])
 
   # Main result config
   test_result, results = result_info.build_test_result(
@@ -97,7 +114,29 @@ def upload_results(report_config, agg_result, framework=None,
       test_info=test_info,
       system_info=system_info,
       extras=agg_result,
-      stream=True)
+      stream=True,
+      result_id=_result_id(agg_result))
+
+
+def _result_id(agg_result):
+  """Returns the result_id, which is the same each time a folder is processed.
+
+  Returns None, a random id, for results that did not come from a folder.
+  """
+  if not agg_result.get('result_dir'):
+    return None
+  config = agg_result['config']
+  return result_upload.build_result_id(
+      agg_result['result_dir'],
+      config['test_id'],
+      copy_index=config.get('copy', 0),
+      timestamp=config.get('timestamp'))
+
+
+def _copy_order(result):
+  """Returns sort key of a result by copy index and then result_dir."""
+  config = result.get('config') or {}
+  return int(config.get('copy', 0) or 0), result.get('result_dir', '')
 
 
 def report_aggregate_results(results_list):
@@ -109,10 +148,10 @@ def report_aggregate_results(results_list):
   Returns:
     dict summarizing the results in the list.
   """
-  agg_result = {}
-  # Assumes first entry has same test_id as the rest of the results.
-  agg_result['test_id'] = results_list[0]['test_id']
-  agg_result = results_list[0].copy()
+  # Assumes every entry has the same test_id. The first copy is picked no
+  # matter the order the folders were walked in, its config and result_dir
+  # stand for the aggregate, e.g. in the result_id.
+  agg_result = min(results_list, key=_copy_order).copy()
 
   # Groups the results to then be aggregated
   results = []
@@ -125,6 +164,10 @@ def report_aggregate_results(results_list):
       collect_extra_results(all_extra_results, result['raw_extra_results'])
 
   aggregate_results(agg_result, results)
+  if agg_result.get('result_dir'):
+    repeat_info = load_repeat_info(os.path.dirname(agg_result['result_dir']))
+    if repeat_info:
+      agg_result['repeat'] = repeat_info
   if all_extra_results:
     extra_results = aggregate_extra_results(all_extra_results)
     agg_result['extra_results'] = extra_results
@@ -150,6 +193,106 @@ def aggregate_results(agg_result, results):
   return agg_result
 
 
+def rate_windows(rates, examples_per_window=1.0):
+  """Returns (examples, seconds) windows for rates logged over equal windows.
+
+  Frameworks print a rate, e.g. samples/sec, every N batches. Each of those
+  windows holds the same number of examples, so the time of a window is its
+  examples over its rate. The unit of `examples_per_window` cancels out of
+  `throughput_stats`, which means it can be left as 1 if it is not known.
+
+  Args:
+    rates: Examples per second of each window.
+    examples_per_window: Examples processed in each window.
+  """
+  return [(examples_per_window, examples_per_window / float(rate))
+          for rate in rates
+          if rate > 0]
+
+
+def throughput_stats(windows):
+  """Returns throughput over measured windows and per window statistics.
+
+  Throughput is total examples over total time. Averaging the rates of the
+  windows instead gives fast windows too much weight, e.g. 100 and 300
+  examples/sec over equal numbers of examples is 150 examples/sec and not
+  200.
+
+  Args:
+    windows: list of (examples, seconds) tuples, e.g. one per logged step or
+      from `rate_windows`.
+
+  Returns:
+    dict with throughput, examples, seconds and windows, plus harmonic_mean,
+    min, max and std of the per window rates. All 0 without windows.
+  """
+  windows = [(examples, seconds) for examples, seconds in windows
+             if seconds > 0]
+  stats = dict((key, 0) for key in ('throughput', 'examples', 'seconds',
+                                    'windows', 'harmonic_mean', 'min', 'max',
+                                    'std'))
+  if not windows:
+    return stats
+  examples = numpy.array([w[0] for w in windows], dtype=numpy.float64)
+  seconds = numpy.array([w[1] for w in windows], dtype=numpy.float64)
+  rates = examples / seconds
+  stats['examples'] = float(examples.sum())
+  stats['seconds'] = float(seconds.sum())
+  stats['throughput'] = stats['examples'] / stats['seconds']
+  stats['windows'] = len(windows)
+  stats['harmonic_mean'] = float(len(rates) / (1.0 / rates).sum())
+  stats['min'] = float(rates.min())
+  stats['max'] = float(rates.max())
+  # Spread of the rates weighted by the time spent in each window.
+  stats['std'] = float(
+      numpy.sqrt(numpy.average((rates - stats['throughput'])**2,
+                               weights=seconds)))
+  return stats
+
+
+def measure_steady_state(result, records, windows, warmup_steps=0):
+  """Sets throughput of the steps of a run after warmup on `result`.
+
+  The warmup boundary is found from the rates of the windows, see
+  `steady_state.detect_warmup`. Runs logging too few windows for that drop
+  the windows up to `warmup_steps` instead, the old fixed cutoff.
+
+  Args:
+    result: Result dict of the run. Gets imgs_sec, batches_sampled,
+      throughput_stats and warmup set.
+    records: `log_parser` step records, one per window in log order.
+    windows: list of (examples, seconds) of each record.
+    warmup_steps: Steps dropped when the series is too short to detect
+      warmup.
+
+  Returns:
+    Index of the first window measured.
+  """
+  if len(windows) < steady_state.MIN_SAMPLES:
+    warmup = len(records)
+    for i, record in enumerate(records):
+      if record['step'] > warmup_steps:
+        warmup = i
+        break
+    method = 'fixed'
+  else:
+    rates = [examples / float(seconds) if seconds > 0 else 0.0
+             for examples, seconds in windows]
+    warmup = steady_state.detect_warmup(rates)
+    method = 'mser'
+  stats = throughput_stats(windows[warmup:])
+  result['imgs_sec'] = stats['throughput']
+  result['batches_sampled'] = len(windows) - warmup
+  result['throughput_stats'] = stats
+  result['warmup'] = {
+      'method': method,
+      'windows': warmup,
+      # First step measured, None if every step was warmup.
+      'step': records[warmup]['step'] if warmup < len(records) else None,
+  }
+  return warmup
+
+
 def aggregate_extra_results(result_dict):
   """Aggregate results by type."""
   agg_results = []
@@ -179,6 +322,119 @@ def collect_extra_results(result_dict, extra_results):
     result_dict[result_type] = result
 
 
+def write_extra_results(result_dir, extra_results):
+  """Writes extra_results.yaml to the result directory.
+
+  Args:
+    result_dir: Directory of a single run.
+    extra_results: list of results built with `result_info.build_result_info`.
+  """
+  with open(os.path.join(result_dir, 'extra_results.yaml'), 'w') as f:
+    f.write(yaml.dump(extra_results))
+
+
+def load_extra_results(result_dir):
+  """Returns list of extra results for a run or None if there are none."""
+  extra_results_file = os.path.join(result_dir, 'extra_results.yaml')
+  if not os.path.isfile(extra_results_file):
+    return None
+  with open(extra_results_file) as f:
+    return yaml.safe_load(f)
+
+
+def compress_logs(result_dir, test_config):
+  """Compresses the logs of a finished run unless `compress_logs` is False.
+
+  Call after everything reading the logs during the run, e.g. the time
+  series, has been written. Reporting reads the compressed logs in place.
+  """
+  if test_config.get('compress_logs', True):
+    log_store.compress_run(result_dir)
+
+
+def add_harness_config(config, auto_test_config):
+  """Copies run length, repeat and log settings of the harness into a config.
+
+  Args:
+    config: Test config to update.
+    auto_test_config: Harness config, may set any of `CONVERGENCE_KEYS`,
+      `REPEAT_KEYS` and `LOG_KEYS`.
+
+  Returns:
+    config.
+  """
+  for key in CONVERGENCE_KEYS + REPEAT_KEYS + LOG_KEYS:
+    if auto_test_config and key in auto_test_config:
+      config[key] = auto_test_config[key]
+  return config
+
+
+def write_repeat_info(suite_dir, repeat_info):
+  """Writes how many copies of a test ran and why to the suite folder."""
+  with open(os.path.join(suite_dir, REPEAT_FILE), 'w') as f:
+    f.write(yaml.dump(repeat_info))
+
+
+def load_repeat_info(suite_dir):
+  """Returns dict written by `write_repeat_info` or None if there is none."""
+  repeat_file = os.path.join(suite_dir, REPEAT_FILE)
+  if not os.path.isfile(repeat_file):
+    return None
+  with open(repeat_file) as f:
+    return yaml.safe_load(f)
+
+
+def build_stop_results(extra_results, stop):
+  """Appends step and time a `stop_condition.StopCondition` fired at.
+
+  Args:
+    extra_results: list of results to append to.
+    stop: `stop_condition.StopCondition` used for the run.
+
+  Returns:
+    extra_results with the stop results appended if the condition fired.
+  """
+  if stop.fired:
+    if stop.step is not None:
+      result_info.build_result_info(
+          extra_results, stop.step, 'stop_step', result_units='steps')
+    result_info.build_result_info(extra_results, stop.elapsed_ms, 'stop_time')
+    if getattr(stop, 'converged', False):
+      # Relative confidence interval of throughput the run stopped at.
+      result_info.build_result_info(extra_results, stop.relative_ci,
+                                    'stop_throughput_ci', result_units='ratio')
+  return extra_results
+
+
+def build_resource_results(extra_results, resource_usage,
+                           harness_cpu_time=None):
+  """Appends resource usage of a run's process group and of the harness.
+
+  Args:
+    extra_results: list of results to append to.
+    resource_usage: dict from `LocalInstance.resource_usage`, may be None.
+    harness_cpu_time: Seconds of CPU the harness spent streaming the run's
+      output, from `LocalInstance.harness_cpu_time`, may be None.
+
+  Returns:
+    extra_results with a result for each resource, e.g. cpu_user_time.
+  """
+  if harness_cpu_time is not None:
+    # CPU the harness spent streaming output, which competes with the test.
+    result_info.build_result_info(extra_results,
+                                  int(round(harness_cpu_time * 1000)),
+                                  'harness_cpu_time')
+  if resource_usage:
+    for result_type, result_units in proc_stats.RESOURCE_UNITS:
+      if result_type in resource_usage:
+        result_info.build_result_info(
+            extra_results,
+            resource_usage[result_type],
+            result_type,
+            result_units=result_units)
+  return extra_results
+
+
 def delete_files_in_folder(folder):
   """Delete files in folder. Does not delete sub folders.
 
@@ -112,6 +112,33 @@ class TestReporting(unittest.TestCase):
     self.assertEqual(arg_test_info['accel_cnt'], agg_result['gpu'])
     self.assertEqual(arg_test_info['cmd'], agg_result['config']['cmd'])
 
+  def test_aggregate_results_result_id(self):
+    """Tests the result_id does not depend on the order copies are found."""
+    results_list = []
+    for copy_index in range(3):
+      result = self._mock_result('made.up.test_id', 10 + copy_index)
+      result['config']['copy'] = copy_index
+      result['config']['timestamp'] = 1500000000 + copy_index
+      result['result_dir'] = '/workspace/results/{}'.format(copy_index)
+      results_list.append(result)
+
+    agg_result = util.report_aggregate_results(results_list)
+    reversed_agg_result = util.report_aggregate_results(results_list[::-1])
+    self.assertEqual('/workspace/results/0', reversed_agg_result['result_dir'])
+    self.assertEqual(util._result_id(agg_result),
+                     util._result_id(reversed_agg_result))
+    self.assertIsNone(util._result_id({'config': {'test_id': 'no_folder'}}))
+
+  @patch('test_runners.common.util.load_repeat_info')
+  def test_aggregate_results_repeat_info(self, load_repeat_info_mock):
+    """Tests why copies stopped is read from the suite folder."""
+    load_repeat_info_mock.return_value = {'copies': 2, 'stop_reason': 'cv'}
+    result = self._mock_result('made.up.test_id', 10)
+    result['result_dir'] = '/results/suite/copy_0'
+    agg_result = util.report_aggregate_results([result])
+    load_repeat_info_mock.assert_called_with('/results/suite')
+    self.assertEqual('cv', agg_result['repeat']['stop_reason'])
+
   def test_aggregate_extra_results(self):
     """Tests aggregating extra results."""
     total_times = []
@@ -130,6 +157,72 @@ class TestReporting(unittest.TestCase):
     self.assertEqual(agg_result[0]['result_type'], 'total_time')
     self.assertEqual(len(agg_result), 2)
 
+  def test_throughput_stats(self):
+    """Tests throughput is total examples over total time."""
+    # 100 and 300 examples/sec over equal examples is 150 examples/sec.
+    stats = util.throughput_stats(util.rate_windows([100, 300, 0]))
+    self.assertAlmostEqual(150, stats['throughput'])
+    self.assertAlmostEqual(150, stats['harmonic_mean'])
+    self.assertEqual(2, stats['windows'])
+    self.assertEqual(100, stats['min'])
+    self.assertEqual(300, stats['max'])
+
+    # Windows of different sizes are weighted by their time.
+    stats = util.throughput_stats([(100, 1.0), (900, 3.0)])
+    self.assertAlmostEqual(250, stats['throughput'])
+    self.assertAlmostEqual(1000, stats['examples'])
+    self.assertAlmostEqual(4, stats['seconds'])
+    self.assertEqual(0, util.throughput_stats([])['throughput'])
+
+  def test_measure_steady_state(self):
+    """Tests warmup windows are detected and left out of throughput."""
+    rates = [20, 60, 90] + [100, 101, 99, 100] * 5
+    records = [{'step': (i + 1) * 10} for i in range(len(rates))]
+    result = {}
+    warmup = util.measure_steady_state(result, records,
+                                       util.rate_windows(rates))
+    self.assertEqual(3, warmup)
+    self.assertEqual({'method': 'mser', 'windows': 3, 'step': 40},
+                     result['warmup'])
+    self.assertEqual(20, result['batches_sampled'])
+    self.assertAlmostEqual(100, result['imgs_sec'], places=1)
+
+  def test_measure_steady_state_short(self):
+    """Tests short series fall back to dropping a fixed number of steps."""
+    records = [{'step': 10}, {'step': 20}, {'step': 30}]
+    result = {}
+    warmup = util.measure_steady_state(result, records,
+                                       util.rate_windows([10, 100, 100]),
+                                       warmup_steps=10)
+    self.assertEqual(1, warmup)
+    self.assertEqual('fixed', result['warmup']['method'])
+    self.assertAlmostEqual(100, result['imgs_sec'])
+
+  def test_add_harness_config(self):
+    """Tests only convergence settings in the harness config are copied."""
+    config = util.add_harness_config(
+        {'total_batches': 150},
+        {'convergence_tolerance': 0.01, 'input_threads': 36})
+    self.assertEqual({'total_batches': 150, 'convergence_tolerance': 0.01},
+                     config)
+    self.assertEqual({}, util.add_harness_config({}, None))
+
+  def test_build_resource_results(self):
+    """Tests resource usage becomes extra results with units."""
+    extra_results = util.build_resource_results([], {
+        'cpu_user_time': 1200,
+        'peak_rss': 4096
+    })
+    self.assertEqual(2, len(extra_results))
+    self.assertEqual('cpu_user_time', extra_results[0]['result_type'])
+    self.assertEqual('ms', extra_results[0]['result_units'])
+    self.assertEqual(4096, extra_results[1]['result'])
+    self.assertEqual('bytes', extra_results[1]['result_units'])
+    self.assertEqual([], util.build_resource_results([], None))
+    extra_results = util.build_resource_results([], None, 0.012)
+    self.assertEqual('harness_cpu_time', extra_results[0]['result_type'])
+    self.assertEqual(12, extra_results[0]['result'])
+
   def _mock_extra_result(self, result, result_type, metric):
     result_dict = {}
     result_dict['result_units'] = metric
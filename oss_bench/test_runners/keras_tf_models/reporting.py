@@ -1,10 +1,29 @@
 """Generates and uploads test results for keras tf models based tests."""
 from __future__ import print_function
-from ast import literal_eval
 import os
 import yaml
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+from test_runners.common import time_series
 from test_runners.common import util
 
+LOG_PATTERNS = [
+    # e.g. BenchmarkMetric: {'num_batches':100, 'time_taken': 48.671711,
+    # 'images_per_second': 2103.891521}
+    log_parser.Pattern(
+        'step',
+        r"BenchmarkMetric: \{{'num_batches': *(?P<step>\d+),"
+        r"(?:[^\n]*?'time_taken': *(?P<time>{0}),)?[^\n]*?"
+        r"'images_per_second': *(?P<value>{0})".format(log_parser.FLOAT),
+        types={'step': int, 'time': float, 'value': float},
+        hint='BenchmarkMetric'),
+]
+log_parser.register('keras_tf_models', LOG_PATTERNS)
+
+# Files marking a run folder.
+RESULT_FILES = ('config.yaml',)
+
 
 def process_folder(folder_path, report_config=None, test_config=None):
   """Process one or more results of a single test found in the folder path.
@@ -16,7 +35,7 @@ def process_folder(folder_path, report_config=None, test_config=None):
       higher level harness with high level system information.
   """
   report_config = {} if report_config is None else report_config
-  results = _collect_results(folder_path, test_config)
+  results = collect_results(folder_path, test_config)
   agg_result = util.report_aggregate_results(results)
 
   util.upload_results(
@@ -26,18 +45,22 @@ def process_folder(folder_path, report_config=None, test_config=None):
       test_harness='keras_tf_models')
 
 
-def _collect_results(folder_path, test_config=None):
-  """Walks folder path looking for and parsing results files."""
-  results = []
-  for r, _, files in os.walk(folder_path):
-    for f in files:
-      if f == 'config.yaml':
-        result = {}
-        process_base_result_files(result, os.path.join(r, f))
-        result_file = os.path.join(r, 'worker_0_stdout.log')
-        parse_result_file(result, result_file, test_config)
-        results.append(result)
-  return results
+def collect_results(folder_path, test_config=None):
+  """Walks folder path looking for and parsing results files.
+
+  Runs already in the result index are not parsed again.
+  """
+
+  def parse_result_dir(config_file_path):
+    result = {}
+    process_base_result_files(result, config_file_path)
+    result_file = os.path.join(os.path.dirname(config_file_path),
+                               'worker_0_stdout.log')
+    parse_result_file(result, result_file, test_config)
+    return result
+
+  return result_index.collect(folder_path, 'keras_tf_models',
+                              RESULT_FILES, parse_result_dir)
 
 
 def process_base_result_files(result, config_file_path):
@@ -77,36 +100,33 @@ def process_base_result_files(result, config_file_path):
 
 def parse_result_file(result, result_file_path, test_config=None):
   """Parses a result file."""
-  try:
-    result_file = open(result_file_path, 'r')
-  except IOError:
+  if not log_store.exists(result_file_path):
     print('{}  not found.'.format(result_file_path))
     return
-  samples = 0
-  sum_speed = 0
-
   # Processes results file and aggregates the results of one run.
-  for line in result_file:
-    # For eg: "BenchmarkMetric: {'num_batches': 100, 'time_taken': 55.004655}"
-    if (line.find('BenchmarkMetric') != -1 and
-        line.find('num_batches') != -1):
-      start_index = line.find('{')
-      end_index = line.find('}')
-      line_parsed = line[start_index:end_index] + '}'
-      metric_dict = literal_eval(line_parsed)
-      # metric dict will be of the following format:
-      # {'num_batches':100, 'time_taken': 54.434641}
-      # Ignores first 100 batches as a warm up
-      if metric_dict['num_batches'] > 100:
-        current_imgs_sec = metric_dict['images_per_second']
-        sum_speed += current_imgs_sec
-        samples +=1
-
-  result['imgs_sec'] = sum_speed / samples
-  result['batches_sampled'] = samples
+  parser = log_parser.get_parser('keras_tf_models')
+  records = [record for record in parser.parse_file(result_file_path)
+             if record['value'] > 0]
+  # Rates are logged every N batches, so each covers the same examples.
+  windows = util.rate_windows([record['value'] for record in records])
+  util.measure_steady_state(result, records, windows, warmup_steps=100)
   return result
 
 
+def write_time_series(result_dir):
+  """Saves each step logged by the run in `result_dir`, see `time_series`.
+
+  Returns:
+    Path of the file written or None if the run has no log.
+  """
+  result_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  if not log_store.exists(result_file):
+    return None
+  parser = log_parser.get_parser('keras_tf_models', kinds=['step'])
+  records = list(parser.parse_file(result_file))
+  return time_series.write_records(result_dir, records)
+
+
 def get_config(result_dir):
   config_file = os.path.join(result_dir, 'config.yaml')
   with open(config_file) as f:
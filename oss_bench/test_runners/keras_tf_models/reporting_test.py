@@ -10,7 +10,7 @@ from test_runners.keras_tf_models import reporting
 class TestReporting(unittest.TestCase):
   """Tests for Keras tf_models reporting module."""
 
-  @patch('test_runners.keras_tf_models.reporting._collect_results')
+  @patch('test_runners.keras_tf_models.reporting.collect_results')
   @patch('upload.result_upload.upload_result')
   def test_process_folder(self, mock_upload, mock_collect_results):
     """Tests process folder and verifies args passed to upload_result."""
@@ -82,8 +82,8 @@ class TestReporting(unittest.TestCase):
                                 'test_runners/keras_tf_models/unittest_files/'
                                 'results/basic/worker_0_stdout.txt',
                                 self._mock_config('mock.test.id'))
-    self.assertEqual(result['imgs_sec'], 2108.347592636364)
-    self.assertEqual(result['batches_sampled'], 11)
+    self.assertAlmostEqual(result['imgs_sec'], 2107.76832121466)
+    self.assertEqual(result['batches_sampled'], 12)
 
   def _mock_config(self, test_id):
     config = {}
@@ -1,9 +1,27 @@
 """Generates and uploads test results for mxnet based tests."""
 from __future__ import print_function
 import os
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+from test_runners.common import time_series
 from test_runners.common import util
 import yaml
 
+LOG_PATTERNS = [
+    # e.g. INFO:root:Epoch[0] Batch [10]   Speed: 183.07 samples/sec
+    log_parser.Pattern(
+        'step',
+        r'Epoch\[(?P<epoch>\d+)\] Batch \[(?P<step>\d+)\][ \t]+'
+        r'Speed: (?P<value>{}) samples/sec'.format(log_parser.FLOAT),
+        types={'epoch': int, 'step': int, 'value': float},
+        hint='samples/sec'),
+]
+log_parser.register('mxnet_benchmark', LOG_PATTERNS)
+
+# Files marking a run folder.
+RESULT_FILES = ('worker_0_stdout.log', 'worker_0_stdout.log.gz')
+
 
 def process_folder(folder_path, report_config=None):
   """Process one or more results of a single test found in the folder path.
@@ -15,7 +33,7 @@ def process_folder(folder_path, report_config=None):
       higher level harness with high level system information.
   """
   report_config = {} if report_config is None else report_config
-  results = _collect_results(folder_path)
+  results = collect_results(folder_path)
   agg_result = util.report_aggregate_results(results)
 
   util.upload_results(
@@ -25,26 +43,22 @@ def process_folder(folder_path, report_config=None):
       test_harness='mxnet_benchmark')
 
 
-def _collect_results(folder_path):
-  """Walks folder path looking for and parsing results files."""
-  results = []
-  for r, _, files in os.walk(folder_path):
-    for f in files:
-      if f == 'worker_0_stdout.log':
-        result_file = os.path.join(r, f)
-        results.append(parse_result_file(result_file))
-  return results
+def collect_results(folder_path):
+  """Walks folder path looking for and parsing results files.
+
+  Runs already in the result index are not parsed again.
+  """
+  return result_index.collect(folder_path, 'mxnet_benchmark',
+                              RESULT_FILES, parse_result_file)
 
 
 def parse_result_file(result_file_path):
   """Parses a result file.
 
-  Note: MXNet prints samples/sec every so often to the console and then code
-  below averages a number of the rows together.  This is mathematically
-  incorrect as speed cannot be averaged this way and should be total time /
-  total_items_processes. Getting a more correct number would require changing
-  how the MXNet code works, which can be done but was not needed for the initial
-  number.
+  Note: MXNet prints samples/sec every `disp-batches` batches. Each of those
+  windows covers the same number of samples, so throughput over the measured
+  windows is their harmonic mean, see `util.throughput_stats`. Windows before
+  the speed settles are dropped, see `util.measure_steady_state`.
 
   Args:
     result_file_path: Path to file to parse
@@ -53,9 +67,6 @@ def parse_result_file(result_file_path):
     `dict` representing the results.
   """
   result = {}
-  result_file = open(result_file_path, 'r')
-  samples = 0
-  sum_speed = 0
 
   # Get the config
   result_dir = os.path.dirname(result_file_path)
@@ -63,6 +74,9 @@ def parse_result_file(result_file_path):
   result['config'] = config
   result['result_dir'] = result_dir
   result['test_id'] = config['test_id']
+  extra_results = util.load_extra_results(result_dir)
+  if extra_results:
+    result['raw_extra_results'] = extra_results
 
   if 'data-train' in config['args']:
     result['data_type'] = 'real'
@@ -74,24 +88,28 @@ def parse_result_file(result_file_path):
     result['gpu'] = int(config['gpus'])
 
   # Processes results file and aggregates the results of one run.
-  for line in result_file:
-    # Rows with 'Epoch[' and 'samples/sec' contain result data to aggregate.
-    if line.find('Epoch[') > 0 and line.find('samples/sec') > 0:
-      parts = line.split()
-      batch = int(parts[2].replace(']', '').replace('[', ''))
-      # Ignores first 10 batches as a warm up, tf_benchmarks does the same.
-      if batch > 10:
-        sum_speed += float(parts[4].rstrip())
-        samples += 1
-
-      # After 100 batches are found, calculate average and break.
-      if batch > 100:
-        break
-  result['imgs_sec'] = sum_speed / samples
-  result['batches_sampled'] = samples
+  parser = log_parser.get_parser('mxnet_benchmark')
+  records = [record for record in parser.parse_file(result_file_path)
+             if record['value'] > 0]
+  windows = util.rate_windows([record['value'] for record in records])
+  util.measure_steady_state(result, records, windows, warmup_steps=10)
   return result
 
 
+def write_time_series(result_dir):
+  """Saves each step logged by the run in `result_dir`, see `time_series`.
+
+  Returns:
+    Path of the file written or None if the run has no log.
+  """
+  result_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  if not log_store.exists(result_file):
+    return None
+  parser = log_parser.get_parser('mxnet_benchmark', kinds=['step'])
+  records = list(parser.parse_file(result_file))
+  return time_series.write_records(result_dir, records)
+
+
 def get_config(result_dir):
   config_file = os.path.join(result_dir, 'config.yaml')
   with open(config_file) as f:
@@ -1,16 +1,20 @@
 """Tests mxnet reporting module."""
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import patch
+from test_runners.common import log_store
 import test_runners.mxnet.reporting as reporting
 
 
 class TestReporting(unittest.TestCase):
   """Tests for mxnet reporting module."""
 
-  @patch('test_runners.mxnet.reporting._collect_results')
+  @patch('test_runners.mxnet.reporting.collect_results')
   @patch('upload.result_upload.upload_result')
   def test_process_folder(self, mock_upload, mock_collect_results):
     """Tests process folder and verifies args passed to upload_result."""
@@ -67,20 +71,38 @@ class TestReporting(unittest.TestCase):
     result = reporting.parse_result_file(
         'test_runners/mxnet/unittest_files/basic_synth/test_result.txt')
 
-    self.assertEqual(result['imgs_sec'], 178.55300000000003)
-    self.assertEqual(result['batches_sampled'], 10)
+    self.assertAlmostEqual(result['imgs_sec'], 177.55997967169165)
+    self.assertEqual(result['batches_sampled'], 36)
+    self.assertEqual(result['warmup']['method'], 'mser')
+    self.assertEqual(result['warmup']['step'], 60)
     self.assertEqual(result['test_id'], 'resnet50.gpu_1.32.real')
     self.assertEqual(result['gpu'], 2)
     self.assertEqual(result['data_type'], 'synth')
     self.assertIn('config', result)
 
+  def test_parse_result_file_compressed(self):
+    """Tests parsing a results file after the run compressed it."""
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    src_dir = 'test_runners/mxnet/unittest_files/basic_synth'
+    shutil.copy(os.path.join(src_dir, 'config.yaml'), tmp_dir)
+    result_file = os.path.join(tmp_dir, 'worker_0_stdout.log')
+    shutil.copy(os.path.join(src_dir, 'test_result.txt'), result_file)
+    log_store.compress_run(tmp_dir)
+    self.assertFalse(os.path.isfile(result_file))
+
+    result = reporting.parse_result_file(result_file)
+
+    self.assertAlmostEqual(result['imgs_sec'], 177.55997967169165)
+    self.assertEqual(result['batches_sampled'], 36)
+
   def test_parse_result_file_real(self):
     """Tests parsing one results file for real data."""
     result = reporting.parse_result_file(
         'test_runners/mxnet/unittest_files/basic_real/worker_0_stdout.txt')
 
-    self.assertEqual(result['imgs_sec'], 4618.571578947368)
-    self.assertEqual(result['batches_sampled'], 19)
+    self.assertAlmostEqual(result['imgs_sec'], 4636.889216603636)
+    self.assertEqual(result['batches_sampled'], 28)
     self.assertEqual(result['test_id'], 'resnet50.gpu_1.32.real')
     self.assertEqual(result['gpu'], 2)
     self.assertEqual(result['data_type'], 'real')
@@ -5,7 +5,13 @@ import datetime
 import os
 import time
 import yaml
+from test_runners.common import adaptive_repeat
 from test_runners.common import cluster_local
+from test_runners.common import journal
+from test_runners.common import log_parser
+from test_runners.common import report_queue
+from test_runners.common import stop_condition
+from test_runners.common import util
 from test_runners.mxnet import reporting
 from six.moves import range
 
@@ -39,6 +45,8 @@ class TestRunner(object):
     self.train_idx = imagenet_idx
 
     self._make_log_dir(self.local_log_dir)
+    # Copies finished by an earlier, interrupted run of the same build.
+    self.journal = journal.open_journal(self.workspace, self.auto_test_config)
 
   def _make_log_dir(self, local_log_dir):
     # Creates workspace and default log folder
@@ -104,30 +112,27 @@ class TestRunner(object):
         copy, test_config['test_id'], cmd))
     stdout_file = os.path.join(result_dir, 'worker_%d_stdout.log' % i)
     stderr_file = os.path.join(result_dir, 'worker_%d_stderr.log' % i)
+    stop = stop_condition.build_step_stop(
+        test_config,
+        log_parser.get_parser('mxnet_benchmark', kinds=['step']),
+        r'Batch \[(\d+)\]', hint='Batch [')
     t = instance.ExecuteCommandInThread(
-        cmd, stdout_file, stderr_file, print_error=True)
+        cmd, stdout_file, stderr_file, print_error=True, stop_conditions=[stop])
     worker_threads.append(t)
 
-    # Wait for log file to appear
-    wait_time = 0
-    while t.is_alive() and not os.path.isfile(stdout_file):
-      print('Waiting for log file. Waited for {} seconds.'.format(wait_time))
-      time.sleep(2)
-      wait_time += 2
-
-    batch_killer = '[{}]'.format(total_batches)
-    while t.is_alive():
-      with open(stdout_file, 'r') as log:
-        for line in log:
-          if batch_killer in line:
-            print('{} batches complete. Kill Thread.'.format(batch_killer))
-            instance.kill_processes()
-            break
-        time.sleep(5)
-
     for t in worker_threads:
       t.join()
 
+    if stop.fired:
+      print('Stopped at step {} of {} after {}ms.'.format(
+          stop.step, total_batches, stop.elapsed_ms))
+    extra_results = util.build_stop_results([], stop)
+    util.build_resource_results(extra_results, instance.resource_usage,
+                                instance.harness_cpu_time)
+    util.write_extra_results(result_dir, extra_results)
+    reporting.write_time_series(result_dir)
+    util.compress_logs(result_dir, test_config)
+
     return result_dir
 
   def run_test_suite(self, test_config):
@@ -139,14 +144,22 @@ class TestRunner(object):
     # Folder to store suite results
     test_config['test_suite_start_time'] = datetime.datetime.now().strftime(
         '%Y%m%dT%H%M%S')
+    if self.journal.reported(test_config['test_id']):
+      print('{} was reported by an earlier run, skipping.'.format(
+          test_config['test_id']))
+      return
 
     instance = cluster_local.UseLocalInstances()
-    for i in range(test_config['repeat']):
-      self.run_benchmark(test_config, instance, copy=i)
+    adaptive_repeat.run_copies(
+        test_config,
+        lambda copy: self.run_benchmark(test_config, instance, copy=copy),
+        run_journal=self.journal)
 
     suite_dir_name = '{}_{}'.format(test_config['test_suite_start_time'],
                                     test_config['test_id'])
-    reporting.process_folder(
+    # Reports in the background so the next test starts right away.
+    report_queue.submit(
+        self.journal.report, test_config['test_id'], reporting.process_folder,
         os.path.join(self.workspace, 'results', suite_dir_name),
         report_config=self.auto_test_config)
 
@@ -241,6 +254,7 @@ class TestRunner(object):
     # Sets gpus in the format of 0,1,2,3 for 4 GPUs.
     args['gpus'] = ','.join(str(x) for x in range(gpus))
 
+    util.add_harness_config(config, self.auto_test_config)
     return config
 
   def _cmd_builder(self, test_config):
@@ -503,8 +517,14 @@ class TestRunner(object):
     self.run_test_suite(config)
 
   def run_tests(self, test_list):
-    for t in test_list:
-      getattr(self, t)()
+    try:
+      for t in test_list:
+        getattr(self, t)()
+    finally:
+      # Waits for suites still being reported.
+      errors = report_queue.flush()
+    # Raised after the loop so an error of a test is not hidden.
+    report_queue.raise_errors(errors)
 
 
 def main():
@@ -2,9 +2,35 @@
 from __future__ import print_function
 import os
 
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+from test_runners.common import time_series
 from test_runners.common import util
 import yaml
 
+LOG_PATTERNS = [
+    # e.g. Epoch: [0][  0/40037] Time 12.788 (12.788)  Data 9.518 (9.518)
+    log_parser.Pattern(
+        'step',
+        r'Epoch: \[(?P<epoch>\d+)\]\[ *(?P<step>\d+)/(?P<steps>\d+)\]'
+        r'[ \t]+Time[ \t]+(?P<time>{0})'
+        r'(?:[^\n]*?Loss[ \t]+(?P<loss>{0}))?'.format(log_parser.FLOAT),
+        types={
+            'epoch': int,
+            'step': int,
+            'steps': int,
+            'time': float,
+            'loss': float
+        },
+        hint='Epoch'),
+]
+log_parser.register('pytorch', LOG_PATTERNS)
+
+# Files marking a run folder.
+RESULT_FILES = ('worker_0_stdout.log', 'worker_0_stdout.log.gz',
+                'worker_0_stdout.txt')
+
 
 def process_folder(folder_path, report_config=None):
   """Process one or more results of a single test found in the folder path.
@@ -16,30 +42,30 @@ def process_folder(folder_path, report_config=None):
       higher level harness with high level system information.
   """
   report_config = {} if report_config is None else report_config
-  results = _collect_results(folder_path)
+  results = collect_results(folder_path)
   agg_result = util.report_aggregate_results(results)
 
   util.upload_results(
       report_config, agg_result, framework='pytorch', test_harness='pytorch')
 
 
-def _collect_results(folder_path):
-  """Walks folder path looking for and parsing results files."""
-  results = []
-  for r, _, files in os.walk(folder_path):
-    for f in files:
-      if f in ('worker_0_stdout.log', 'worker_0_stdout.txt'):
-        result_file = os.path.join(r, f)
-        results.append(parse_result_file(result_file))
-  return results
+def collect_results(folder_path):
+  """Walks folder path looking for and parsing results files.
+
+  Runs already in the result index are not parsed again.
+  """
+  return result_index.collect(folder_path, 'pytorch', RESULT_FILES,
+                              parse_result_file)
 
 
 def parse_result_file(result_file_path):
   """Parses a result file.
 
-  Note: Pytorch prints Time for the specific step printed. These can be added
-  together and then divided to get an average then used with batch_size to get
-  images per second.  This is similar (maybe the same) as tf_cnn_bencharks.
+  Note: Pytorch prints Time for the specific step printed. Images per second
+  is the images of the sampled steps over the sum of their times, see
+  `util.throughput_stats`. This is similar (maybe the same) as
+  tf_cnn_bencharks. Steps before the time settles are dropped, see
+  `util.measure_steady_state`.
 
   Args:
     result_file_path: Path to file to parse
@@ -48,9 +74,6 @@ def parse_result_file(result_file_path):
     `dict` representing the results.
   """
   result = {}
-  result_file = open(result_file_path, 'r')
-  samples = 0
-  total_time = 0
 
   # Get the config
   result_dir = os.path.dirname(result_file_path)
@@ -58,6 +81,9 @@ def parse_result_file(result_file_path):
   result['config'] = config
   result['result_dir'] = result_dir
   result['test_id'] = config['test_id']
+  extra_results = util.load_extra_results(result_dir)
+  if extra_results:
+    result['raw_extra_results'] = extra_results
   result['data_type'] = 'real'
 
   # Number of gpus = number of servers * number of gpus
@@ -65,26 +91,33 @@ def parse_result_file(result_file_path):
     result['gpu'] = int(config['gpus'])
 
   # Processes results file and aggregates the results of one run.
-  for line in result_file:
-    # Identifies lines with performance data to aggregate
-    if line.find('Epoch') > -1:
-      #  Example: Epoch: [0][  0/40037] Time 12.788 (12.788)  Data 9.518 (9.518)
-      parts = line.split()
-      batch = int(parts[2].split('/')[0])
-      # Ignores first 10 batches as a warm up, tf_benchmarks does the same.
-      if batch > 20:
-        total_time += float(parts[4].rstrip())
-        samples += 1
-
-      # After 100 batches are found, calculate average and break.
-      if batch > 200:
-        break
+  parser = log_parser.get_parser('pytorch')
+  records = [record for record in parser.parse_file(result_file_path)
+             if record['time'] > 0]
   total_batch_size = config['batch_size'] * config['gpus']
-  result['imgs_sec'] = (1 / (total_time / samples)) * total_batch_size
-  result['batches_sampled'] = samples
+  windows = [(total_batch_size, record['time']) for record in records]
+  util.measure_steady_state(result, records, windows, warmup_steps=20)
   return result
 
 
+def write_time_series(result_dir):
+  """Saves each step logged by the run in `result_dir`, see `time_series`.
+
+  Returns:
+    Path of the file written or None if the run has no log.
+  """
+  result_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  if not log_store.exists(result_file):
+    return None
+  parser = log_parser.get_parser('pytorch', kinds=['step'])
+  records = list(parser.parse_file(result_file))
+  config = get_config(result_dir)
+  return time_series.write_records(
+      result_dir,
+      records,
+      examples_per_step=config['batch_size'] * config['gpus'])
+
+
 def get_config(result_dir):
   config_file = os.path.join(result_dir, 'config.yaml')
   with open(config_file) as f:
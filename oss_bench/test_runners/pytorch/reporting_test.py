@@ -1,10 +1,14 @@
 """Tests pytorch reporting module."""
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import patch
 
+from test_runners.common import time_series
 import test_runners.pytorch.reporting as reporting
 
 
@@ -29,7 +33,7 @@ class TestReporting(unittest.TestCase):
 
     # Spot checks results and GCE project info used for reporting.
     results = mock_upload.call_args[0][1]
-    self.assertEqual(results[0]['result'], 177.07878258336976)
+    self.assertAlmostEqual(results[0]['result'], 176.94727810086755)
 
     # Spot checks test_info.
     arg_test_info = mock_upload.call_args[1]['test_info']
@@ -42,14 +46,33 @@ class TestReporting(unittest.TestCase):
     self.assertIn('config', arg_extras)
     self.assertIn('batches_sampled', arg_extras)
 
+  def test_write_time_series(self):
+    """Tests each logged step is saved with its time, throughput and loss."""
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    result_dir = os.path.join(tmp_dir, 'basic')
+    shutil.copytree('test_runners/pytorch/unittest_files/results/basic',
+                    result_dir)
+    os.rename(os.path.join(result_dir, 'worker_0_stdout.txt'),
+              os.path.join(result_dir, 'worker_0_stdout.log'))
+
+    reporting.write_time_series(result_dir)
+    steps = time_series.load(result_dir)
+    self.assertEqual([0, 10, 20], list(steps['step'][:3]))
+    self.assertAlmostEqual(8.909, steps['step_time'][0])
+    self.assertAlmostEqual(7.1288, steps['loss'][0])
+    # batch_size 32 on 2 GPUs.
+    self.assertAlmostEqual(64 / 8.909, steps['throughput'][0])
+
   def test_parse_result_file(self):
     """Tests parsing one results file."""
     result = reporting.parse_result_file(
         'test_runners/pytorch/unittest_files/results/basic/'
         'worker_0_stdout.txt')
 
-    self.assertEqual(result['imgs_sec'], 177.07878258336976)
-    self.assertEqual(result['batches_sampled'], 19)
+    self.assertAlmostEqual(result['imgs_sec'], 176.94727810086755)
+    self.assertEqual(result['batches_sampled'], 29)
+    self.assertEqual(result['warmup']['windows'], 1)
     self.assertEqual(result['test_id'], 'resnet50.gpu_1.32.real')
     self.assertEqual(result['gpu'], 2)
     self.assertEqual(result['data_type'], 'real')
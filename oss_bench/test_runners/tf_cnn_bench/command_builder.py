@@ -131,3 +131,20 @@ def build_test_config_suite(full_config, debug_level):
     if debug_level > 0:
       print('Config:{} \n{}'.format(config['test_id'], config))
   return suite
+
+
+def add_test_copy(test_configs, base_config):
+  """Appends and returns another copy of the test in `test_configs`.
+
+  Used when `adaptive_repeat` asks for more copies than `repeat` made.
+
+  Args:
+    test_configs: List of configs, one per copy of the test.
+    base_config: Config of the test taken before any copy ran. Running a copy
+      sets `timestamp`, `cmd` and `train_dir` of its config in place, which
+      must not carry over to the next copy.
+  """
+  config = base_config.copy()
+  config['copy'] = len(test_configs)
+  test_configs.append(config)
+  return config
@@ -2,10 +2,41 @@
 from __future__ import print_function
 import os
 
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+from test_runners.common import time_series
 from test_runners.common import util
 from upload import result_info
 import yaml
 
+LOG_PATTERNS = [
+    # e.g. 10  images/sec: 351.6 +/- 0.2 (jitter = 0.5)  9.177
+    log_parser.Pattern(
+        'step',
+        r'^(?P<step>\d+)[ \t]+images/sec: (?P<value>{0}) \+/- {0} '
+        r'\(jitter = {0}\)[ \t]+(?P<loss>{0})'.format(log_parser.FLOAT),
+        types={'step': int, 'value': float, 'loss': float},
+        hint='images/sec'),
+    # e.g. total images/sec: 351.23
+    log_parser.Pattern(
+        'total',
+        r'^total images/sec: (?P<value>{})'.format(log_parser.FLOAT),
+        types={'value': float},
+        hint='total images/sec'),
+    # e.g. Accuracy @ 1 = 0.7550 Accuracy @ 5 = 0.9260 [50000 examples]
+    log_parser.Pattern(
+        'accuracy',
+        r'^Accuracy @ 1 = (?P<top_1>{0}) Accuracy @ 5 = (?P<top_5>{0})'.format(
+            log_parser.FLOAT),
+        types={'top_1': float, 'top_5': float},
+        hint='Accuracy @'),
+]
+log_parser.register('tf_cnn_benchmark', LOG_PATTERNS)
+
+# Files marking a run folder.
+RESULT_FILES = ('config.yaml',)
+
 
 def process_folder(folder_path, report_config=None):
   """Process and print aggregated results found in folder.
@@ -17,7 +48,7 @@ def process_folder(folder_path, report_config=None):
       higher level harness with high level system information.
   """
   report_config = {} if report_config is None else report_config
-  results = _collect_results(folder_path)
+  results = collect_results(folder_path)
   agg_result = util.report_aggregate_results(results)
 
   util.upload_results(
@@ -27,20 +58,23 @@ def process_folder(folder_path, report_config=None):
       test_harness='tf_cnn_benchmark')
 
 
-def _collect_results(folder_path):
-  """Walks folder path looking for and parsing results files."""
-  results = []
-  for r, _, files in os.walk(folder_path):
-    for f in files:
-      if f == 'config.yaml':
-        result = {}
-        process_base_result_files(result, os.path.join(r, f))
-        result_file = os.path.join(r, 'worker_0_stdout.log')
-        parse_result_file(result, result_file)
-        eval_file = os.path.join(r, 'eval_0_stdout.log')
-        parse_eval_result_file(result, eval_file)
-        results.append(result)
-  return results
+def collect_results(folder_path):
+  """Walks folder path looking for and parsing results files.
+
+  Runs already in the result index are not parsed again.
+  """
+  return result_index.collect(folder_path, 'tf_cnn_benchmark',
+                              RESULT_FILES, _parse_result_dir)
+
+
+def _parse_result_dir(config_file_path):
+  """Returns result of the run whose config.yaml is `config_file_path`."""
+  result = {}
+  process_base_result_files(result, config_file_path)
+  r = os.path.dirname(config_file_path)
+  parse_result_file(result, os.path.join(r, 'worker_0_stdout.log'))
+  parse_eval_result_file(result, os.path.join(r, 'eval_0_stdout.log'))
+  return result
 
 
 def process_base_result_files(result, config_file_path):
@@ -78,51 +112,96 @@ def process_base_result_files(result, config_file_path):
     print('{}  not found.'.format(extra_results_file))
 
 
+def write_time_series(result_dir):
+  """Saves each step logged by the run in `result_dir`, see `time_series`.
+
+  Returns:
+    Path of the file written or None if the run has no log.
+  """
+  result_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  if not log_store.exists(result_file):
+    return None
+  parser = log_parser.get_parser('tf_cnn_benchmark', kinds=['step'])
+  records = window_rates(parser.parse_file(result_file))
+  return time_series.write_records(result_dir, records)
+
+
+def window_rates(records):
+  """Returns step records with the images/sec of each logged window.
+
+  tf_cnn_benchmarks logs the mean images/sec of every step since warmup, not
+  the rate of the steps since the last line. Elapsed seconds are step over
+  that mean times the images in a step, so the window's rate is its steps
+  over the difference of step / mean with the images in a step cancelled.
+  Windows without a positive time are left without a value.
+
+  Args:
+    records: `log_parser` step records, in log order.
+  """
+  windows = []
+  last_step, last_elapsed = 0, 0.0
+  for record in records:
+    record = dict(record)
+    step, mean = record['step'], record.get('value')
+    if step <= last_step:
+      # A new run in the same log.
+      last_step, last_elapsed = 0, 0.0
+    record['value'] = None
+    if mean:
+      elapsed = step / mean
+      if elapsed > last_elapsed:
+        record['value'] = (step - last_step) / (elapsed - last_elapsed)
+      last_step, last_elapsed = step, elapsed
+    windows.append(record)
+  return windows
+
+
 def parse_result_file(result, result_file_path):
-  """Parses a result file."""
-  try:
-    result_file = open(result_file_path, 'r')
-  except IOError:
+  """Parses a result file.
+
+  The total is printed at the end of the run, so the log is read from the
+  end and the last total line is used.
+  """
+  if not log_store.exists(result_file_path):
     print('{}  not found.'.format(result_file_path))
     return
 
-  for line in result_file:
-    # Summary line starts with images/sec
-    if line.find('total images/sec') == 0:
-      parts = line.split(' ')
-      result['imgs_sec'] = float(parts[2].rstrip())
-      # Avoids files that might have multiple total lines in them.
-      break
+  parser = log_parser.get_parser('tf_cnn_benchmark', kinds=['total'])
+  for record in parser.parse_reverse(result_file_path):
+    result['imgs_sec'] = record['value']
+    # Avoids files that might have multiple total lines in them.
+    break
 
 
 def parse_eval_result_file(result, result_file_path):
-  """Parses a eval result file."""
+  """Parses a eval result file.
+
+  Uses the last accuracy and total lines, read from the end of the log.
+  """
   results = []
-  try:
-    result_file = open(result_file_path, 'r')
-  except IOError:
+  if not log_store.exists(result_file_path):
     print('{}  not found.'.format(result_file_path))
     return
 
   exp_per_sec = 0
-  for line in result_file:
-    # Summary line starts with images/sec
-    if line.find('Accuracy @') == 0:
-      results = []
-      parts = line.split(' ')
-      top_1 = float(parts[4].rstrip())
+  parser = log_parser.get_parser('tf_cnn_benchmark',
+                                 kinds=['accuracy', 'total'])
+  for record in parser.parse_reverse(result_file_path):
+    if record['kind'] == 'accuracy':
+      if results:
+        continue
       result_info.build_result_info(results,
-                                    top_1,
+                                    record['top_1'],
                                     'top_1',
                                     result_units='accuracy')
-      top_5 = float(parts[9].rstrip())
       result_info.build_result_info(results,
-                                    top_5,
+                                    record['top_5'],
                                     'top_5',
                                     result_units='accuracy')
-    elif line.find('total images/sec') == 0:
-      parts = line.split(' ')
-      exp_per_sec = float(parts[2].rstrip())
+    elif not exp_per_sec:
+      exp_per_sec = record['value']
+    if results and exp_per_sec:
+      break
 
   if exp_per_sec:
     result_info.build_result_info(results,
@@ -141,10 +220,10 @@ def parse_eval_result_file(result, result_file_path):
 
 
 def check_oom(result_file_path):
-  result_file = open(result_file_path, 'r')
-  for line in result_file:
-    if line.find('OOM when allocating tensor') > -1:
-      return True
+  with log_store.open_log(result_file_path) as result_file:
+    for line in result_file:
+      if line.find('OOM when allocating tensor') > -1:
+        return True
   return False
 
 
@@ -1,16 +1,21 @@
 """Tests reporting module."""
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import patch
+from test_runners.common import log_store
+from test_runners.common import time_series
 import test_runners.tf_cnn_bench.reporting as reporting
 
 
 class TestReporting(unittest.TestCase):
   """Tests for reporting module."""
 
-  @patch('test_runners.tf_cnn_bench.reporting._collect_results')
+  @patch('test_runners.tf_cnn_bench.reporting.collect_results')
   @patch('upload.result_upload.upload_result')
   def test_process_folder(
       self,
@@ -101,6 +106,33 @@ class TestReporting(unittest.TestCase):
     self.assertEqual(results[0]['result'], 0.0008)
     self.assertEqual(len(results), 3)
 
+  def test_write_time_series(self):
+    """Tests the throughput stored is that of each window, not the mean."""
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    with open(os.path.join(tmp_dir, 'worker_0_stdout.log'), 'w') as f:
+      f.write('10\timages/sec: 100.0 +/- 0.1 (jitter = 0.5)\t9.177\n'
+              '20\timages/sec: 125.0 +/- 0.1 (jitter = 0.5)\t8.415\n'
+              '30\timages/sec: 125.0 +/- 0.1 (jitter = 0.5)\t8.175\n')
+    reporting.write_time_series(tmp_dir)
+    steps = time_series.load(tmp_dir)
+    self.assertEqual([10, 20, 30], list(steps['step']))
+    # Step / mean is 0.1, 0.16 and 0.24, so steps 10 to 20 took 0.06.
+    for expected, throughput in zip([100.0, 10 / 0.06, 125.0],
+                                    steps['throughput']):
+      self.assertAlmostEqual(expected, throughput)
+
+  def test_check_oom_compressed(self):
+    """Tests OOM is found in a compressed log."""
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    result_file = os.path.join(tmp_dir, 'worker_0_stdout.log')
+    with open(result_file, 'w') as f:
+      f.write('Step\tImg/sec\ttotal_loss\n'
+              'ResourceExhaustedError: OOM when allocating tensor\n')
+    log_store.compress(result_file)
+    self.assertTrue(reporting.check_oom(result_file))
+
   def _report_config_example(self):
     """Returns a mocked up expected report_config with some values left out."""
     report_config = {}
@@ -7,9 +7,17 @@ import time
 
 import yaml
 
+from test_runners.common import adaptive_repeat
 from test_runners.common import cluster_local
+from test_runners.common import journal
+from test_runners.common import report_queue
+from test_runners.common import scheduler
+from test_runners.common import util
 from test_runners.tf_cnn_bench import command_builder
 from test_runners.tf_cnn_bench import reporting
+import tools.inventory as inventory
+import tools.nvidia as nvidia
+import tools.proc_stats as proc_stats
 from upload import result_info
 
 
@@ -24,6 +32,8 @@ class TestRunner(object):
     auto_test_config (dict): Supplemental config values from oss_test harness,
       e.g. tensorflow version and hashes for tf_cnn_benchmark repo.
     debug_level (int): Debug level with supported values 0 and 1.
+    cache_dir (str, optional): Folder holding the inventory cache, see
+      `tools.inventory`. Defaults to `cache` in the workspace.
   """
 
   def __init__(self,
@@ -31,7 +41,8 @@ class TestRunner(object):
                workspace,
                bench_home,
                auto_test_config=None,
-               debug_level=1):
+               debug_level=1,
+               cache_dir=None):
     """Initalize the TestRunner with values."""
     self.auto_test_config = auto_test_config
     self.configs = configs
@@ -41,8 +52,11 @@ class TestRunner(object):
     self.local_stderr_file = os.path.join(self.local_log_dir, 'stderr.log')
     self.bench_home = bench_home
     self.debug_level = debug_level
+    self.cache_dir = cache_dir or os.path.join(self.workspace, 'cache')
 
     self._make_log_dir(self.local_log_dir)
+    # Copies finished by an earlier, interrupted run of the same build.
+    self.journal = journal.open_journal(self.workspace, self.auto_test_config)
 
   def _make_log_dir(self, local_log_dir):
     # Creates workspace and default log folder
@@ -118,6 +132,8 @@ class TestRunner(object):
 
     worker_time = self._get_milliseconds_diff(exec_time)
     total_time = worker_time
+    harness_cpu_time = instance.harness_cpu_time
+    resource_usage = instance.resource_usage
     print('Worker time: {}ms'.format(worker_time))
     result_info.build_result_info(extra_results, worker_time, 'worker_time')
 
@@ -137,31 +153,39 @@ class TestRunner(object):
           eval_cmd, stdout_file, stderr_file, print_error=True)
       t.join()
       eval_time = self._get_milliseconds_diff(eval_exec_time)
+      harness_cpu_time += instance.harness_cpu_time
+      resource_usage = proc_stats.add_usage(resource_usage,
+                                            instance.resource_usage)
       print('Eval time: {}ms'.format(eval_time))
       result_info.build_result_info(extra_results, eval_time, 'eval_time')
       total_time = self._get_milliseconds_diff(exec_time)
 
     print('Total time: {}ms'.format(total_time))
     result_info.build_result_info(extra_results, total_time, 'total_time')
+    # CPU, memory, context switches and I/O of the benchmark processes and
+    # the CPU the harness spent streaming their output.
+    util.build_resource_results(extra_results, resource_usage,
+                                harness_cpu_time)
 
     self._write_results_file(result_dir,
                              yaml.dump(extra_results),
                              'extra_results.yaml')
+    reporting.write_time_series(result_dir)
+    util.compress_logs(result_dir, run_config)
 
     return result_dir
 
   def run_test_suite(self, full_config):
     """Run benchmarks defined by full_config.
 
+    Tests run one after another unless `parallel_gpus` is set in the config.
+    `parallel_gpus` is the number of GPUs on the host, or True to ask
+    nvidia-smi, and single GPU tests are then packed onto separate GPUs and CPU
+    cores by `scheduler.GpuScheduler`.
+
     Args:
       full_config: Config representing tests to run.
     """
-
-    # Left over from system that could have multiple instances for distributed
-    # tests. Currently uses first and only instance from list.
-    instance = cluster_local.UseLocalInstances(
-        virtual_env_path=full_config.get('virtual_env_path'))
-
     # Folder to store suite results
     full_config['test_suite_start_time'] = datetime.datetime.now().strftime(
         '%Y%m%dT%H%M%S')
@@ -170,36 +194,98 @@ class TestRunner(object):
     test_suite = command_builder.build_test_config_suite(
         full_config, self.debug_level)
 
-    for _, test_configs in enumerate(test_suite):
-      last_config = None
-      for _, test_config in enumerate(test_configs):
-        last_config = test_config
-        # Executes oom test or the normal benchmark.
-        if test_config.get('oom_test'):
-          low = test_config['oom_low']
-          high = test_config['oom_high']
-          next_val = high
-          lowest_oom = high
-          while next_val != -1:
-            print('OOM testing--> low:{} high:{} next_val:{}'.format(
-                low, high, next_val))
-            test_config['batch_size'] = next_val
-            result_dir = self.run_benchmark(test_config, instance)
-            oom = reporting.check_oom(
-                os.path.join(result_dir, 'worker_0_stdout.log'))
-            if oom and next_val < lowest_oom:
-              lowest_oom = next_val
-            low, high, next_val = reporting.oom_batch_size_search(
-                low, high, next_val, oom)
-            print('Lowest OOM Value:{}'.format(lowest_oom))
-        else:
-          result_dir = self.run_benchmark(test_config, instance)
+    parallel_gpus = full_config.get('parallel_gpus')
+    if parallel_gpus:
+      gpus = self._gpu_list(parallel_gpus)
+      # Keeps each test on cores of the NUMA node its GPU is attached to.
+      cpu_sets = scheduler.numa_cpu_sets(
+          gpus, inventory.get_inventory(cache_dir=self.cache_dir))
+      gpu_scheduler = scheduler.GpuScheduler(gpus, cpu_sets=cpu_sets)
+
+      def run_fn(test_configs, slot):
+        # LocalInstance tracks the running command so each test needs its own.
+        instance = cluster_local.UseLocalInstances(
+            virtual_env_path=full_config.get('virtual_env_path'))
+        self.run_test_configs(test_configs, instance, slot=slot)
+
+      gpu_scheduler.run(test_suite, run_fn)
+    else:
+      # Left over from system that could have multiple instances for
+      # distributed tests. Currently uses first and only instance from list.
+      instance = cluster_local.UseLocalInstances(
+          virtual_env_path=full_config.get('virtual_env_path'))
+      for test_configs in test_suite:
+        self.run_test_configs(test_configs, instance)
+
+  def run_test_configs(self, test_configs, instance, slot=None):
+    """Runs each copy of a test and then processes the results.
 
-      suite_dir_name = '{}_{}'.format(last_config['test_suite_start_time'],
-                                      last_config['test_id'])
-      reporting.process_folder(
-          os.path.join(self.workspace, 'results', suite_dir_name),
-          report_config=self.auto_test_config)
+    Args:
+      test_configs: List of configs, one per copy of the same test.
+      instance: Instance to run the tests against.
+      slot: `scheduler.Slot` to restrict the test to, if any.
+    """
+    test_id = test_configs[0]['test_id']
+    if self.journal.reported(test_id):
+      print('{} was reported by an earlier run, skipping.'.format(test_id))
+      return
+    finished = self.journal.resume(*test_configs)
+    # Copies added past `repeat` are made from the config before it ran.
+    base_config = test_configs[0].copy()
+    last_config = None
+    result_dir = None
+    controller = adaptive_repeat.RepeatController.from_config(test_configs[0])
+    while not controller.done():
+      copy = controller.copies
+      if copy < len(test_configs):
+        test_config = test_configs[copy]
+      else:
+        test_config = command_builder.add_test_copy(test_configs, base_config)
+      last_config = test_config
+      if copy < len(finished):
+        result_dir = finished[copy]
+        controller.add_copy(result_dir)
+        continue
+      self.journal.start(test_config, copy)
+      if slot:
+        test_config['env_vars'] = slot.env_vars(test_config.get('env_vars'))
+      # Executes oom test or the normal benchmark.
+      if test_config.get('oom_test'):
+        low = test_config['oom_low']
+        high = test_config['oom_high']
+        next_val = high
+        lowest_oom = high
+        while next_val != -1:
+          print('OOM testing--> low:{} high:{} next_val:{}'.format(
+              low, high, next_val))
+          test_config['batch_size'] = next_val
+          result_dir = self.run_benchmark(test_config, instance)
+          oom = reporting.check_oom(
+              os.path.join(result_dir, 'worker_0_stdout.log'))
+          if oom and next_val < lowest_oom:
+            lowest_oom = next_val
+          low, high, next_val = reporting.oom_batch_size_search(
+              low, high, next_val, oom)
+          print('Lowest OOM Value:{}'.format(lowest_oom))
+      else:
+        result_dir = self.run_benchmark(test_config, instance)
+      self.journal.finish(test_config, copy, result_dir)
+      controller.add_copy(result_dir)
+    adaptive_repeat.finish(controller, result_dir)
+
+    suite_dir_name = '{}_{}'.format(last_config['test_suite_start_time'],
+                                    last_config['test_id'])
+    # Reports in the background so the next test starts right away.
+    report_queue.submit(
+        self.journal.report, test_id, reporting.process_folder,
+        os.path.join(self.workspace, 'results', suite_dir_name),
+        report_config=self.auto_test_config)
+
+  def _gpu_list(self, parallel_gpus):
+    """Returns list of GPU indexes from the `parallel_gpus` config value."""
+    if parallel_gpus is True:
+      parallel_gpus = max(nvidia.get_gpu_count(cache_dir=self.cache_dir), 0)
+    return list(range(int(parallel_gpus)))
 
   def load_yaml_configs(self, config_paths, base_dir=None):
     """Convert string of config paths into list of yaml objects.
@@ -234,23 +320,29 @@ class TestRunner(object):
     # Loads up the configs.
     configs = self.load_yaml_configs(self.configs.split(','))
 
-    # For each config (parent) loop over each sub_config.
-    for _, global_config in enumerate(configs):
-      base_dir = os.path.dirname(global_config['config_path'])
-      sub_configs = self.load_yaml_configs(
-          global_config['sub_configs'], base_dir=base_dir)
-      for _, run_config in enumerate(sub_configs):
-        full_config = run_config.copy()
-
-        # Copy global configs into the sub_config to create the full_config
-        # values from the global config will overwrite those in the sub_config
-        # during via command_builder later in the process.
-        if global_config:
-          for k, v in global_config.items():
-            if k != 'run_configs':
-              full_config[k] = v
-
-        self.run_test_suite(full_config)
+    try:
+      # For each config (parent) loop over each sub_config.
+      for _, global_config in enumerate(configs):
+        base_dir = os.path.dirname(global_config['config_path'])
+        sub_configs = self.load_yaml_configs(
+            global_config['sub_configs'], base_dir=base_dir)
+        for _, run_config in enumerate(sub_configs):
+          full_config = run_config.copy()
+
+          # Copy global configs into the sub_config to create the full_config
+          # values from the global config will overwrite those in the
+          # sub_config during via command_builder later in the process.
+          if global_config:
+            for k, v in global_config.items():
+              if k != 'run_configs':
+                full_config[k] = v
+
+          self.run_test_suite(full_config)
+    finally:
+      # Waits for suites still being reported.
+      errors = report_queue.flush()
+    # Raised after the loop so an error of a test is not hidden.
+    report_queue.raise_errors(errors)
 
   def _get_milliseconds_diff(self, start_time):
     """Convert seconds to int milliseconds."""
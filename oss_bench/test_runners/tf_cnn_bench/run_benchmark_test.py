@@ -1,9 +1,15 @@
 """Tests run_benchmark module."""
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import patch
+from test_runners.common import report_queue
+from test_runners.common import scheduler
+from test_runners.tf_cnn_bench import command_builder
 import yaml
 
 import test_runners.tf_cnn_bench.run_benchmark as run_benchmark
@@ -27,6 +33,30 @@ class TestRunBenchmark(unittest.TestCase):
     # Verifies the config file is processed and passed to run_test_suite.
     run_test_suite.assert_called_with(expected_full_config)
 
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_test_suite')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  def test_run_tests_report_error(self, _, run_test_suite):
+    """Tests a suite that failed to report fails run_tests after the tests."""
+
+    def report(suite_dir):
+      raise ValueError('bad log in {}'.format(suite_dir))
+
+    def run_test_suite_fn(full_config):
+      report_queue.submit(report, full_config['config_path'])
+
+    run_test_suite.side_effect = run_test_suite_fn
+    config = 'test_runners/tf_cnn_bench/test_configs/basic_run_config.yaml'
+    test_runner = run_benchmark.TestRunner(config, '/workspace', 'bench_home')
+    with self.assertRaises(report_queue.ReportError):
+      test_runner.run_tests()
+    run_test_suite.assert_called()
+
+    # An error of a test is raised rather than the report errors.
+    run_test_suite.side_effect = KeyError('test failed')
+    with self.assertRaises(KeyError):
+      test_runner.run_tests()
+    self.assertEqual([], report_queue.flush())
+
   @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
   @patch('test_runners.tf_cnn_bench.run_benchmark.reporting.process_folder')
   @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
@@ -38,6 +68,7 @@ class TestRunBenchmark(unittest.TestCase):
     full_config = yaml.safe_load(f)
     test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
     test_runner.run_test_suite(full_config)
+    report_queue.flush()
     # Verifies run_benchmark called three times and reporting once. The
     # full_config contains one test run 3 times.
     self.assertEqual(run_benchmark_mock.call_count, 3)
@@ -52,3 +83,165 @@ class TestRunBenchmark(unittest.TestCase):
     self.assertTrue(last_run_benchmark_arg0['batch_size'], 64)
     self.assertIsInstance(last_run_benchmark_arg1,
                           run_benchmark.cluster_local.LocalInstance)
+
+  @patch('test_runners.common.util.write_repeat_info')
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.reporting.process_folder')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
+  def test_run_test_suite_adaptive_repeat(self, run_benchmark_mock,
+                                          reporting_mock, _,
+                                          copy_throughput_mock,
+                                          write_repeat_info_mock):
+    """Tests copies are added past `repeat` while they disagree."""
+    config_file = (
+        'test_runners/tf_cnn_bench/test_configs/expected_full_config.yaml')
+    f = open(config_file)
+    full_config = yaml.safe_load(f)
+    full_config['max_repeat'] = 5
+    run_benchmark_mock.return_value = '/workspace/results/suite/copy'
+    copy_throughput_mock.side_effect = [100.0, 150.0, 100.0, 150.0, 100.0]
+    test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
+    test_runner.run_test_suite(full_config)
+    report_queue.flush()
+    self.assertEqual(run_benchmark_mock.call_count, 5)
+    self.assertEqual(run_benchmark_mock.call_args[0][0]['copy'], 4)
+    self.assertEqual(reporting_mock.call_count, 1)
+    repeat_info = write_repeat_info_mock.call_args[0][1]
+    self.assertEqual('max_copies', repeat_info['stop_reason'])
+
+  @patch('test_runners.tf_cnn_bench.run_benchmark.reporting.process_folder')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
+  def test_run_test_suite_resume(self, run_benchmark_mock, reporting_mock):
+    """Tests a crashed tracked run resumes at the copy that crashed."""
+    workspace = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, workspace)
+    config_file = (
+        'test_runners/tf_cnn_bench/test_configs/expected_full_config.yaml')
+    auto_test_config = {'track': True, 'framework_describe': 'v1.3.0'}
+
+    def run_benchmark_fn(run_config, _):
+      result_dir = os.path.join(
+          workspace, 'results', '{}_{}'.format(
+              run_config['test_suite_start_time'], run_config['test_id']),
+          str(run_benchmark_mock.call_count))
+      os.makedirs(result_dir)
+      if run_benchmark_mock.call_count == 3:
+        raise KeyboardInterrupt()
+      return result_dir
+
+    def load_config():
+      with open(config_file) as f:
+        return yaml.safe_load(f)
+
+    run_benchmark_mock.side_effect = run_benchmark_fn
+    test_runner = run_benchmark.TestRunner(
+        None, workspace, 'bench_home', auto_test_config=auto_test_config)
+    full_config = load_config()
+    full_config['test_suite_start_time'] = 'crashed'
+    with self.assertRaises(KeyboardInterrupt):
+      test_runner.run_test_configs(
+          command_builder.build_test_config_suite(full_config, 1)[0], None)
+    self.assertEqual(3, run_benchmark_mock.call_count)
+
+    # Only the copy that crashed is run again, in the same suite folder.
+    test_runner = run_benchmark.TestRunner(
+        None, workspace, 'bench_home', auto_test_config=auto_test_config)
+    test_runner.run_test_suite(load_config())
+    report_queue.flush()
+    self.assertEqual(4, run_benchmark_mock.call_count)
+    self.assertEqual(2, run_benchmark_mock.call_args[0][0]['copy'])
+    suite_dir = reporting_mock.call_args[0][0]
+    self.assertTrue(os.path.basename(suite_dir).startswith('crashed_'))
+    self.assertEqual(['1', '2', '4'], sorted(os.listdir(suite_dir)))
+    self.assertEqual(['3'], os.listdir(
+        os.path.join(workspace, 'incomplete', os.path.basename(suite_dir))))
+
+    # Suites that were reported are skipped.
+    test_runner = run_benchmark.TestRunner(
+        None, workspace, 'bench_home', auto_test_config=auto_test_config)
+    test_runner.run_test_suite(load_config())
+    report_queue.flush()
+    self.assertEqual(4, run_benchmark_mock.call_count)
+    self.assertEqual(1, reporting_mock.call_count)
+
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
+  def test_run_test_configs_slot_copies(self, run_benchmark_mock, _,
+                                        copy_throughput_mock):
+    """Tests copies added past `repeat` get the slot's prefix once."""
+    run_benchmark_mock.return_value = None
+    copy_throughput_mock.return_value = 100.0
+    test_configs = [{'test_id': 'test', 'copy': 0, 'repeat': 1,
+                     'max_repeat': 3, 'env_vars': 'TF_VAR=1',
+                     'test_suite_start_time': 'start'}]
+    test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
+    with patch('test_runners.common.report_queue.submit'):
+      test_runner.run_test_configs(test_configs, None,
+                                   slot=scheduler.Slot([1], [0, 1]))
+    self.assertEqual(3, len(test_configs))
+    for test_config in test_configs:
+      self.assertEqual('CUDA_VISIBLE_DEVICES=1 TF_VAR=1 taskset -c 0,1',
+                       test_config['env_vars'])
+
+  @patch('test_runners.common.adaptive_repeat.copy_throughput')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
+  def test_run_test_configs_added_copies(self, run_benchmark_mock, _,
+                                         copy_throughput_mock):
+    """Tests copies added past `repeat` do not inherit a run's values."""
+    train_dirs = []
+
+    def run_benchmark_fn(run_config, _):
+      # Like run_benchmark, sets values of the config in place.
+      train_dirs.append(run_config['train_dir'])
+      run_config['train_dir'] = os.path.join('/results', str(len(train_dirs)),
+                                             run_config['train_dir'])
+      run_config['cmd'] = 'python tf_cnn_benchmarks.py'
+
+    run_benchmark_mock.side_effect = run_benchmark_fn
+    copy_throughput_mock.return_value = 100.0
+    test_configs = [{'test_id': 'test', 'copy': 0, 'repeat': 1,
+                     'max_repeat': 3, 'train_dir': 'training_result',
+                     'test_suite_start_time': 'start'}]
+    test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
+    with patch('test_runners.common.report_queue.submit'):
+      test_runner.run_test_configs(test_configs, None)
+    self.assertEqual(['training_result'] * 3, train_dirs)
+    self.assertEqual([0, 1, 2], [c['copy'] for c in test_configs])
+    self.assertEqual('/results/3/training_result', test_configs[2]['train_dir'])
+
+  @patch('tools.inventory.get_inventory')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.reporting.process_folder')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner.run_benchmark')
+  def test_run_test_suite_parallel(self, run_benchmark_mock, reporting_mock,
+                                   _, get_inventory_mock):
+    """Tests single GPU tests are pinned to a GPU when parallel_gpus is set."""
+    config_file = (
+        'test_runners/tf_cnn_bench/test_configs/expected_full_config.yaml')
+    f = open(config_file)
+    full_config = yaml.safe_load(f)
+    full_config['parallel_gpus'] = 2
+    get_inventory_mock.return_value = {'cpus': [], 'gpus': []}
+    test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
+    test_runner.run_test_suite(full_config)
+    report_queue.flush()
+    self.assertEqual(run_benchmark_mock.call_count, 3)
+    self.assertEqual(reporting_mock.call_count, 1)
+    last_run_benchmark_arg0 = run_benchmark_mock.call_args[0][0]
+    self.assertTrue(
+        last_run_benchmark_arg0['env_vars'].startswith(
+            'CUDA_VISIBLE_DEVICES=0'))
+    get_inventory_mock.assert_called_with(cache_dir='/workspace/cache')
+
+  @patch('tools.nvidia.get_gpu_count')
+  @patch('test_runners.tf_cnn_bench.run_benchmark.TestRunner._make_log_dir')
+  def test_gpu_list(self, _, get_gpu_count_mock):
+    """Tests the GPU count is read from the workspace cache."""
+    get_gpu_count_mock.return_value = 2
+    test_runner = run_benchmark.TestRunner(None, '/workspace', 'bench_home')
+    self.assertEqual([0, 1], test_runner._gpu_list(True))
+    get_gpu_count_mock.assert_called_with(cache_dir='/workspace/cache')
+    self.assertEqual([0, 1, 2], test_runner._gpu_list(3))
@@ -2,9 +2,35 @@
 from __future__ import print_function
 import os
 
+from test_runners.common import log_parser
+from test_runners.common import log_store
+from test_runners.common import result_index
+from test_runners.common import time_series
 from test_runners.common import util
 import yaml
 
+LOG_PATTERNS = [
+    # e.g. Benchmark metric: {'name': 'current_examples_per_sec', 'timestamp':
+    # '2018-08-17T16:56:21.708468Z', 'value': 137.42, 'extras': [], 'unit':
+    # None, 'global_step': 106}
+    log_parser.Pattern(
+        'step',
+        r"Benchmark metric: \{{'name': 'current_examples_per_sec', "
+        r"'timestamp': '(?P<timestamp>[^']+)',[^\n]*?"
+        r"'value': (?P<value>{})[^\n]*?'global_step': (?P<step>\d+)".format(
+            log_parser.FLOAT),
+        types={
+            'timestamp': log_parser.iso_timestamp,
+            'value': float,
+            'step': int
+        },
+        hint='current_examples_per_sec'),
+]
+log_parser.register('tf_models', LOG_PATTERNS)
+
+# Files marking a run folder.
+RESULT_FILES = ('config.yaml',)
+
 
 def process_folder(folder_path, report_config=None):
   """Process one or more results of a single test found in the folder path.
@@ -16,7 +42,7 @@ def process_folder(folder_path, report_config=None):
       higher level harness with high level system information.
   """
   report_config = {} if report_config is None else report_config
-  results = _collect_results(folder_path)
+  results = collect_results(folder_path)
   agg_result = util.report_aggregate_results(results)
 
   util.upload_results(
@@ -26,18 +52,22 @@ def process_folder(folder_path, report_config=None):
       test_harness='tf_models')
 
 
-def _collect_results(folder_path):
-  """Walks folder path looking for and parsing results files."""
-  results = []
-  for r, _, files in os.walk(folder_path):
-    for f in files:
-      if f == 'config.yaml':
-        result = {}
-        process_base_result_files(result, os.path.join(r, f))
-        result_file = os.path.join(r, 'worker_0_stdout.log')
-        parse_result_file(result, result_file)
-        results.append(result)
-  return results
+def collect_results(folder_path):
+  """Walks folder path looking for and parsing results files.
+
+  Runs already in the result index are not parsed again.
+  """
+  return result_index.collect(folder_path, 'tf_models', RESULT_FILES,
+                              _parse_result_dir)
+
+
+def _parse_result_dir(config_file_path):
+  """Returns result of the run whose config.yaml is `config_file_path`."""
+  result = {}
+  process_base_result_files(result, config_file_path)
+  parse_result_file(result, os.path.join(os.path.dirname(config_file_path),
+                                         'worker_0_stdout.log'))
+  return result
 
 
 def process_base_result_files(result, config_file_path):
@@ -77,31 +107,33 @@ def process_base_result_files(result, config_file_path):
 
 def parse_result_file(result, result_file_path):
   """Parses a result file."""
-  try:
-    result_file = open(result_file_path, 'r')
-  except IOError:
+  if not log_store.exists(result_file_path):
     print('{}  not found.'.format(result_file_path))
     return
-  samples = 0
-  sum_speed = 0
-
   # Processes results file and aggregates the results of one run.
-  for line in result_file:
-    # Rows with 'tensorflow:Batch [' and 'exp/sec' contain speed data.
-    if (line.find('Benchmark metric:') > 0 and
-        line.find('current_examples_per_sec') > 0):
-      parts = line.split(',')
-      batch = int(parts[5].split(':')[1].replace('}', '').strip())
-      # Ignores first 100 batches as a warm up
-      if batch > 100:
-        sum_speed += float(parts[2].split(':')[1].strip())
-        samples += 1
-
-  result['imgs_sec'] = sum_speed / samples
-  result['batches_sampled'] = samples
+  parser = log_parser.get_parser('tf_models')
+  records = [record for record in parser.parse_file(result_file_path)
+             if record['value'] > 0]
+  # Rates are logged every N batches, so each covers the same examples.
+  windows = util.rate_windows([record['value'] for record in records])
+  util.measure_steady_state(result, records, windows, warmup_steps=100)
   return result
 
 
+def write_time_series(result_dir):
+  """Saves each step logged by the run in `result_dir`, see `time_series`.
+
+  Returns:
+    Path of the file written or None if the run has no log.
+  """
+  result_file = os.path.join(result_dir, 'worker_0_stdout.log')
+  if not log_store.exists(result_file):
+    return None
+  parser = log_parser.get_parser('tf_models', kinds=['step'])
+  records = list(parser.parse_file(result_file))
+  return time_series.write_records(result_dir, records)
+
+
 def get_config(result_dir):
   config_file = os.path.join(result_dir, 'config.yaml')
   with open(config_file) as f:
@@ -11,7 +11,7 @@ import test_runners.tf_models.reporting as reporting
 class TestReporting(unittest.TestCase):
   """Tests for tf_models reporting module."""
 
-  @patch('test_runners.tf_models.reporting._collect_results')
+  @patch('test_runners.tf_models.reporting.collect_results')
   @patch('upload.result_upload.upload_result')
   def test_process_folder(self, mock_upload, mock_collect_results):
     """Tests process folder and verifies args passed to upload_result."""
@@ -83,8 +83,9 @@ class TestReporting(unittest.TestCase):
                                 'test_runners/tf_models/unittest_files/results'
                                 '/basic/worker_0_stdout.txt')
 
-    self.assertEqual(result['imgs_sec'], 132.21041311752728)
-    self.assertEqual(result['batches_sampled'], 200)
+    self.assertAlmostEqual(result['imgs_sec'], 132.34643738574638)
+    self.assertEqual(result['batches_sampled'], 108)
+    self.assertEqual(result['warmup']['step'], 9306)
 
   def _mock_config(self, test_id):
     config = {}
@@ -0,0 +1,129 @@
+"""Probe framework versions in a subprocess and cache the results on disk.
+
+Importing TensorFlow, MXNet or PyTorch takes seconds and hundreds of MB that
+would then stay resident in the harness for the whole suite. The version is
+instead read by a short lived python process. Results are cached keyed by
+the interpreter and the modification time of its site-packages folders, which
+change whenever a package is installed, upgraded or removed.
+"""
+from __future__ import print_function
+import hashlib
+import json
+import os
+import site
+import sys
+
+from six.moves import shlex_quote
+import tools.local_command as local_command
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'oss_bench')
+CACHE_FILE = 'framework_versions.json'
+
+# Prefix of the line the probe prints its result on. Frameworks log to stderr
+# on import, which is mixed into the output.
+RESULT_PREFIX = 'FRAMEWORK_VERSION:'
+
+# Code run by the probe for each framework. Prints [version, describe].
+PROBES = {
+    'tensorflow': ('import tensorflow as tf\n'
+                   'version = [tf.__version__, tf.__git_version__]'),
+    'mxnet': ('import mxnet as mx\n'
+              'version = [mx.__version__, mx.__version__]'),
+    'pytorch': ('import torch\n'
+                'version = [torch.__version__, torch.__version__]'),
+}
+
+_PROBE_TEMPLATE = '{}\nimport json\nprint({!r} + json.dumps(version))\n'
+
+_SITE_PACKAGES_PROBE = ('import json, site, sys\n'
+                        'paths = list(getattr(site, "getsitepackages", '
+                        'lambda: [])())\n'
+                        'paths.append(site.getusersitepackages())\n'
+                        'print({!r} + json.dumps(paths))\n')
+
+
+def get_version(framework, python=None, cache_dir=DEFAULT_CACHE_DIR):
+  """Returns version info for a framework without importing it.
+
+  Args:
+    framework (str): tensorflow, mxnet or pytorch.
+    python (str, optional): Interpreter the benchmarks run with. Defaults to
+      the interpreter running the harness.
+    cache_dir (str, optional): Folder holding the cache file. None to not use
+      the cache.
+
+  Returns:
+    Tuple of version and more detailed version, e.g. the git version.
+
+  Raises:
+    ValueError: if `framework` has no probe.
+    RuntimeError: if the probe fails, e.g. the framework is not installed.
+  """
+  if framework not in PROBES:
+    raise ValueError('No version probe for framework:{}'.format(framework))
+  python = python or sys.executable
+  key = _cache_key(framework, python)
+  cache = _load_cache(cache_dir)
+  if key in cache:
+    return tuple(cache[key])
+
+  version = tuple(_probe(python, _PROBE_TEMPLATE.format(PROBES[framework],
+                                                        RESULT_PREFIX)))
+  print('{} version:{}'.format(framework, version))
+  if cache_dir:
+    cache[key] = list(version)
+    _save_cache(cache_dir, cache)
+  return version
+
+
+def _probe(python, code):
+  """Runs `code` with `python` and returns the JSON it printed."""
+  cmd = '{} -c {}'.format(shlex_quote(python), shlex_quote(code))
+  retcode, stdout = local_command.run_local_command(cmd)
+  if retcode == 0:
+    for line in stdout.splitlines():
+      if line.startswith(RESULT_PREFIX):
+        return json.loads(line[len(RESULT_PREFIX):])
+  raise RuntimeError('Probe with {} failed:{}'.format(python, stdout))
+
+
+def _site_packages(python):
+  """Returns site-packages folders of `python`."""
+  if os.path.realpath(python) == os.path.realpath(sys.executable):
+    paths = list(getattr(site, 'getsitepackages', lambda: [])())
+    paths.append(site.getusersitepackages())
+    return paths
+  return _probe(python, _SITE_PACKAGES_PROBE.format(RESULT_PREFIX))
+
+
+def _cache_key(framework, python):
+  """Returns key for the framework, interpreter and site-packages state."""
+  python = os.path.realpath(python)
+  mtimes = []
+  for path in sorted(set(_site_packages(python))):
+    if os.path.isdir(path):
+      mtimes.append('{}={}'.format(path, os.path.getmtime(path)))
+  key = '|'.join([framework, python] + mtimes)
+  return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _load_cache(cache_dir):
+  if not cache_dir:
+    return {}
+  try:
+    with open(os.path.join(cache_dir, CACHE_FILE)) as f:
+      return json.load(f)
+  except (IOError, OSError, ValueError):
+    return {}
+
+
+def _save_cache(cache_dir, cache):
+  """Writes the cache to a temp file and renames it into place."""
+  if not os.path.isdir(cache_dir):
+    os.makedirs(cache_dir)
+  cache_file = os.path.join(cache_dir, CACHE_FILE)
+  tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+  with open(tmp_file, 'w') as f:
+    json.dump(cache, f)
+  os.rename(tmp_file, cache_file)
@@ -0,0 +1,62 @@
+"""Tests framework_version module."""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from mock import patch
+import tools.framework_version as framework_version
+
+FAKE_PROBES = {
+    'fake': "version = ['1.0', 'v1.0-12-gabc']",
+    'missing': 'import not_a_real_framework_module',
+}
+
+
+@patch.dict('tools.framework_version.PROBES', FAKE_PROBES)
+class TestFrameworkVersion(unittest.TestCase):
+  """Tests for get_version."""
+
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.cache_dir)
+
+  def test_get_version(self):
+    """Tests version is probed in a subprocess and then read from cache."""
+    version = framework_version.get_version('fake', cache_dir=self.cache_dir)
+    self.assertEqual(('1.0', 'v1.0-12-gabc'), version)
+    self.assertTrue(
+        os.path.isfile(
+            os.path.join(self.cache_dir, framework_version.CACHE_FILE)))
+    with patch('tools.local_command.run_local_command') as run_mock:
+      version = framework_version.get_version('fake', cache_dir=self.cache_dir)
+      run_mock.assert_not_called()
+    self.assertEqual(('1.0', 'v1.0-12-gabc'), version)
+
+  def test_cache_key_site_packages(self):
+    """Tests installing a package, which touches site-packages, misses."""
+    site_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, site_dir)
+    with patch('tools.framework_version._site_packages') as site_mock:
+      site_mock.return_value = [site_dir]
+      key = framework_version._cache_key('fake', sys.executable)
+      self.assertEqual(key,
+                       framework_version._cache_key('fake', sys.executable))
+      os.utime(site_dir, (1, 1))
+      self.assertNotEqual(key,
+                          framework_version._cache_key('fake', sys.executable))
+    self.assertNotEqual(key,
+                        framework_version._cache_key('other', sys.executable))
+
+  def test_get_version_missing(self):
+    """Tests a framework that fails to import raises and is not cached."""
+    with self.assertRaises(RuntimeError):
+      framework_version.get_version('missing', cache_dir=self.cache_dir)
+    self.assertEqual({}, framework_version._load_cache(self.cache_dir))
+
+  def test_get_version_unknown(self):
+    with self.assertRaises(ValueError):
+      framework_version.get_version('caffe', cache_dir=None)
@@ -1,11 +1,20 @@
 """Extract information about local git repos."""
 from __future__ import print_function
+import os
+
 import tools.local_command as local_command
 
+# Describe of a shallow checkout, written by `tools.git_sync` from the mirror
+# the checkout was fetched from, relative to the checkout's .git folder.
+DESCRIBE_FILE = 'harness_describe'
+
 
 def git_repo_describe(git_dir):
   """Returns describe for git_dir.
 
+  Shallow checkouts lack the history and tags to describe their commit, so
+  the describe `tools.git_sync` saved from the mirror is used if present.
+
   Args:
     git_dir: git directory to run describe on.
 
@@ -15,6 +24,10 @@ def git_repo_describe(git_dir):
   Raises:
     Exception: If return value of the command is non-zero.
   """
+  describe_file = os.path.join(git_dir, '.git', DESCRIBE_FILE)
+  if os.path.isfile(describe_file):
+    with open(describe_file) as f:
+      return f.read().strip()
   cmd = 'git -C {} describe --always'.format(git_dir)
   retval, stdout = local_command.run_local_command(cmd)
   if retval != 0:
@@ -0,0 +1,191 @@
+"""Syncs the git repos the harness runs from, in parallel and shallow.
+
+Each repo is checked out at a single commit, the tip of a branch or a sha,
+with a `--depth 1` fetch so no history is copied into the workspace. Fetches
+read from a bare mirror of each remote kept under a mirror folder. The first
+sync clones the mirror and later syncs only fetch what is new, or nothing if
+the mirror already holds the sha. Mirrors are locked while updated, so any
+number of workspaces can share a mirror folder, e.g. a folder on the host
+that is also mounted in docker.
+
+A shallow checkout has no tags, so `git describe` of it is a bare sha. The
+describe of the commit in the mirror is saved in the checkout and read by
+`git_info.git_repo_describe` instead. Without a mirror the bare sha is used.
+
+Example:
+  git_sync.sync_repos([
+      git_sync.Repo('https://github.com/tensorflow/benchmarks.git',
+                    '/workspace/git/benchmarks'),
+      git_sync.Repo('https://github.com/tfboyd/models.git',
+                    '/workspace/git/tf_models', branch='resnet_perf_tweaks'),
+  ], mirror_dir='/workspace/cache/git_mirrors')
+"""
+from __future__ import print_function
+import fcntl
+import hashlib
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import shutil
+
+import tools.git_info as git_info
+import tools.local_command as local_command
+
+# Mirror folder relative to a workspace, used when no other is set.
+MIRROR_DIR = os.path.join('cache', 'git_mirrors')
+# Most repos synced at once.
+MAX_WORKERS = 8
+
+
+class Repo(object):
+  """Repo to sync and the commit to check out.
+
+  Args:
+    git_repo (str): URL or path of the remote, e.g. a local bare repo.
+    local_folder (str): Where to check the repo out.
+    branch (str, optional): Branch to check out, defaults to the remote's
+      HEAD.
+    sha_hash (str, optional): Commit to check out, on `branch` if set.
+  """
+
+  def __init__(self, git_repo, local_folder, branch=None, sha_hash=None):
+    self.git_repo = git_repo
+    self.local_folder = local_folder
+    self.branch = branch
+    self.sha_hash = sha_hash
+
+  @property
+  def ref(self):
+    """Returns what is fetched, the sha, the branch or the remote's HEAD."""
+    return self.sha_hash or self.branch or 'HEAD'
+
+
+def _run(cmd):
+  """Runs `cmd` and returns its output.
+
+  Raises:
+    Exception: If return value of the command is non-zero.
+  """
+  print(cmd)
+  retval, stdout = local_command.run_local_command(cmd)
+  if retval != 0:
+    raise Exception('Command ({}) failed to run:{}'.format(cmd, stdout))
+  return stdout
+
+
+def _has_commit(git_dir, sha_hash):
+  """Returns True if `git_dir` holds commit `sha_hash`."""
+  retval, _ = local_command.run_local_command(
+      'git -C {} cat-file -e {}^{{commit}}'.format(git_dir, sha_hash))
+  return retval == 0
+
+
+def mirror_path(mirror_dir, git_repo):
+  """Returns folder of the bare mirror of `git_repo` in `mirror_dir`.
+
+  The name ends with the repo's name, e.g. abc123def456_models.git, and
+  starts with a hash of the full URL so forks do not share a mirror.
+  """
+  name = re.sub(r'[^\w.-]', '_', git_repo.rstrip('/').split('/')[-1])
+  if not name.endswith('.git'):
+    name += '.git'
+  url_hash = hashlib.sha1(git_repo.encode('utf-8')).hexdigest()[:12]
+  return os.path.join(mirror_dir, '{}_{}'.format(url_hash, name))
+
+
+def update_mirror(git_repo, mirror_dir, sha_hash=None):
+  """Clones or fetches the bare mirror of `git_repo`.
+
+  Args:
+    git_repo (str): URL or path of the remote.
+    mirror_dir (str): Folder holding the mirrors.
+    sha_hash (str, optional): Commit needed. A mirror that holds it is not
+      fetched.
+
+  Returns:
+    Path of the mirror.
+  """
+  path = mirror_path(mirror_dir, git_repo)
+  if not os.path.isdir(mirror_dir):
+    try:
+      os.makedirs(mirror_dir)
+    except OSError:
+      if not os.path.isdir(mirror_dir):
+        raise
+  with open(path + '.lock', 'w') as lock:
+    # Workspaces sharing the mirror wait for each other's update.
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    try:
+      if not os.path.isdir(path):
+        # Clones under a temporary name so a failed clone is not used.
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        _run('git clone --mirror --quiet {} {}'.format(git_repo, tmp_path))
+        os.rename(tmp_path, path)
+      elif sha_hash is None or not _has_commit(path, sha_hash):
+        _run('git -C {} fetch --prune --quiet origin'.format(path))
+    finally:
+      fcntl.flock(lock, fcntl.LOCK_UN)
+  return path
+
+
+def checkout(repo, source=None):
+  """Checks out `repo` at its commit with a shallow fetch.
+
+  Changes to files in the checkout are discarded.
+
+  Args:
+    repo (Repo): Repo to check out.
+    source (str, optional): Local repo to fetch from and describe the commit
+      with, e.g. a mirror. Defaults to the repo's remote.
+  """
+  local_folder = repo.local_folder
+  if not os.path.isdir(os.path.join(local_folder, '.git')):
+    _run('git init --quiet {}'.format(local_folder))
+    _run('git -C {} remote add origin {}'.format(local_folder, repo.git_repo))
+  _run('git -C {} fetch --depth 1 --no-tags --quiet {} {}'.format(
+      local_folder, source or repo.git_repo, repo.ref))
+  if repo.branch:
+    _run('git -C {} checkout --quiet --force -B {} FETCH_HEAD'.format(
+        local_folder, repo.branch))
+  else:
+    _run('git -C {} checkout --quiet --force --detach FETCH_HEAD'.format(
+        local_folder))
+  describe_file = os.path.join(local_folder, '.git', git_info.DESCRIBE_FILE)
+  if source:
+    sha_hash = _run('git -C {} rev-parse HEAD'.format(local_folder)).strip()
+    describe = _run('git -C {} describe --always {}'.format(source, sha_hash))
+    with open(describe_file, 'w') as f:
+      f.write(describe.strip() + '\n')
+  elif os.path.exists(describe_file):
+    os.remove(describe_file)
+
+
+def sync_repo(repo, mirror_dir=None):
+  """Syncs one repo, through its mirror if `mirror_dir` is set."""
+  source = None
+  if mirror_dir:
+    source = update_mirror(repo.git_repo, mirror_dir, sha_hash=repo.sha_hash)
+  checkout(repo, source=source)
+
+
+def sync_repos(repos, mirror_dir=None, max_workers=MAX_WORKERS):
+  """Syncs repos in parallel threads.
+
+  Args:
+    repos (list): `Repo`s to sync.
+    mirror_dir (str, optional): Folder holding the mirrors. Repos are
+      fetched straight from their remotes if None.
+    max_workers (int): Most repos synced at once.
+
+  Raises:
+    Exception: The first error of a repo that failed to sync.
+  """
+  if not repos:
+    return
+  pool = ThreadPool(min(len(repos), max_workers))
+  try:
+    pool.map(lambda repo: sync_repo(repo, mirror_dir=mirror_dir), repos)
+  finally:
+    pool.close()
+    pool.join()
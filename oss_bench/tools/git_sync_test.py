@@ -0,0 +1,114 @@
+"""Tests git_sync module."""
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import tools.git_info as git_info
+import tools.git_sync as git_sync
+
+
+def _git(*args):
+  """Runs git and returns its output."""
+  cmd = ['git', '-c', 'user.name=test', '-c', 'user.email=test@test'] + list(
+      args)
+  return subprocess.check_output(cmd).decode('utf-8').strip()
+
+
+class TestGitSync(unittest.TestCase):
+  """Tests for syncing repos from a local bare repo as the remote."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.src = os.path.join(self.tmp_dir, 'src')
+    _git('init', '--quiet', self.src)
+    self.commits = [self._commit(i) for i in range(3)]
+    _git('-C', self.src, 'branch', 'other', self.commits[1])
+    self.remote = os.path.join(self.tmp_dir, 'remote.git')
+    _git('clone', '--quiet', '--bare', self.src, self.remote)
+    self.mirror_dir = os.path.join(self.tmp_dir, 'mirrors')
+
+  def _commit(self, value):
+    with open(os.path.join(self.src, 'file.txt'), 'w') as f:
+      f.write('{}\n'.format(value))
+    _git('-C', self.src, 'add', 'file.txt')
+    _git('-C', self.src, 'commit', '--quiet', '-m', str(value))
+    return _git('-C', self.src, 'rev-parse', 'HEAD')
+
+  def _head(self, local_folder):
+    return _git('-C', local_folder, 'rev-parse', 'HEAD')
+
+  def test_sync_repos(self):
+    """Tests repos are checked out shallow at a branch, a sha and HEAD."""
+    repos = [
+        git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'head')),
+        git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'branch'),
+                      branch='other'),
+        git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'sha'),
+                      sha_hash=self.commits[0]),
+    ]
+    git_sync.sync_repos(repos, mirror_dir=self.mirror_dir)
+    self.assertEqual(self.commits[2], self._head(repos[0].local_folder))
+    self.assertEqual(self.commits[1], self._head(repos[1].local_folder))
+    self.assertEqual('other', _git('-C', repos[1].local_folder, 'rev-parse',
+                                   '--abbrev-ref', 'HEAD'))
+    self.assertEqual(self.commits[0], self._head(repos[2].local_folder))
+    for repo in repos:
+      self.assertTrue(
+          os.path.isfile(os.path.join(repo.local_folder, '.git', 'shallow')))
+    self.assertTrue(
+        os.path.isdir(git_sync.mirror_path(self.mirror_dir, self.remote)))
+
+  def test_sync_updates(self):
+    """Tests a second sync fetches new commits through the mirror."""
+    repo = git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'a'))
+    git_sync.sync_repo(repo, mirror_dir=self.mirror_dir)
+    with open(os.path.join(repo.local_folder, 'file.txt'), 'w') as f:
+      f.write('local change\n')
+    new_commit = self._commit(3)
+    _git('-C', self.src, 'push', '--quiet', self.remote, 'HEAD')
+    git_sync.sync_repo(repo, mirror_dir=self.mirror_dir)
+    self.assertEqual(new_commit, self._head(repo.local_folder))
+    with open(os.path.join(repo.local_folder, 'file.txt')) as f:
+      self.assertEqual('3\n', f.read())
+
+  def test_sync_without_mirror(self):
+    """Tests repos are fetched from the remote when no mirror is set."""
+    repo = git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'a'),
+                         sha_hash=self.commits[1])
+    git_sync.sync_repos([repo])
+    self.assertEqual(self.commits[1], self._head(repo.local_folder))
+    self.assertFalse(os.path.isdir(self.mirror_dir))
+
+  def test_describe(self):
+    """Tests the describe of a shallow checkout comes from the mirror."""
+    _git('-C', self.src, 'tag', '-a', '-m', 'v1', 'v1.0', self.commits[0])
+    _git('-C', self.src, 'push', '--quiet', '--tags', self.remote)
+    repo = git_sync.Repo(self.remote, os.path.join(self.tmp_dir, 'git', 'a'))
+    git_sync.sync_repo(repo, mirror_dir=self.mirror_dir)
+    self.assertEqual('v1.0-2-g{}'.format(self.commits[2][:7]),
+                     git_info.git_repo_describe(repo.local_folder))
+
+    # Without a mirror the shallow checkout describes itself.
+    git_sync.sync_repo(repo)
+    self.assertEqual(self.commits[2][:7],
+                     git_info.git_repo_describe(repo.local_folder)[:7])
+
+  def test_sync_error(self):
+    """Tests a repo that cannot be fetched raises."""
+    repo = git_sync.Repo(os.path.join(self.tmp_dir, 'missing.git'),
+                         os.path.join(self.tmp_dir, 'git', 'a'))
+    with self.assertRaises(Exception):
+      git_sync.sync_repos([repo], mirror_dir=self.mirror_dir)
+
+  def test_mirror_path(self):
+    """Tests forks with the same name get their own mirror."""
+    fork_a = git_sync.mirror_path('/m', 'https://github.com/a/models.git')
+    fork_b = git_sync.mirror_path('/m', 'https://github.com/b/models')
+    self.assertTrue(fork_a.endswith('_models.git'))
+    self.assertTrue(fork_b.endswith('_models.git'))
+    self.assertNotEqual(fork_a, fork_b)
@@ -0,0 +1,252 @@
+"""System inventory read from /proc and /sys in one pass and cached.
+
+Gathers CPU model, sockets, cores, SMT, NUMA nodes, cache sizes, memory,
+frequency governor and the GPU list without starting shell pipelines. The
+result is cached on disk keyed by the kernel boot id, as none of it changes
+until the machine reboots.
+
+Example:
+  inventory = get_inventory()
+  print(inventory['cpu']['cores'], len(inventory['gpus']))
+"""
+from __future__ import print_function
+import json
+import os
+import re
+
+import tools.local_command as local_command
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'oss_bench')
+CACHE_FILE = 'inventory.json'
+PROC_DIR = '/proc'
+SYS_DIR = '/sys'
+
+
+def get_inventory(cache_dir=DEFAULT_CACHE_DIR,
+                  proc_dir=PROC_DIR,
+                  sys_dir=SYS_DIR):
+  """Returns the system inventory, from the cache if it is from this boot.
+
+  Args:
+    cache_dir: Folder holding the cache file. None to not use the cache.
+    proc_dir: Mount point of procfs.
+    sys_dir: Mount point of sysfs.
+
+  Returns:
+    dict with keys boot_id, cpu, cpus, numa_nodes, memory_total, gpu_driver
+    and gpus, see `collect`.
+  """
+  boot_id = _read(os.path.join(proc_dir, 'sys/kernel/random/boot_id'))
+  cache_file = os.path.join(cache_dir, CACHE_FILE) if cache_dir else None
+  if cache_file and boot_id:
+    try:
+      with open(cache_file) as f:
+        inventory = json.load(f)
+      if inventory.get('boot_id') == boot_id:
+        return inventory
+    except (IOError, OSError, ValueError):
+      pass
+
+  inventory = collect(proc_dir=proc_dir, sys_dir=sys_dir)
+  inventory['boot_id'] = boot_id
+  if cache_file and boot_id:
+    _save(cache_file, inventory)
+  return inventory
+
+
+def collect(proc_dir=PROC_DIR, sys_dir=SYS_DIR):
+  """Reads the inventory from /proc and /sys.
+
+  Args:
+    proc_dir: Mount point of procfs.
+    sys_dir: Mount point of sysfs.
+
+  Returns:
+    dict with:
+      cpu: model_name, sockets, cores (physical), threads (logical),
+        threads_per_core, caches (e.g. {'L3': '30720K'}) and governor.
+      cpus: list of dicts with cpu, socket, core and node of each logical CPU.
+      numa_nodes: list of dicts with node and its cpus.
+      memory_total: Bytes of memory.
+      gpu_driver: NVIDIA driver version or '' if there is no driver.
+      gpus: list of dicts with index, name, bus_id and numa_node.
+  """
+  cpu_sys_dir = os.path.join(sys_dir, 'devices/system/cpu')
+  cpus, model_name = _parse_cpuinfo(
+      _read(os.path.join(proc_dir, 'cpuinfo')) or '')
+  numa_nodes = _numa_nodes(os.path.join(sys_dir, 'devices/system/node'))
+  cpu_nodes = {}
+  for node in numa_nodes:
+    for cpu in node['cpus']:
+      cpu_nodes[cpu] = node['node']
+  for cpu in cpus:
+    cpu['node'] = cpu_nodes.get(cpu['cpu'], 0)
+
+  sockets = len(set(cpu['socket'] for cpu in cpus)) or 1
+  cores = len(set((cpu['socket'], cpu['core']) for cpu in cpus))
+  cpu_info = {
+      'model_name': model_name,
+      'sockets': sockets,
+      'cores': cores,
+      'threads': len(cpus),
+      'threads_per_core': len(cpus) // cores if cores else 0,
+      'caches': _caches(os.path.join(cpu_sys_dir, 'cpu0/cache')),
+      'governor': _read(
+          os.path.join(cpu_sys_dir, 'cpu0/cpufreq/scaling_governor'))
+  }
+
+  gpu_driver, gpus = _nvidia_gpus(proc_dir)
+  for gpu in gpus:
+    numa_node = _read(
+        os.path.join(sys_dir, 'bus/pci/devices', gpu['bus_id'].lower(),
+                     'numa_node'))
+    gpu['numa_node'] = max(int(numa_node), 0) if numa_node else 0
+
+  return {
+      'cpu': cpu_info,
+      'cpus': cpus,
+      'numa_nodes': numa_nodes,
+      'memory_total': _memory_total(os.path.join(proc_dir, 'meminfo')),
+      'gpu_driver': gpu_driver,
+      'gpus': gpus
+  }
+
+
+def parse_cpu_list(cpu_list):
+  """Returns list of ints from a kernel cpu list, e.g. '0-3,8' or ''."""
+  cpus = []
+  for part in cpu_list.strip().split(','):
+    if not part:
+      continue
+    if '-' in part:
+      start, end = part.split('-')
+      cpus.extend(range(int(start), int(end) + 1))
+    else:
+      cpus.append(int(part))
+  return cpus
+
+
+def _parse_cpuinfo(cpuinfo):
+  """Returns list of logical CPUs and the model name from /proc/cpuinfo."""
+  cpus = []
+  model_name = ''
+  for block in cpuinfo.split('\n\n'):
+    fields = {}
+    for line in block.splitlines():
+      key, _, value = line.partition(':')
+      fields[key.strip()] = value.strip()
+    if 'processor' not in fields:
+      continue
+    model_name = model_name or fields.get('model name', '')
+    cpu = int(fields['processor'])
+    cpus.append({
+        'cpu': cpu,
+        'socket': int(fields.get('physical id', 0)),
+        'core': int(fields.get('core id', cpu))
+    })
+  return cpus, model_name
+
+
+def _numa_nodes(node_dir):
+  nodes = []
+  if os.path.isdir(node_dir):
+    for name in sorted(os.listdir(node_dir)):
+      match = re.match(r'node(\d+)$', name)
+      if match:
+        cpu_list = _read(os.path.join(node_dir, name, 'cpulist')) or ''
+        nodes.append({
+            'node': int(match.group(1)),
+            'cpus': parse_cpu_list(cpu_list)
+        })
+  return sorted(nodes, key=lambda node: node['node'])
+
+
+def _caches(cache_dir):
+  """Returns dict of cache name, e.g. L1d or L3, to size."""
+  caches = {}
+  if os.path.isdir(cache_dir):
+    for name in sorted(os.listdir(cache_dir)):
+      if not name.startswith('index'):
+        continue
+      index_dir = os.path.join(cache_dir, name)
+      level = _read(os.path.join(index_dir, 'level'))
+      cache_type = _read(os.path.join(index_dir, 'type'))
+      size = _read(os.path.join(index_dir, 'size'))
+      if level and size:
+        suffix = {'Data': 'd', 'Instruction': 'i'}.get(cache_type, '')
+        caches['L{}{}'.format(level, suffix)] = size
+  return caches
+
+
+def _memory_total(meminfo_file):
+  for line in (_read(meminfo_file) or '').splitlines():
+    if line.startswith('MemTotal:'):
+      return int(line.split()[1]) * 1024
+  return 0
+
+
+def _nvidia_gpus(proc_dir):
+  """Returns driver version and GPUs from /proc/driver/nvidia.
+
+  Falls back to a single nvidia-smi query if the driver does not expose
+  /proc/driver/nvidia, e.g. in some containers.
+  """
+  nvidia_dir = os.path.join(proc_dir, 'driver/nvidia')
+  version = _read(os.path.join(nvidia_dir, 'version'))
+  gpus_dir = os.path.join(nvidia_dir, 'gpus')
+  if not version or not os.path.isdir(gpus_dir):
+    return _nvidia_smi_gpus()
+
+  match = re.search(r'Kernel Module\s+(\S+)', version)
+  driver = match.group(1) if match else ''
+  gpus = []
+  # nvidia-smi orders GPUs by PCI bus id as well.
+  for index, bus_id in enumerate(sorted(os.listdir(gpus_dir))):
+    information = _read(os.path.join(gpus_dir, bus_id, 'information')) or ''
+    match = re.search(r'^Model:\s*(.+)$', information, re.MULTILINE)
+    gpus.append({
+        'index': index,
+        'name': match.group(1).strip() if match else '',
+        'bus_id': bus_id
+    })
+  return driver, gpus
+
+
+def _nvidia_smi_gpus():
+  cmd = ('nvidia-smi --query-gpu=index,driver_version,gpu_name,pci.bus_id '
+         '--format=csv,noheader')
+  retcode, result = local_command.run_local_command(cmd)
+  driver = ''
+  gpus = []
+  if retcode != 0:
+    return driver, gpus
+  for line in result.splitlines():
+    parts = [part.strip() for part in line.split(',')]
+    if len(parts) != 4 or not parts[0].isdigit():
+      continue
+    driver = parts[1]
+    # nvidia-smi pads the PCI domain to 8 digits, sysfs uses 4.
+    bus_id = parts[3][4:] if len(parts[3]) == 16 else parts[3]
+    gpus.append({'index': int(parts[0]), 'name': parts[2], 'bus_id': bus_id})
+  return driver, gpus
+
+
+def _read(path):
+  """Returns stripped contents of a file or None if it cannot be read."""
+  try:
+    with open(path) as f:
+      return f.read().strip()
+  except (IOError, OSError):
+    return None
+
+
+def _save(cache_file, inventory):
+  """Writes the cache to a temp file and renames it into place."""
+  cache_dir = os.path.dirname(cache_file)
+  if not os.path.isdir(cache_dir):
+    os.makedirs(cache_dir)
+  tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+  with open(tmp_file, 'w') as f:
+    json.dump(inventory, f)
+  os.rename(tmp_file, cache_file)
@@ -0,0 +1,123 @@
+"""Tests inventory module."""
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+import tools.inventory as inventory
+
+CPUINFO = """processor\t: {cpu}
+model name\t: Intel(R) Xeon(R) CPU E5-2698 v4 @ 2.20GHz
+physical id\t: {socket}
+core id\t\t: {core}
+cpu cores\t: 2
+"""
+
+
+class TestInventory(unittest.TestCase):
+  """Tests for get_inventory and collect."""
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.root)
+    self.proc_dir = os.path.join(self.root, 'proc')
+    self.sys_dir = os.path.join(self.root, 'sys')
+    self.cache_dir = os.path.join(self.root, 'cache')
+    # 2 sockets with 2 cores and 2 threads each. cpu n and n + 4 are siblings.
+    cpuinfo = []
+    for cpu in range(8):
+      cpuinfo.append(
+          CPUINFO.format(cpu=cpu, socket=(cpu % 4) // 2, core=cpu % 2))
+    self._write('proc/cpuinfo', '\n'.join(cpuinfo))
+    self._write('proc/meminfo', 'MemTotal:  528280464 kB\nMemFree: 1 kB\n')
+    self._write('proc/sys/kernel/random/boot_id', 'boot-1\n')
+    self._write('sys/devices/system/node/node0/cpulist', '0-1,4-5\n')
+    self._write('sys/devices/system/node/node1/cpulist', '2-3,6-7\n')
+    cache_dir = 'sys/devices/system/cpu/cpu0/cache/'
+    for index, (level, cache_type, size) in enumerate(
+        [('1', 'Data', '32K'), ('1', 'Instruction', '32K'),
+         ('2', 'Unified', '256K'), ('3', 'Unified', '51200K')]):
+      self._write(cache_dir + 'index{}/level'.format(index), level)
+      self._write(cache_dir + 'index{}/type'.format(index), cache_type)
+      self._write(cache_dir + 'index{}/size'.format(index), size)
+    self._write('sys/devices/system/cpu/cpu0/cpufreq/scaling_governor',
+                'performance\n')
+    self._write(
+        'proc/driver/nvidia/version',
+        'NVRM version: NVIDIA UNIX x86_64 Kernel Module  396.26  Mon Apr 30\n')
+    for bus_id, numa_node in [('0000:06:00.0', '0'), ('0000:85:00.0', '1')]:
+      self._write('proc/driver/nvidia/gpus/{}/information'.format(bus_id),
+                  'Model: \t\t Tesla V100-SXM2-16GB\nIRQ:   40\n')
+      self._write('sys/bus/pci/devices/{}/numa_node'.format(bus_id),
+                  numa_node)
+
+  def _write(self, path, data):
+    path = os.path.join(self.root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+      f.write(data)
+
+  def test_collect(self):
+    """Tests topology, memory and GPUs are read from /proc and /sys."""
+    system = inventory.collect(proc_dir=self.proc_dir, sys_dir=self.sys_dir)
+    cpu = system['cpu']
+    self.assertEqual('Intel(R) Xeon(R) CPU E5-2698 v4 @ 2.20GHz',
+                     cpu['model_name'])
+    self.assertEqual(2, cpu['sockets'])
+    self.assertEqual(4, cpu['cores'])
+    self.assertEqual(8, cpu['threads'])
+    self.assertEqual(2, cpu['threads_per_core'])
+    self.assertEqual('51200K', cpu['caches']['L3'])
+    self.assertEqual('32K', cpu['caches']['L1d'])
+    self.assertEqual('performance', cpu['governor'])
+    self.assertEqual([0, 1, 4, 5], system['numa_nodes'][0]['cpus'])
+    self.assertEqual({'cpu': 6, 'socket': 1, 'core': 0, 'node': 1},
+                     system['cpus'][6])
+    self.assertEqual(528280464 * 1024, system['memory_total'])
+    self.assertEqual('396.26', system['gpu_driver'])
+    self.assertEqual(2, len(system['gpus']))
+    self.assertEqual({
+        'index': 1,
+        'name': 'Tesla V100-SXM2-16GB',
+        'bus_id': '0000:85:00.0',
+        'numa_node': 1
+    }, system['gpus'][1])
+
+  @patch('tools.local_command.run_local_command')
+  def test_collect_nvidia_smi(self, run_local_command_mock):
+    """Tests one nvidia-smi query is used without /proc/driver/nvidia."""
+    shutil.rmtree(os.path.join(self.proc_dir, 'driver'))
+    run_local_command_mock.return_value = [
+        0, '0, 396.26, Tesla V100-SXM2-16GB, 00000000:06:00.0\n'
+    ]
+    system = inventory.collect(proc_dir=self.proc_dir, sys_dir=self.sys_dir)
+    self.assertEqual(1, run_local_command_mock.call_count)
+    self.assertEqual('396.26', system['gpu_driver'])
+    self.assertEqual('0000:06:00.0', system['gpus'][0]['bus_id'])
+    self.assertEqual(0, system['gpus'][0]['numa_node'])
+
+  def test_get_inventory_cache(self):
+    """Tests the cache is used until the boot id changes."""
+    system = inventory.get_inventory(
+        cache_dir=self.cache_dir, proc_dir=self.proc_dir, sys_dir=self.sys_dir)
+    self.assertEqual('boot-1', system['boot_id'])
+    with patch('tools.inventory.collect') as collect_mock:
+      cached = inventory.get_inventory(
+          cache_dir=self.cache_dir,
+          proc_dir=self.proc_dir,
+          sys_dir=self.sys_dir)
+      collect_mock.assert_not_called()
+    self.assertEqual(system, cached)
+
+    self._write('proc/sys/kernel/random/boot_id', 'boot-2\n')
+    system = inventory.get_inventory(
+        cache_dir=self.cache_dir, proc_dir=self.proc_dir, sys_dir=self.sys_dir)
+    self.assertEqual('boot-2', system['boot_id'])
+
+  def test_parse_cpu_list(self):
+    self.assertEqual([0, 1, 2, 8], inventory.parse_cpu_list('0-2,8\n'))
+    self.assertEqual([], inventory.parse_cpu_list(''))
@@ -1,22 +1,226 @@
 """Run command locally."""
+from __future__ import print_function
+import codecs
+import errno
+import fcntl
+import os
+import resource
+import select
+import signal
 import subprocess
+import time
+
+import tools.proc_stats as proc_stats
+
+# Max bytes taken from a pipe with each read.
+READ_SIZE = 64 * 1024
+# Longest partial line held before it is handed out without its newline.
+MAX_LINE_SIZE = 1024 * 1024
+# How long the pump sleeps in poll() when the command is quiet.
+POLL_TIMEOUT_MS = 1000
+
+
+class LocalCommand(object):
+  """Runs a shell command and pumps its output without busy waiting.
+
+  stdout and stderr are separate non-blocking pipes multiplexed with
+  `select.poll`, so the harness only wakes up when the command has written
+  something.  Output is read in chunks of up to `read_size` bytes and split
+  into lines a chunk at a time, which keeps a chatty benchmark from pinning a
+  harness core on the box being measured.
+
+  Example:
+    command = LocalCommand('ls -l')
+    for lines in command.lines():
+      print('\n'.join(lines))
+    print(command.returncode, command.harness_cpu_time)
+
+  Args:
+    cmd (str): Command to run in a shell.
+    new_session (bool): Run the command in its own process group so `kill`
+      reaches every process it starts.
+    read_size (int): Max bytes read from a pipe at a time.
+    max_line_size (int): Max characters buffered for a line that has not seen
+      a newline yet. Longer lines are split.
+    sample_interval (float): Seconds between /proc samples of the process
+      group when `new_session` is set.
+  """
+
+  def __init__(self,
+               cmd,
+               new_session=False,
+               read_size=READ_SIZE,
+               max_line_size=MAX_LINE_SIZE,
+               sample_interval=proc_stats.SAMPLE_INTERVAL):
+    self.cmd = cmd
+    self.new_session = new_session
+    self.read_size = read_size
+    self.max_line_size = max_line_size
+    self.sample_interval = sample_interval
+    self.returncode = None
+    # `proc_stats.ProcessGroupSampler.usage` of the command once it exits.
+    self.resource_usage = None
+    self.sampler = None
+    # CPU seconds the calling thread spent pumping and consuming output.
+    self.harness_cpu_time = 0.0
+    self.process = None
+
+  @property
+  def pid(self):
+    return self.process.pid if self.process else None
+
+  def start(self):
+    """Starts the command if it is not already running."""
+    if self.process is None:
+      self.process = subprocess.Popen(
+          self.cmd,
+          stdout=subprocess.PIPE,
+          stderr=subprocess.PIPE,
+          shell=True,
+          preexec_fn=os.setsid if self.new_session else None)
+      self.sampler = proc_stats.ProcessGroupSampler(
+          self.process.pid, interval=self.sample_interval)
+      # Without a new session the group is the harness's own.
+      if self.new_session:
+        self.sampler.start()
+    return self.process
+
+  def kill(self, sig=signal.SIGTERM):
+    """Sends `sig` to the command, or its process group if it has one."""
+    if self.process is None or self.process.returncode is not None:
+      return
+    try:
+      if self.new_session:
+        os.killpg(os.getpgid(self.process.pid), sig)
+      else:
+        self.process.send_signal(sig)
+    except OSError as e:
+      # The process exited between the check and the signal.
+      if e.errno != errno.ESRCH:
+        raise
+
+  def lines(self):
+    """Yields lists of lines, without newlines, as the command writes them.
+
+    Each list holds every complete line from one read. Blank lines are kept.
+    The command is started if needed and waited on once both pipes close.
+    """
+    process = self.start()
+    cpu_start = _thread_cpu_time()
+    poller = select.poll()
+    buffers = {}
+    for pipe in (process.stdout, process.stderr):
+      fd = pipe.fileno()
+      _set_nonblocking(fd)
+      poller.register(fd, select.POLLIN | select.POLLPRI)
+      buffers[fd] = _LineBuffer(self.max_line_size)
+    try:
+      while buffers:
+        for fd, _ in _poll(poller, POLL_TIMEOUT_MS):
+          data = _read(fd, self.read_size)
+          if data is None:
+            continue
+          if data:
+            lines = buffers[fd].feed(data)
+          else:
+            poller.unregister(fd)
+            lines = buffers.pop(fd).close()
+          if lines:
+            yield lines
+    finally:
+      process.stdout.close()
+      process.stderr.close()
+      self.returncode, rusage = _wait(process)
+      self.sampler.stop()
+      self.resource_usage = self.sampler.usage(rusage)
+      self.harness_cpu_time += _thread_cpu_time() - cpu_start
+
+
+class _LineBuffer(object):
+  """Turns chunks of bytes from one pipe into complete lines of text."""
+
+  def __init__(self, max_line_size):
+    self.max_line_size = max_line_size
+    self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    self.partial = ''
+
+  def feed(self, data):
+    lines = (self.partial + self.decoder.decode(data)).split('\n')
+    self.partial = lines.pop()
+    while len(self.partial) > self.max_line_size:
+      lines.append(self.partial[:self.max_line_size])
+      self.partial = self.partial[self.max_line_size:]
+    return lines
+
+  def close(self):
+    last = self.partial + self.decoder.decode(b'', final=True)
+    self.partial = ''
+    return [last] if last else []
+
+
+def _set_nonblocking(fd):
+  flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+  fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+def _poll(poller, timeout_ms):
+  """poll() that treats an interrupted system call as a timeout."""
+  try:
+    return poller.poll(timeout_ms)
+  except (IOError, OSError, select.error) as e:
+    if e.args and e.args[0] == errno.EINTR:
+      return []
+    raise
+
+
+def _read(fd, size):
+  """Returns bytes read, b'' at EOF, or None if nothing is available."""
+  try:
+    return os.read(fd, size)
+  except (IOError, OSError) as e:
+    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+      return None
+    raise
+
+
+def _wait(process):
+  """Waits for `process` and returns its return code and rusage.
+
+  The rusage includes every descendant the process waited on.
+  """
+  while True:
+    try:
+      _, status, rusage = os.wait4(process.pid, 0)
+      break
+    except OSError as e:
+      if e.errno != errno.EINTR:
+        raise
+  if os.WIFSIGNALED(status):
+    process.returncode = -os.WTERMSIG(status)
+  else:
+    process.returncode = os.WEXITSTATUS(status)
+  return process.returncode, rusage
+
+
+def _thread_cpu_time():
+  """Returns CPU seconds used by this thread, or the process if unsupported."""
+  if hasattr(time, 'thread_time'):
+    return time.thread_time()
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return usage.ru_utime + usage.ru_stime
 
 
 def run_local_command(cmd):
-  """Structures for a variety of different test results.
+  """Runs a command and collects its output.
 
   Args:
     cmd: Command to execute
   Returns:
     Tuple of the command return value and the standard out in as a string.
   """
-  p = subprocess.Popen(
-      cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-  stdout = ''
-  while True:
-    retcode = p.poll()
-    tmp_stdout = p.stdout.readline()
-    out_str = tmp_stdout.decode('utf-8')
-    stdout += out_str
-    if retcode is not None:
-      return retcode, stdout
+  command = LocalCommand(cmd)
+  stdout = []
+  for lines in command.lines():
+    stdout.extend(lines)
+  stdout = '\n'.join(stdout) + '\n' if stdout else ''
+  return command.returncode, stdout
@@ -0,0 +1,61 @@
+"""Tests local_command module."""
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+import tools.local_command as local_command
+
+
+class TestLocalCommand(unittest.TestCase):
+  """Tests for LocalCommand and run_local_command."""
+
+  def test_run_local_command(self):
+    """Tests return code and output are collected."""
+    retcode, stdout = local_command.run_local_command(
+        'echo foo; echo; echo bar')
+    self.assertEqual(0, retcode)
+    self.assertEqual('foo\n\nbar\n', stdout)
+
+  def test_run_local_command_error(self):
+    """Tests non-zero return code and stderr are returned."""
+    retcode, stdout = local_command.run_local_command('echo oops >&2; exit 3')
+    self.assertEqual(3, retcode)
+    self.assertEqual('oops\n', stdout)
+
+  def test_lines_chunked(self):
+    """Tests many lines arrive in a few chunks rather than one at a time."""
+    command = local_command.LocalCommand('seq 1 5000')
+    chunks = list(command.lines())
+    lines = [line for chunk in chunks for line in chunk]
+    self.assertEqual([str(i) for i in range(1, 5001)], lines)
+    self.assertLess(len(chunks), 100)
+    self.assertEqual(0, command.returncode)
+    self.assertGreaterEqual(command.harness_cpu_time, 0)
+
+  def test_lines_no_trailing_newline(self):
+    """Tests last line without a newline is returned at EOF."""
+    command = local_command.LocalCommand('printf "a\\nb"')
+    lines = [line for chunk in command.lines() for line in chunk]
+    self.assertEqual(['a', 'b'], lines)
+
+  def test_lines_bounded(self):
+    """Tests a partial line longer than max_line_size is split."""
+    command = local_command.LocalCommand(
+        'printf "%050d" 0', max_line_size=20)
+    lines = [line for chunk in command.lines() for line in chunk]
+    self.assertEqual([20, 20, 10], [len(line) for line in lines])
+
+  def test_kill(self):
+    """Tests kill stops the whole process group."""
+    command = local_command.LocalCommand(
+        'echo started; sleep 30; echo never', new_session=True)
+    start = time.time()
+    lines = []
+    for chunk in command.lines():
+      lines.extend(chunk)
+      threading.Timer(0.1, command.kill).start()
+    self.assertEqual(['started'], lines)
+    self.assertNotEqual(0, command.returncode)
+    self.assertLess(time.time() - start, 10)
@@ -1,42 +1,42 @@
 """Extract information about the system GPU."""
 from __future__ import print_function
 import re
+import tools.inventory as inventory
 import tools.local_command as local_command
 
 
-def get_gpu_info():
-  """Returns driver and gpu info using nvidia-smi.
+def get_gpu_info(cache_dir=inventory.DEFAULT_CACHE_DIR):
+  """Returns driver and gpu info from the system inventory.
 
   Note: Assumes if the system has multiple GPUs that they are all the same with
   one exception.  If the first result is a Quadro, the heuristic assumes
   this may be a workstation and takes the second entry.
 
+  Args:
+    cache_dir: Folder holding the inventory cache, see `inventory`.
+
   Returns:
     Tuple of device driver version and gpu name.
   """
-  cmd = 'nvidia-smi --query-gpu=driver_version,gpu_name --format=csv'
-  retcode, result = local_command.run_local_command(cmd)
-  lines = result.splitlines()
-  if retcode == 0 and len(lines) > 1:
-    gpu_info = lines[1].split(',')
-    if 'Quadro' in gpu_info[1] and len(lines) > 2:
-      gpu_info = lines[2].split(',')
-      return gpu_info[0].strip(), gpu_info[1].strip()
-    else:
-      return gpu_info[0].strip(), gpu_info[1].strip()
+  system = inventory.get_inventory(cache_dir=cache_dir)
+  gpus = system['gpus']
+  if gpus:
+    gpu = gpus[0]
+    if 'Quadro' in gpu['name'] and len(gpus) > 1:
+      gpu = gpus[1]
+    return system['gpu_driver'], gpu['name']
   else:
-    print('nvidia-smi did not return as expected:{}'.format(result))
+    print('No NVIDIA GPUs found.')
     return '', ''
 
 
-def get_gpu_count():
-  cmd = 'nvidia-smi --query-gpu=driver_version,gpu_name --format=csv'
-  retcode, result = local_command.run_local_command(cmd)
-  lines = result.splitlines()
-  if retcode == 0 and len(lines) > 1:
-    return len(lines) - 1
+def get_gpu_count(cache_dir=inventory.DEFAULT_CACHE_DIR):
+  """Returns number of GPUs or -1 if there is no NVIDIA driver."""
+  system = inventory.get_inventory(cache_dir=cache_dir)
+  if system['gpu_driver']:
+    return len(system['gpus'])
   else:
-    print('nvidia-smi did not return as expected:{}'.format(result))
+    print('No NVIDIA driver found.')
     return -1
 
 
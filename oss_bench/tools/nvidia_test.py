@@ -7,32 +7,35 @@ import tools.nvidia as nvidia
 
 class TestNvidiaTools(unittest.TestCase):
 
-  @patch('tools.local_command.run_local_command')
-  def test_get_gpu_info(self, run_local_command_mock):
-    """Tests get gpu info parses expected value into expected components."""
-    run_local_command_mock.return_value = [0, 'blah blah\n381.99, GTX 1080 \n']
+  @patch('tools.inventory.get_inventory')
+  def test_get_gpu_info(self, get_inventory_mock):
+    """Tests get gpu info returns driver and name from the inventory."""
+    get_inventory_mock.return_value = self._inventory(['GTX 1080'])
     driver, gpu_info = nvidia.get_gpu_info()
     self.assertEqual('381.99', driver)
     self.assertEqual('GTX 1080', gpu_info)
 
-  @patch('tools.local_command.run_local_command')
-  def test_get_gpu_info_quadro(self, run_local_command_mock):
+  @patch('tools.inventory.get_inventory')
+  def test_get_gpu_info_quadro(self, get_inventory_mock):
     """Tests gpu info returns second entry if first entry is a Quadro."""
-    run_local_command_mock.return_value = [
-        0, 'blah\n200.99, Quadro K900 \n381.99, GTX 1080\n'
-    ]
+    get_inventory_mock.return_value = self._inventory(
+        ['Quadro K900', 'GTX 1080'])
     driver, gpu_info = nvidia.get_gpu_info()
     self.assertEqual('381.99', driver)
     self.assertEqual('GTX 1080', gpu_info)
 
-  @patch('tools.local_command.run_local_command')
-  def test_get_gpu_count(self, run_local_command_mock):
-    """Tests gpu info returns second entry if first entry is a Quadro."""
-    run_local_command_mock.return_value = [
-        0, 'blah\n200.99, Quadro K900 \n381.99, GTX 1080\n'
-    ]
-    gpu_count = nvidia.get_gpu_count()
-    self.assertEqual(2, gpu_count)
+  @patch('tools.inventory.get_inventory')
+  def test_get_gpu_count(self, get_inventory_mock):
+    """Tests gpu count is the number of GPUs in the inventory."""
+    get_inventory_mock.return_value = self._inventory(
+        ['Quadro K900', 'GTX 1080'])
+    self.assertEqual(2, nvidia.get_gpu_count())
+
+  @patch('tools.inventory.get_inventory')
+  def test_get_gpu_count_no_driver(self, get_inventory_mock):
+    """Tests gpu count is -1 without an NVIDIA driver."""
+    get_inventory_mock.return_value = {'gpu_driver': '', 'gpus': []}
+    self.assertEqual(-1, nvidia.get_gpu_count())
 
   @patch('tools.local_command.run_local_command')
   def test_is_ok_to_run_false(self, run_local_command_mock):
@@ -51,3 +54,13 @@ class TestNvidiaTools(unittest.TestCase):
       run_local_command_mock.return_value = [0, f.read()]
     ok_to_run = nvidia.is_ok_to_run()
     self.assertTrue(ok_to_run)
+
+  def _inventory(self, names):
+    gpus = []
+    for index, name in enumerate(names):
+      gpus.append({
+          'index': index,
+          'name': name,
+          'bus_id': '0000:0{}:00.0'.format(index)
+      })
+    return {'gpu_driver': '381.99', 'gpus': gpus}
@@ -0,0 +1,209 @@
+"""Resource usage of a benchmark's process tree from rusage and /proc."""
+from __future__ import print_function
+import glob
+import os
+import threading
+
+# Seconds between samples of the process group.
+SAMPLE_INTERVAL = 1.0
+PROC_DIR = '/proc'
+
+# Units of each value returned by `ProcessGroupSampler.usage`.
+RESOURCE_UNITS = [
+    ('cpu_user_time', 'ms'),
+    ('cpu_sys_time', 'ms'),
+    ('peak_rss', 'bytes'),
+    ('voluntary_ctx_switches', 'count'),
+    ('involuntary_ctx_switches', 'count'),
+    ('read_bytes', 'bytes'),
+    ('write_bytes', 'bytes'),
+]
+
+
+class ProcessGroupSampler(object):
+  """Samples /proc/<pid>/stat, status and io for every process in a group.
+
+  rusage from wait4 only covers processes the shell waited on. Processes
+  killed along with the shell are reaped by init and their usage is lost,
+  and rusage has no byte counts for I/O. The sampler keeps the last values
+  seen for each process so those are still accounted for.
+
+  Processes are found by walking /proc/<pid>/task/*/children down from the
+  group leader, so each sample only reads the group's own processes.
+  Processes seen before are sampled again even once reparented. Kernels
+  without the children files, or a group whose leader exited, fall back to
+  scanning every process in /proc.
+
+  Example:
+    sampler = ProcessGroupSampler(pid)
+    sampler.start()
+    ...
+    sampler.stop()
+    print(sampler.usage(rusage))
+
+  Args:
+    pgid (int): Process group to sample.
+    interval (float): Seconds between samples.
+    proc_dir (str): Mount point of procfs.
+  """
+
+  def __init__(self, pgid, interval=SAMPLE_INTERVAL, proc_dir=PROC_DIR):
+    self.pgid = pgid
+    self.interval = interval
+    self.proc_dir = proc_dir
+    self.clock_ticks = float(os.sysconf('SC_CLK_TCK'))
+    # Last sample for each pid in the group.
+    self.processes = {}
+    self._stop = threading.Event()
+    self._thread = None
+
+  def start(self):
+    """Samples the group in a daemon thread until `stop` is called."""
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self):
+    self._stop.set()
+    if self._thread:
+      self._thread.join()
+      self._thread = None
+
+  def _run(self):
+    while not self._stop.is_set():
+      self.sample()
+      self._stop.wait(self.interval)
+
+  def sample(self):
+    """Reads the counters of each process currently in the group."""
+    for pid in sorted(self._group_pids()):
+      stats = {}
+      try:
+        stats.update(self._read_stat(pid))
+        if stats['pgrp'] != self.pgid:
+          continue
+        stats.update(self._read_status(pid))
+        stats.update(self._read_io(pid))
+      except (IOError, OSError, IndexError, ValueError):
+        # The process exited mid sample or io is not readable. Keep what was
+        # read from a process in the group.
+        if stats.get('pgrp') != self.pgid:
+          continue
+      self.processes.setdefault(pid, {}).update(stats)
+
+  def _group_pids(self):
+    """Returns pids that may be in the group, see the class docstring."""
+    tree = set()
+    pending = [self.pgid]
+    while pending:
+      pid = pending.pop()
+      if pid in tree:
+        continue
+      tree.add(pid)
+      children = self._read_children(pid)
+      if children is None:
+        if pid == self.pgid:
+          return self._all_pids() | set(self.processes)
+        continue
+      pending.extend(children)
+    return tree | set(self.processes)
+
+  def _read_children(self, pid):
+    """Returns child pids of `pid`, None if it has no children files."""
+    paths = glob.glob(
+        os.path.join(self.proc_dir, str(pid), 'task', '*', 'children'))
+    if not paths:
+      return None
+    children = []
+    for path in paths:
+      try:
+        with open(path) as f:
+          children.extend(int(child) for child in f.read().split())
+      except (IOError, OSError):
+        # The thread exited since it was listed.
+        pass
+    return children
+
+  def _all_pids(self):
+    return set(
+        int(name) for name in os.listdir(self.proc_dir) if name.isdigit())
+
+  def usage(self, rusage=None):
+    """Returns dict of resource usage for the group.
+
+    Counters are the larger of the sum of the last /proc sample of each
+    process and `rusage`, see `RESOURCE_UNITS` for keys and units.
+
+    Args:
+      rusage: `resource.struct_rusage` from waiting on the group leader.
+    """
+    usage = dict((key, 0) for key, _ in RESOURCE_UNITS)
+    for stats in self.processes.values():
+      usage['cpu_user_time'] += stats.get('utime', 0) / self.clock_ticks
+      usage['cpu_sys_time'] += stats.get('stime', 0) / self.clock_ticks
+      usage['peak_rss'] = max(usage['peak_rss'], stats.get('VmHWM', 0))
+      usage['voluntary_ctx_switches'] += stats.get('voluntary_ctxt_switches',
+                                                   0)
+      usage['involuntary_ctx_switches'] += stats.get(
+          'nonvoluntary_ctxt_switches', 0)
+      usage['read_bytes'] += stats.get('read_bytes', 0)
+      usage['write_bytes'] += stats.get('write_bytes', 0)
+    if rusage:
+      usage['cpu_user_time'] = max(usage['cpu_user_time'], rusage.ru_utime)
+      usage['cpu_sys_time'] = max(usage['cpu_sys_time'], rusage.ru_stime)
+      # ru_maxrss is in kilobytes on Linux.
+      usage['peak_rss'] = max(usage['peak_rss'], rusage.ru_maxrss * 1024)
+      usage['voluntary_ctx_switches'] = max(usage['voluntary_ctx_switches'],
+                                            rusage.ru_nvcsw)
+      usage['involuntary_ctx_switches'] = max(
+          usage['involuntary_ctx_switches'], rusage.ru_nivcsw)
+    usage['cpu_user_time'] = int(round(usage['cpu_user_time'] * 1000))
+    usage['cpu_sys_time'] = int(round(usage['cpu_sys_time'] * 1000))
+    return usage
+
+  def _read_stat(self, pid):
+    with open(os.path.join(self.proc_dir, str(pid), 'stat')) as f:
+      data = f.read()
+    # The command name may contain spaces, fields start after the last ')'.
+    fields = data[data.rindex(')') + 2:].split()
+    return {
+        'pgrp': int(fields[2]),
+        'utime': int(fields[11]),
+        'stime': int(fields[12])
+    }
+
+  def _read_status(self, pid):
+    stats = {}
+    with open(os.path.join(self.proc_dir, str(pid), 'status')) as f:
+      for line in f:
+        key, _, value = line.partition(':')
+        if key == 'VmHWM':
+          stats[key] = int(value.split()[0]) * 1024
+        elif key in ('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches'):
+          stats[key] = int(value)
+    return stats
+
+  def _read_io(self, pid):
+    stats = {}
+    with open(os.path.join(self.proc_dir, str(pid), 'io')) as f:
+      for line in f:
+        key, _, value = line.partition(':')
+        if key in ('read_bytes', 'write_bytes'):
+          stats[key] = int(value)
+    return stats
+
+
+def add_usage(usage, other):
+  """Returns usage of two runs one after the other, e.g. worker and eval."""
+  if not usage:
+    return other
+  if not other:
+    return usage
+  total = {}
+  for key, _ in RESOURCE_UNITS:
+    if key == 'peak_rss':
+      total[key] = max(usage.get(key, 0), other.get(key, 0))
+    else:
+      total[key] = usage.get(key, 0) + other.get(key, 0)
+  return total
@@ -0,0 +1,117 @@
+"""Tests proc_stats module."""
+from __future__ import print_function
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import tools.local_command as local_command
+import tools.proc_stats as proc_stats
+
+Rusage = collections.namedtuple(
+    'Rusage', ['ru_utime', 'ru_stime', 'ru_maxrss', 'ru_nvcsw', 'ru_nivcsw'])
+
+
+class TestProcStats(unittest.TestCase):
+  """Tests for ProcessGroupSampler."""
+
+  def setUp(self):
+    self.proc_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.proc_dir)
+
+  def _write_process(self, pid, pgrp, utime, stime, hwm_kb, io=True,
+                     children=None):
+    """Writes a fake /proc/<pid> with the fields the sampler reads."""
+    pid_dir = os.path.join(self.proc_dir, str(pid))
+    if not os.path.isdir(pid_dir):
+      os.makedirs(pid_dir)
+    if children is not None:
+      self._write_children(pid, children)
+    stat = [str(pid), '(python worker)', 'S', '1', str(pgrp)]
+    stat += ['0'] * 8 + [str(utime), str(stime)] + ['0'] * 10
+    with open(os.path.join(pid_dir, 'stat'), 'w') as f:
+      f.write(' '.join(stat) + '\n')
+    with open(os.path.join(pid_dir, 'status'), 'w') as f:
+      f.write('Name:\tpython\nVmHWM:\t{} kB\nvoluntary_ctxt_switches:\t10\n'
+              'nonvoluntary_ctxt_switches:\t2\n'.format(hwm_kb))
+    if io:
+      with open(os.path.join(pid_dir, 'io'), 'w') as f:
+        f.write('rchar: 1\nread_bytes: 4096\nwrite_bytes: 512\n')
+
+  def test_sample_group(self):
+    """Tests only processes in the group are summed."""
+    ticks = os.sysconf('SC_CLK_TCK')
+    self._write_process(100, 100, ticks, ticks * 2, 1000)
+    self._write_process(101, 100, ticks, 0, 3000, io=False)
+    self._write_process(200, 200, ticks * 50, 0, 9000)
+    sampler = proc_stats.ProcessGroupSampler(100, proc_dir=self.proc_dir)
+    sampler.sample()
+    usage = sampler.usage()
+    self.assertEqual(2000, usage['cpu_user_time'])
+    self.assertEqual(2000, usage['cpu_sys_time'])
+    self.assertEqual(3000 * 1024, usage['peak_rss'])
+    self.assertEqual(20, usage['voluntary_ctx_switches'])
+    self.assertEqual(4, usage['involuntary_ctx_switches'])
+    self.assertEqual(4096, usage['read_bytes'])
+    self.assertEqual(512, usage['write_bytes'])
+
+  def _write_children(self, pid, children):
+    task_dir = os.path.join(self.proc_dir, str(pid), 'task', str(pid))
+    if not os.path.isdir(task_dir):
+      os.makedirs(task_dir)
+    with open(os.path.join(task_dir, 'children'), 'w') as f:
+      f.write(''.join('{} '.format(child) for child in children))
+
+  def test_sample_tree(self):
+    """Tests only descendants of the leader are read when /proc lists them."""
+    ticks = os.sysconf('SC_CLK_TCK')
+    self._write_process(100, 100, ticks, 0, 1000, children=[101])
+    self._write_process(101, 100, ticks, 0, 1000, children=[102])
+    self._write_process(102, 100, ticks, 0, 1000, children=[])
+    # In the group but not under the leader, so not found by the walk.
+    self._write_process(103, 100, ticks, 0, 1000, children=[])
+    sampler = proc_stats.ProcessGroupSampler(100, proc_dir=self.proc_dir)
+    sampler.sample()
+    self.assertEqual([100, 101, 102], sorted(sampler.processes))
+
+    # 102 is sampled again after its parent exits and it is reparented.
+    shutil.rmtree(os.path.join(self.proc_dir, '101'))
+    self._write_children(100, [])
+    self._write_process(102, 100, ticks * 3, 0, 1000)
+    sampler.sample()
+    self.assertEqual(5000, sampler.usage()['cpu_user_time'])
+
+  def test_usage_rusage(self):
+    """Tests rusage is used where it is larger than the samples."""
+    sampler = proc_stats.ProcessGroupSampler(100, proc_dir=self.proc_dir)
+    usage = sampler.usage(Rusage(1.5, 0.25, 2048, 7, 3))
+    self.assertEqual(1500, usage['cpu_user_time'])
+    self.assertEqual(250, usage['cpu_sys_time'])
+    self.assertEqual(2048 * 1024, usage['peak_rss'])
+    self.assertEqual(7, usage['voluntary_ctx_switches'])
+    self.assertEqual(3, usage['involuntary_ctx_switches'])
+    self.assertEqual(0, usage['read_bytes'])
+
+  def test_add_usage(self):
+    """Tests counters are summed and peak rss is the max."""
+    usage = proc_stats.add_usage({'cpu_user_time': 5, 'peak_rss': 10},
+                                 {'cpu_user_time': 7, 'peak_rss': 4})
+    self.assertEqual(12, usage['cpu_user_time'])
+    self.assertEqual(10, usage['peak_rss'])
+    self.assertEqual({'a': 1}, proc_stats.add_usage(None, {'a': 1}))
+
+  def test_local_command_usage(self):
+    """Tests a real command's process group is accounted for."""
+    command = local_command.LocalCommand(
+        'python -c "x = sum(range(3000000)); print(x)"',
+        new_session=True,
+        sample_interval=0.01)
+    for _ in command.lines():
+      pass
+    usage = command.resource_usage
+    self.assertGreater(usage['cpu_user_time'] + usage['cpu_sys_time'], 0)
+    self.assertGreater(usage['peak_rss'], 0)
+    self.assertGreater(
+        usage['voluntary_ctx_switches'] + usage['involuntary_ctx_switches'], 0)
@@ -0,0 +1,193 @@
+"""Waits for the GPUs and CPUs of the host to be idle before a run.
+
+Each sample reads GPU utilization and memory and the compute processes on
+the GPUs from `nvidia-smi`, and host CPU load from /proc/stat. A sample is
+busy if any GPU is above `GPU_UTIL_THRESHOLD` or `MEMORY_THRESHOLD`, any
+compute process holds a GPU, or the CPUs are above `CPU_LOAD_THRESHOLD`. The
+host is idle once samples have been idle for a whole window, so a quiet host
+is declared idle after one window rather than a fixed wait.
+
+The contention score of a sample is the largest of GPU utilization, GPU
+memory used and CPU load as fractions, or 1 if a compute process holds a
+GPU. The score of a wait is the mean over its samples, 0 for an idle host.
+
+`nvidia_smi` is the command run for samples, which tests replace with a
+fake, see tools/test_files/fake_nvidia_smi.py.
+
+Example:
+  detector = QuiescenceDetector(window=30, timeout=300)
+  if not detector.wait():
+    print('Host busy, contention {:.2f}'.format(detector.contention))
+"""
+from __future__ import print_function
+import os
+import time
+
+import tools.local_command as local_command
+
+NVIDIA_SMI = 'nvidia-smi'
+PROC_DIR = '/proc'
+# Seconds samples must stay idle.
+WINDOW = 30
+# Seconds to wait for the host to become idle.
+TIMEOUT = 300
+# Seconds between samples.
+INTERVAL = 1.0
+# Busy thresholds, GPU utilization in percent and the rest as fractions.
+GPU_UTIL_THRESHOLD = 5
+MEMORY_THRESHOLD = 0.05
+CPU_LOAD_THRESHOLD = 0.2
+
+
+def _query(nvidia_smi, query):
+  """Returns rows of an `nvidia-smi` csv query or None if it fails."""
+  cmd = '{} --query-{} --format=csv,noheader,nounits'.format(nvidia_smi, query)
+  retcode, result = local_command.run_local_command(cmd)
+  if retcode != 0:
+    return None
+  return [[part.strip() for part in line.split(',')]
+          for line in result.splitlines() if line.strip()]
+
+
+def _float(text):
+  """Returns float of `text`, 0 for values such as [Not Supported]."""
+  try:
+    return float(text)
+  except ValueError:
+    return 0.0
+
+
+def sample_gpus(nvidia_smi=NVIDIA_SMI):
+  """Returns list of dicts with index, util and memory of each GPU or None.
+
+  util is in percent and memory is the fraction of memory used.
+  """
+  rows = _query(nvidia_smi,
+                'gpu=index,utilization.gpu,memory.used,memory.total')
+  if rows is None:
+    return None
+  gpus = []
+  for row in rows:
+    if len(row) != 4:
+      continue
+    total = _float(row[3])
+    gpus.append({
+        'index': row[0],
+        'util': _float(row[1]),
+        'memory': _float(row[2]) / total if total else 0.0
+    })
+  return gpus
+
+
+def sample_processes(nvidia_smi=NVIDIA_SMI):
+  """Returns list of dicts with pid and name of GPU compute processes."""
+  rows = _query(nvidia_smi, 'compute-apps=pid,process_name')
+  if rows is None:
+    return []
+  return [{'pid': row[0], 'name': row[1]} for row in rows if len(row) == 2]
+
+
+def cpu_times(proc_dir=PROC_DIR):
+  """Returns tuple of busy and total jiffies of all CPUs or None."""
+  try:
+    with open(os.path.join(proc_dir, 'stat')) as f:
+      values = [int(value) for value in f.readline().split()[1:]]
+  except (IOError, OSError, ValueError):
+    return None
+  # idle and iowait.
+  idle = sum(values[3:5])
+  return sum(values) - idle, sum(values)
+
+
+def cpu_load(last_times, times):
+  """Returns fraction of CPU time busy between two `cpu_times`."""
+  if not last_times or not times or times[1] <= last_times[1]:
+    return 0.0
+  return float(times[0] - last_times[0]) / (times[1] - last_times[1])
+
+
+class QuiescenceDetector(object):
+  """Samples the host until it has been idle for a window.
+
+  Args:
+    window (float): Seconds samples must stay idle.
+    timeout (float): Seconds to wait before giving up.
+    interval (float): Seconds between samples.
+    nvidia_smi (str): Command run for GPU samples.
+    proc_dir (str): Mount point of procfs.
+  """
+
+  def __init__(self,
+               window=WINDOW,
+               timeout=TIMEOUT,
+               interval=INTERVAL,
+               nvidia_smi=NVIDIA_SMI,
+               proc_dir=PROC_DIR):
+    self.window = window
+    self.timeout = timeout
+    self.interval = interval
+    self.nvidia_smi = nvidia_smi
+    self.proc_dir = proc_dir
+    self.samples = []
+    self._cpu_times = None
+
+  def sample(self):
+    """Returns dict with the values, busy and contention of a sample."""
+    gpus = sample_gpus(self.nvidia_smi) or []
+    processes = sample_processes(self.nvidia_smi)
+    times = cpu_times(self.proc_dir)
+    load = cpu_load(self._cpu_times, times)
+    self._cpu_times = times
+    gpu_util = max([gpu['util'] for gpu in gpus] or [0.0])
+    memory = max([gpu['memory'] for gpu in gpus] or [0.0])
+    sample = {
+        'gpu_util': gpu_util,
+        'gpu_memory': memory,
+        'processes': processes,
+        'cpu_load': load,
+        'busy': bool(gpu_util > GPU_UTIL_THRESHOLD or
+                     memory > MEMORY_THRESHOLD or processes or
+                     load > CPU_LOAD_THRESHOLD),
+        'contention': 1.0 if processes else min(
+            1.0, max(gpu_util / 100.0, memory, load)),
+    }
+    self.samples.append(sample)
+    return sample
+
+  @property
+  def contention(self):
+    """Mean contention score of the samples, 0 if there are none."""
+    if not self.samples:
+      return 0.0
+    return sum(s['contention'] for s in self.samples) / len(self.samples)
+
+  def wait(self):
+    """Samples until the host is idle for `window` or `timeout` passes.
+
+    Returns:
+      True if the host is idle.
+    """
+    self.samples = []
+    self._cpu_times = cpu_times(self.proc_dir)
+    start = time.time()
+    idle_since = None
+    while True:
+      now = time.time()
+      sample = self.sample()
+      if sample['busy']:
+        idle_since = None
+        print('Host busy: GPU util {:.0f}%, GPU memory {:.0%}, {} GPU '
+              'processes, CPU load {:.0%}'.format(
+                  sample['gpu_util'], sample['gpu_memory'],
+                  len(sample['processes']), sample['cpu_load']))
+      elif idle_since is None:
+        idle_since = now
+      if idle_since is not None and now - idle_since >= self.window:
+        print('Host idle for {}s after {:.0f}s, contention {:.2f}'.format(
+            self.window, now - start, self.contention))
+        return True
+      if now - start >= self.timeout:
+        print('Host not idle after {}s, contention {:.2f}'.format(
+            self.timeout, self.contention))
+        return False
+      time.sleep(self.interval)
@@ -0,0 +1,91 @@
+"""Tests quiescence module."""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import tools.quiescence as quiescence
+
+IDLE = {'gpus': [[0, 0, 10, 16000], [1, 0, 10, 16000]], 'processes': []}
+BUSY = {'gpus': [[0, 97, 15000, 16000], [1, 0, 10, 16000]],
+        'processes': [[44454, '/usr/bin/python']]}
+
+
+class TestQuiescence(unittest.TestCase):
+  """Tests for waiting on an idle host with a fake nvidia-smi."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmp_dir)
+    self.state_file = os.path.join(self.tmp_dir, 'smi_state.json')
+    self.nvidia_smi = '{} {} --state={}'.format(
+        sys.executable, 'tools/test_files/fake_nvidia_smi.py', self.state_file)
+    # CPU times that do not move read as an idle CPU.
+    self._write_cpu_stat(100, 900)
+
+  def _write_samples(self, samples):
+    with open(self.state_file, 'w') as f:
+      json.dump({'samples': samples}, f)
+
+  def _write_cpu_stat(self, busy, idle):
+    with open(os.path.join(self.tmp_dir, 'stat'), 'w') as f:
+      f.write('cpu  {} 0 0 {} 0 0 0 0 0 0\n'.format(busy, idle))
+
+  def _detector(self, window, timeout):
+    return quiescence.QuiescenceDetector(
+        window=window, timeout=timeout, interval=0.01,
+        nvidia_smi=self.nvidia_smi, proc_dir=self.tmp_dir)
+
+  def test_sample(self):
+    """Tests GPU and process samples are parsed and scored."""
+    self._write_samples([BUSY])
+    detector = self._detector(1, 1)
+    sample = detector.sample()
+    self.assertEqual(97, sample['gpu_util'])
+    self.assertAlmostEqual(15000 / 16000.0, sample['gpu_memory'])
+    self.assertEqual([{'pid': '44454', 'name': '/usr/bin/python'}],
+                     sample['processes'])
+    self.assertTrue(sample['busy'])
+    self.assertEqual(1.0, sample['contention'])
+
+  def test_idle_after_window(self):
+    """Tests an idle host is declared idle once the window passes."""
+    self._write_samples([IDLE])
+    detector = self._detector(0.1, 5)
+    self.assertTrue(detector.wait())
+    self.assertAlmostEqual(10 / 16000.0, detector.contention)
+    self.assertGreater(len(detector.samples), 1)
+
+  def test_busy_resets_window(self):
+    """Tests busy samples restart the window."""
+    self._write_samples([IDLE, BUSY, IDLE])
+    detector = self._detector(0.1, 5)
+    self.assertTrue(detector.wait())
+    self.assertTrue(detector.samples[1]['busy'])
+    self.assertFalse(detector.samples[-1]['busy'])
+    self.assertGreater(detector.contention, 0)
+
+  def test_busy_times_out(self):
+    """Tests a busy host is not idle once the timeout passes."""
+    self._write_samples([BUSY])
+    detector = self._detector(0.1, 0.2)
+    self.assertFalse(detector.wait())
+    self.assertEqual(1.0, detector.contention)
+
+  def test_no_nvidia_smi(self):
+    """Tests hosts without GPUs are judged on CPU load alone."""
+    self._write_samples([])
+    self.assertIsNone(quiescence.sample_gpus(self.nvidia_smi))
+    self.assertTrue(self._detector(0, 1).wait())
+
+  def test_cpu_load(self):
+    """Tests CPU load is the busy share of jiffies between samples."""
+    first = quiescence.cpu_times(self.tmp_dir)
+    self._write_cpu_stat(400, 1000)
+    second = quiescence.cpu_times(self.tmp_dir)
+    self.assertAlmostEqual(0.75, quiescence.cpu_load(first, second))
+    self.assertEqual(0.0, quiescence.cpu_load(None, second))
@@ -0,0 +1,39 @@
+"""Stand-in for nvidia-smi queries used by the quiescence tests.
+
+The state file holds a list of `samples`, each with `gpus` rows of index,
+utilization.gpu, memory.used and memory.total and `processes` rows of pid
+and process_name. Each GPU query moves on to the next sample and the last
+sample repeats.
+
+Example:
+  python fake_nvidia_smi.py --state=/tmp/state.json \\
+    --query-gpu=index,utilization.gpu --format=csv,noheader,nounits
+"""
+from __future__ import print_function
+import json
+import sys
+
+
+def main(argv):
+  state_file = argv[0].split('=', 1)[1]
+  with open(state_file) as f:
+    state = json.load(f)
+  samples = state['samples']
+  if not samples:
+    print('NVIDIA-SMI has failed')
+    return 9
+  query = argv[1]
+  if query.startswith('--query-gpu'):
+    state['sample'] = state.get('sample', -1) + 1
+    with open(state_file, 'w') as f:
+      json.dump(state, f)
+  sample = samples[min(max(state.get('sample', 0), 0), len(samples) - 1)]
+  rows = sample['gpus'] if query.startswith('--query-gpu') else sample[
+      'processes']
+  for row in rows:
+    print(', '.join(str(value) for value in row))
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
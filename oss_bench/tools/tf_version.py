@@ -1,9 +1,9 @@
 """Extract TensorFlow version info."""
 from __future__ import print_function
-import tensorflow as tf
+import tools.framework_version as framework_version
 
 
-def get_tf_full_version():
+def get_tf_full_version(cache_dir=framework_version.DEFAULT_CACHE_DIR):
   """Returns TensorFlow version as reported by TensorFlow.
 
     Note: The __git__version__ can be confusing as the TensorFlow version
@@ -11,7 +11,12 @@ def get_tf_full_version():
     The git hash is still correct.  The best option is to use the numeric
     version from __version__ and the hash from __git_version__.
 
+    TensorFlow is imported in a subprocess, see `framework_version`.
+
+  Args:
+    cache_dir: Folder to cache the version in, None to always probe.
+
   Returns:
     Tuple of __version__, __git_version__
   """
-  return tf.__version__, tf.__git_version__
+  return framework_version.get_version('tensorflow', cache_dir=cache_dir)
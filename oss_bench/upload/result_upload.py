@@ -1,18 +1,52 @@
 """Upload test results."""
 from __future__ import print_function
+import atexit
 import copy
 from datetime import datetime
 import json
 import os
 import pwd
+import threading
+import time
 import uuid
 
 import pytz
 from six import u as unicode  # pylint: disable=W0622
 
+from google.api_core import exceptions
 import google.auth
 from google.cloud import bigquery
 from google.cloud.bigquery.dbapi import connect
+from upload import spool
+
+# Rows sent to BigQuery per insert.
+BATCH_SIZE = 500
+# Attempts per batch before the rows are given up on.
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled for each retry after.
+BACKOFF_SECONDS = 1.0
+# Errors worth retrying, e.g. 5xx, rate limits and dropped connections.
+TRANSIENT_ERRORS = (exceptions.ServerError, exceptions.TooManyRequests,
+                    IOError)
+# Seconds between attempts of the background flusher to drain a spool.
+FLUSH_INTERVAL = 10.0
+
+# Outcomes of inserting a batch.
+INSERTED = 'inserted'
+# The sink refused the rows, e.g. they do not match the schema.
+REJECTED = 'rejected'
+# The sink could not be reached after every attempt.
+FAILED = 'failed'
+
+# Uploaders shared by every result of the process, see `get_uploader`.
+_uploaders = {}
+_uploaders_lock = threading.Lock()
+# Folder for spools of rows waiting to be uploaded, see `set_spool_dir`.
+_spool_dir = None
+
+# Namespace of the name based uuids made by `build_result_id`.
+RESULT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL,
+                                 'benchmark_harness/result_id')
 
 
 def upload_result(test_result,
@@ -23,9 +57,15 @@ def upload_result(test_result,
                   test_info=None,
                   system_info=None,
                   extras=None,
-                  stream=False):
+                  stream=False,
+                  result_id=None):
   """Upload test result.
 
+  The row is buffered by the uploader shared for `project`, `dataset` and
+  `table` and sent in a batch when the buffer fills, `flush_all` is called or
+  the process exits. After `set_spool_dir` the row is written to disk and
+  sent from a background thread instead.
+
   Note: Using stream=False has a 1000 per day insert limit per table. Using
   stream=True, the documented limit is 50K+. With streaming there can be
   a small and possibly not noticeable delay to seeing the results the BigQuery
@@ -45,24 +85,385 @@ def upload_result(test_result,
     system_info: `dict` of system info. Use `result_info.build_system_info`.
     extras: `dict` of values that will be serialized to JSON.
     stream: Set to true to stream rows.
+    result_id: Id of the row, see `build_result_id`. Defaults to a random id,
+      which means the row is inserted again each time it is uploaded.
   """
-  if project == 'LOCAL':
-    credentials = {}
-    row = _build_row(credentials, test_result, result_info, test_info,
-                     system_info, extras)
-    print('row:{}', row)
-  else:
-    credentials, _ = google.auth.default()
+  uploader = get_uploader(project, dataset=dataset, table=table, stream=stream)
+  uploader.add(test_result, result_info, test_info=test_info,
+               system_info=system_info, extras=extras, result_id=result_id)
+
+
+def build_result_id(result_dir, test_id, copy_index=0, timestamp=None):
+  """Returns a result id that is the same every time a result is reported.
+
+  Reprocessing a results folder or retrying an upload yields the same id,
+  which lets the sinks skip rows they already hold. Only the suite and run
+  folder names of `result_dir` are used, so the id is the same whether the
+  workspace is read in docker, e.g. at /workspace, or from the host.
+
+  Args:
+    result_dir: Folder holding the result's logs, `<suite>/<run>` in the
+      workspace's results folder.
+    test_id: Id of the test.
+    copy_index: Which copy of the test the result is from.
+    timestamp: Time the test was started, e.g. `timestamp` in config.yaml.
+
+  Returns:
+    Name based uuid as a unicode string.
+  """
+  run_path = None
+  if result_dir:
+    suite_dir, run_name = os.path.split(os.path.normpath(result_dir))
+    run_path = '{}/{}'.format(os.path.basename(suite_dir), run_name)
+  key = json.dumps([
+      run_path,
+      test_id,
+      int(copy_index or 0), timestamp
+  ])
+  return unicode(str(uuid.uuid5(RESULT_ID_NAMESPACE, key)))
+
+
+def get_uploader(project,
+                 dataset='benchmark_results_dev',
+                 table='result',
+                 stream=True):
+  """Returns the `Uploader` for the table, creating it on first use.
+
+  Args:
+    project: Project where BigQuery dataset is located or 'LOCAL' to print
+      rows instead.
+    dataset: BigQuery dataset to use.
+    table: BigQuery table to insert into.
+    stream: Set to true to stream rows.
+  """
+  key = (project, dataset, table, stream)
+  with _uploaders_lock:
+    if key not in _uploaders:
+      if project == 'LOCAL':
+        sink = LocalSink()
+      else:
+        sink = BigQuerySink(project, dataset, table, stream=stream)
+      if not _uploaders:
+        atexit.register(flush_all)
+      if _spool_dir:
+        spool_dir = os.path.join(_spool_dir, '{}.{}.{}'.format(
+            project, dataset, table))
+        result_spool = spool.ResultSpool(spool_dir)
+        spool.write_meta(spool_dir, {
+            'project': project,
+            'dataset': dataset,
+            'table': table,
+            'stream': stream
+        })
+        _uploaders[key] = SpooledUploader(sink, result_spool)
+      else:
+        _uploaders[key] = Uploader(sink)
+    return _uploaders[key]
+
+
+def set_spool_dir(spool_dir):
+  """Spools rows under `spool_dir` before they are uploaded.
+
+  Uploaders created after the call write each row to a `spool.ResultSpool`
+  and send it from a background thread, so reporting does not wait on the
+  network and rows survive failed uploads and crashes. Spools left with rows
+  by an earlier run are resumed right away.
+
+  Args:
+    spool_dir: Folder to hold the spools, e.g. in the workspace.
+  """
+  global _spool_dir
+  _spool_dir = spool_dir
+  for _, meta in spool.find_spools(spool_dir):
+    get_uploader(meta['project'], dataset=meta['dataset'],
+                 table=meta['table'], stream=meta['stream'])
+
+
+def flush_all():
+  """Flushes rows buffered or spooled by every shared uploader."""
+  with _uploaders_lock:
+    uploaders = list(_uploaders.values())
+  for uploader in uploaders:
+    uploader.flush()
+
+
+class Uploader(object):
+  """Buffers rows and sends them to a sink in batches.
+
+  Transient errors are retried with exponential backoff. Create one per suite,
+  or use `get_uploader`, so the sink's client and table are reused.
+
+  Example:
+    uploader = Uploader(LocalSink())
+    uploader.add(test_result, results, test_info=test_info)
+    uploader.flush()
+
+  Args:
+    sink: Where rows go, e.g. `BigQuerySink` or `LocalSink`.
+    batch_size: Rows buffered before they are flushed.
+    max_attempts: Attempts per batch before the rows are given up on.
+    backoff: Seconds before the first retry, doubled for each retry after.
+  """
+
+  def __init__(self,
+               sink,
+               batch_size=BATCH_SIZE,
+               max_attempts=MAX_ATTEMPTS,
+               backoff=BACKOFF_SECONDS):
+    self.sink = sink
+    self.batch_size = batch_size
+    self.max_attempts = max_attempts
+    self.backoff = backoff
+    self.rows = []
+    self.lock = threading.Lock()
+
+  def add(self,
+          test_result,
+          result_info,
+          test_info=None,
+          system_info=None,
+          extras=None,
+          result_id=None):
+    """Builds a row and buffers it, flushing if the buffer is full.
 
-    row = _build_row(credentials, test_result, result_info, test_info,
-                     system_info, extras)
+    Args:
+      test_result: `dict` with core info. Use `result_info.build_test_result`.
+      result_info: `dict` with result info. Use
+        `result_info.build_test_result`.
+      test_info: `dict` of test info. Use `result_info.build_test_info`.
+      system_info: `dict` of system info. Use `result_info.build_system_info`.
+      extras: `dict` of values that will be serialized to JSON.
+      result_id: Id of the row, see `build_result_id`.
+    """
+    row = _build_row(self.sink.credentials, test_result, result_info,
+                     test_info, system_info, extras, result_id=result_id)
+    with self.lock:
+      self.rows.append(row)
+      full = len(self.rows) >= self.batch_size
+    if full:
+      self.flush()
 
-    client = bigquery.Client(project=project, credentials=credentials)
+  def flush(self):
+    """Sends buffered rows in batches.
 
-    if stream:
-      _stream_upload(client, dataset, table, row)
-    else:
-      _upload(client, dataset, table, row)
+    Returns:
+      List of rows that could not be inserted.
+    """
+    with self.lock:
+      rows, self.rows = self.rows, []
+    failed = []
+    for start in range(0, len(rows), self.batch_size):
+      batch = rows[start:start + self.batch_size]
+      if self._insert(batch) != INSERTED:
+        failed.extend(batch)
+    return failed
+
+  def _insert(self, batch):
+    """Inserts a batch, retrying transient errors.
+
+    Returns:
+      INSERTED, REJECTED if the sink returned errors for the rows or refused
+      the request or FAILED if every attempt hit a transient error.
+    """
+    delay = self.backoff
+    for attempt in range(1, self.max_attempts + 1):
+      try:
+        errors = self.sink.insert(batch)
+        if errors:
+          print('Error inserting rows:{}'.format(errors))
+          return REJECTED
+        return INSERTED
+      except TRANSIENT_ERRORS as e:
+        print('Insert of {} rows failed (attempt {} of {}):{}'.format(
+            len(batch), attempt, self.max_attempts, e))
+        if attempt < self.max_attempts:
+          time.sleep(delay)
+          delay *= 2
+      except exceptions.GoogleAPICallError as e:
+        # e.g. bad request or no access, retrying would fail the same way.
+        print('Insert of {} rows refused:{}'.format(len(batch), e))
+        return REJECTED
+    return FAILED
+
+
+class SpooledUploader(Uploader):
+  """Uploader that spools rows to disk and sends them in the background.
+
+  `add` returns as soon as the row is on disk. A daemon thread drains the
+  spool every `interval` seconds or when woken by `add`. Batches that fail
+  stay in the spool and are tried again later, including by the next run if
+  the process exits first. Rows the sink rejects are moved aside to
+  `spool.REJECTED_FILE`.
+
+  Args:
+    sink: Where rows go, e.g. `BigQuerySink` or `LocalSink`.
+    result_spool: `spool.ResultSpool` to write rows to.
+    interval: Seconds between attempts to drain the spool.
+    **kwargs: Passed to `Uploader`.
+  """
+
+  def __init__(self, sink, result_spool, interval=FLUSH_INTERVAL, **kwargs):
+    super(SpooledUploader, self).__init__(sink, **kwargs)
+    self.spool = result_spool
+    self.interval = interval
+    self.drain_lock = threading.Lock()
+    self._wake = threading.Event()
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    # Starts draining right away to send rows left by an earlier run.
+    self._thread.start()
+
+  def add(self,
+          test_result,
+          result_info,
+          test_info=None,
+          system_info=None,
+          extras=None,
+          result_id=None):
+    """Builds a row, writes it to the spool and wakes the flusher."""
+    row = _build_row(self.sink.credentials, test_result, result_info,
+                     test_info, system_info, extras, result_id=result_id)
+    self.spool.append(row)
+    self._wake.set()
+
+  def flush(self):
+    """Drains the spool in the calling thread.
+
+    Returns:
+      List of rows that could not be sent and remain in the spool.
+    """
+    return self._drain()
+
+  def _run(self):
+    while True:
+      self._wake.wait(self.interval)
+      self._wake.clear()
+      try:
+        self._drain()
+      except Exception as e:  # pylint: disable=broad-except
+        # Rows stay in the spool and the next drain tries them again.
+        print('Error draining spool {}:{}'.format(self.spool.spool_dir, e))
+
+  def _drain(self):
+    with self.drain_lock:
+      while True:
+        rows, offset = self.spool.pending(self.batch_size)
+        if not rows:
+          return []
+        status = self._insert(rows)
+        if status == FAILED:
+          return rows
+        if status == REJECTED:
+          self.spool.reject(rows)
+        self.spool.commit(offset)
+
+
+class BigQuerySink(object):
+  """Inserts rows into a BigQuery table.
+
+  The credentials, client and table are created on first use and reused for
+  every insert after. The table's result ids are read once, on the first
+  insert, and rows whose result_id is known are skipped. Streamed rows carry
+  the result_id as insert id so BigQuery drops a retried batch it already
+  received.
+
+  Args:
+    project: Project where BigQuery dataset is located.
+    dataset: BigQuery dataset to use.
+    table: BigQuery table to insert into.
+    stream: Set to true to stream rows, otherwise rows are inserted with DML.
+  """
+
+  def __init__(self, project, dataset, table, stream=True):
+    self.project = project
+    self.dataset = dataset
+    self.table = table
+    self.stream = stream
+    self._credentials = None
+    self._client = None
+    self._table = None
+    # Result ids in the table or inserted by this sink.
+    self.ids = None
+
+  @property
+  def credentials(self):
+    if self._credentials is None:
+      self._credentials, _ = google.auth.default()
+    return self._credentials
+
+  @property
+  def client(self):
+    if self._client is None:
+      self._client = bigquery.Client(
+          project=self.project, credentials=self.credentials)
+    return self._client
+
+  def insert(self, rows):
+    """Inserts rows and returns the per row errors, if any."""
+    if self.ids is None:
+      self.ids = self._existing_ids()
+    rows = _unique_rows(rows, self.ids)
+    if not rows:
+      return []
+    if not self.stream:
+      for row in rows:
+        _upload(self.client, self.dataset, self.table, row)
+        self.ids.add(row['result_id'])
+      return []
+    if self._table is None:
+      table_ref = self.client.dataset(self.dataset).table(self.table)
+      self._table = self.client.get_table(table_ref)  # API request
+    errors = self.client.insert_rows(
+        self._table, rows, row_ids=[row['result_id'] for row in rows])
+    if not errors:
+      self.ids.update(row['result_id'] for row in rows)
+    return errors
+
+  def _existing_ids(self):
+    """Returns set of the result ids in the table, empty if unreadable.
+
+    Querying needs more than insert access, so a failed query only means
+    rows uploaded by earlier processes are not skipped.
+    """
+    sql = 'SELECT DISTINCT result_id FROM `{}.{}.{}`'.format(
+        self.project, self.dataset, self.table)
+    try:
+      return set(row.result_id for row in self.client.query(sql).result())
+    except (exceptions.GoogleAPICallError, IOError) as e:
+      print('Unable to read result ids of {}.{}.{}:{}'.format(
+          self.project, self.dataset, self.table, e))
+      return set()
+
+
+class LocalSink(object):
+  """Keeps and prints rows instead of uploading them, for tests and LOCAL.
+
+  Rows with a result_id the sink already holds are skipped.
+  """
+
+  def __init__(self):
+    self.credentials = {}
+    self.rows = []
+    self.ids = set()
+
+  def insert(self, rows):
+    rows = _unique_rows(rows, self.ids)
+    for row in rows:
+      print('row:{}'.format(row))
+      self.ids.add(row['result_id'])
+    self.rows.extend(rows)
+    return []
+
+
+def _unique_rows(rows, ids):
+  """Returns rows whose result_id is not in `ids` or earlier in `rows`."""
+  seen = set(ids)
+  unique = []
+  for row in rows:
+    if row['result_id'] not in seen:
+      seen.add(row['result_id'])
+      unique.append(row)
+  return unique
 
 
 def _upload(client, dataset, table, row):
@@ -84,21 +485,13 @@ def _upload(client, dataset, table, row):
   conn.close()
 
 
-def _stream_upload(client, dataset, table, row):
-  """Uploads row to BigQuery via streaming interface."""
-  table_ref = client.dataset(dataset).table(table)
-  table_obj = client.get_table(table_ref)  # API request
-  errors = client.insert_rows(table_obj, [row])
-  if errors:
-    print('Error inserting rows:{}'.format(errors))
-
-
 def _build_row(credentials,
                test_result,
                result_info,
                test_info=None,
                system_info=None,
-               extras=None):
+               extras=None,
+               result_id=None):
   """Builds row to be inserted into BigQuery.
 
   Note: BigQuery maps unicode() to STRING for python2.  If str is used that is
@@ -111,12 +504,13 @@ def _build_row(credentials,
     test_info: `dict` of test info. Use `result_info.build_test_info`.
     system_info: `dict` of system info. Use `result_info.build_system_info`.
     extras: `dict` of values that will be serialized to JSON.
+    result_id: Id of the row, see `build_result_id`. Defaults to a random id.
 
   Returns:
     `dict` to be inserted into BigQuery.
   """
   row = copy.copy(test_result)
-  row['result_id'] = unicode(str(uuid.uuid4()))
+  row['result_id'] = unicode(result_id or str(uuid.uuid4()))
   # The user is set to the email address of the service account.  If that is not
   # found, then the logged in user is used as a last best guess.
   if hasattr(credentials, 'service_account_email'):
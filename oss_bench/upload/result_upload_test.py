@@ -14,12 +14,17 @@
 from __future__ import print_function
 
 import json
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 import mock
 from mock import patch
 import upload.result_info as result_info
 import upload.result_upload as result_upload
+import upload.spool as spool
 
 
 class TestResultUpload(unittest.TestCase):
@@ -75,13 +80,16 @@ class TestResultUpload(unittest.TestCase):
     self.assertEqual('total_time', result_info_actual[0]['result_type'])
     self.assertEqual('ms', result_info_actual[0]['result_units'])
 
+  @patch.dict('upload.result_upload._uploaders', clear=True)
   @patch('google.auth.default')
   @patch('google.cloud.bigquery.Client')
-  @patch('upload.result_upload._stream_upload')
-  def test_upload_stream(self, stream_upload, bigquery, google):
-    """Tests calls to steam upload with mock insert."""
+  def test_upload_stream(self, bigquery, google):
+    """Tests rows share one client and table and are inserted in a batch."""
 
     google.return_value = ['foo', 'bar']
+    client = bigquery.return_value
+    client.insert_rows.return_value = []
+    client.query.return_value.result.return_value = []
 
     test_result, results = result_info.build_test_result(
         'fake_test_id',
@@ -95,20 +103,26 @@ class TestResultUpload(unittest.TestCase):
     test_info = result_info.build_test_info(batch_size=32,
                                             group_run_id='0000-uuid')
 
-    result_upload.upload_result(test_result,
-                                results,
-                                'fake_project',
-                                test_info=test_info,
-                                system_info=system_info,
-                                stream=True)
+    for _ in range(3):
+      result_upload.upload_result(test_result,
+                                  results,
+                                  'fake_project',
+                                  test_info=test_info,
+                                  system_info=system_info,
+                                  stream=True)
+    client.insert_rows.assert_not_called()
+    result_upload.flush_all()
 
-    google.assert_called()
-    bigquery.assert_called()
-    stream_upload.assert_called()
+    google.assert_called_once()
+    bigquery.assert_called_once()
+    client.get_table.assert_called_once()
+    client.insert_rows.assert_called_once()
 
-    args = stream_upload.call_args
-    print(args[0][3])
-    row = args[0][3]
+    rows = client.insert_rows.call_args[0][1]
+    self.assertEqual(3, len(rows))
+    self.assertEqual([row['result_id'] for row in rows],
+                     client.insert_rows.call_args[1]['row_ids'])
+    row = rows[0]
 
     test_info_actual = json.loads(row['test_info'])
     system_info_actual = json.loads(row['system_info'])
@@ -133,3 +147,229 @@ class TestResultUpload(unittest.TestCase):
     self.assertEqual(123.4, result_info_actual[0]['result'])
     self.assertEqual('total_time', result_info_actual[0]['result_type'])
     self.assertEqual('ms', result_info_actual[0]['result_units'])
+
+  def test_build_result_id(self):
+    """Tests result ids only change with the folder, test, copy or time."""
+    result_id = result_upload.build_result_id('/workspace/results/s/0',
+                                              'test', 0, 1500000000)
+    self.assertEqual(
+        result_id,
+        result_upload.build_result_id('/workspace/results/s/0/', 'test', '0',
+                                      1500000000))
+    # The workspace as mounted on the host.
+    self.assertEqual(
+        result_id,
+        result_upload.build_result_id('/home/user/workspace/results/s/0',
+                                      'test', 0, 1500000000))
+    self.assertNotEqual(
+        result_id,
+        result_upload.build_result_id('/workspace/results/t/0', 'test', 0,
+                                      1500000000))
+    self.assertNotEqual(
+        result_id,
+        result_upload.build_result_id('/workspace/results/s/0', 'test', 1,
+                                      1500000000))
+    self.assertNotEqual(
+        result_id,
+        result_upload.build_result_id('/workspace/results/s/0', 'test', 0,
+                                      1500000001))
+
+  def test_local_sink_skips_duplicates(self):
+    """Tests rows whose result_id was already inserted are skipped."""
+    sink = result_upload.LocalSink()
+    uploader = result_upload.Uploader(sink)
+    test_result, results = result_info.build_test_result('test_id', 1)
+    for _ in range(2):
+      uploader.add(test_result, results, result_id='result_0')
+      uploader.flush()
+    uploader.add(test_result, results, result_id='result_1')
+    uploader.flush()
+    self.assertEqual(['result_0', 'result_1'],
+                     [row['result_id'] for row in sink.rows])
+
+  @patch('google.auth.default')
+  @patch('google.cloud.bigquery.Client')
+  def test_bigquery_sink_skips_existing(self, bigquery, google):
+    """Tests rows already in the table are not inserted again."""
+    google.return_value = ['foo', 'bar']
+    client = bigquery.return_value
+    client.insert_rows.return_value = []
+    existing = mock.Mock(result_id='result_0')
+    client.query.return_value.result.return_value = [existing]
+
+    sink = result_upload.BigQuerySink('project', 'dataset', 'table')
+    sink.insert([{'result_id': 'result_0'}, {'result_id': 'result_1'}])
+    rows = client.insert_rows.call_args[0][1]
+    self.assertEqual([{'result_id': 'result_1'}], rows)
+
+    # The table is queried once, ids inserted by the sink are not sent again.
+    client.insert_rows.reset_mock()
+    self.assertEqual([], sink.insert([{'result_id': 'result_1'}]))
+    self.assertEqual([], sink.insert([{'result_id': 'result_0'}]))
+    client.query.assert_called_once()
+    client.insert_rows.assert_not_called()
+
+  @patch('google.auth.default')
+  @patch('google.cloud.bigquery.Client')
+  def test_bigquery_sink_query_error(self, bigquery, google):
+    """Tests rows are inserted when the table's ids cannot be read."""
+    google.return_value = ['foo', 'bar']
+    client = bigquery.return_value
+    client.insert_rows.return_value = []
+    client.query.side_effect = result_upload.exceptions.Forbidden('no jobs')
+
+    sink = result_upload.BigQuerySink('project', 'dataset', 'table')
+    self.assertEqual([], sink.insert([{'result_id': 'result_0'}]))
+    self.assertEqual([{'result_id': 'result_0'}],
+                     client.insert_rows.call_args[0][1])
+
+  def test_uploader_batches(self):
+    """Tests rows are flushed each time the buffer fills."""
+    sink = result_upload.LocalSink()
+    uploader = result_upload.Uploader(sink, batch_size=2)
+    for i in range(5):
+      test_result, results = result_info.build_test_result(
+          'test_{}'.format(i), i)
+      uploader.add(test_result, results)
+    self.assertEqual(4, len(sink.rows))
+    self.assertEqual([], uploader.flush())
+    self.assertEqual(['test_{}'.format(i) for i in range(5)],
+                     [row['test_id'] for row in sink.rows])
+
+  @patch('upload.result_upload.time.sleep')
+  def test_uploader_retry(self, sleep):
+    """Tests transient errors are retried with exponential backoff."""
+    sink = _FlakySink(failures=2)
+    uploader = result_upload.Uploader(sink, backoff=0.5)
+    test_result, results = result_info.build_test_result('test_id', 1)
+    uploader.add(test_result, results)
+    self.assertEqual([], uploader.flush())
+    self.assertEqual([mock.call(0.5), mock.call(1.0)], sleep.call_args_list)
+    self.assertEqual(1, len(sink.rows))
+
+  @patch('upload.result_upload.time.sleep')
+  def test_uploader_gives_up(self, sleep):
+    """Tests rows are returned after the last attempt fails."""
+    sink = _FlakySink(failures=10)
+    uploader = result_upload.Uploader(sink, max_attempts=3)
+    test_result, results = result_info.build_test_result('test_id', 1)
+    uploader.add(test_result, results)
+    failed = uploader.flush()
+    self.assertEqual(1, len(failed))
+    self.assertEqual(2, sleep.call_count)
+    self.assertEqual([], sink.rows)
+
+  @patch('upload.result_upload.time.sleep')
+  def test_spooled_uploader(self, _):
+    """Tests failed rows stay in the spool and are sent by the next run."""
+    spool_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, spool_dir)
+    sink = _FlakySink(failures=10)
+    uploader = result_upload.SpooledUploader(
+        sink, spool.ResultSpool(spool_dir), max_attempts=1)
+    test_result, results = result_info.build_test_result('test_id', 1)
+    uploader.add(test_result, results)
+    self.assertEqual(1, len(uploader.flush()))
+    self.assertEqual([], sink.rows)
+
+    # Stands in for a later run finding the rows left in the spool.
+    sink = result_upload.LocalSink()
+    uploader = result_upload.SpooledUploader(sink, spool.ResultSpool(spool_dir))
+    self.assertEqual([], uploader.flush())
+    self.assertEqual(['test_id'], [row['test_id'] for row in sink.rows])
+    self.assertEqual(0, len(uploader.spool))
+
+  def test_spooled_uploader_error(self):
+    """Tests the flusher keeps draining after an unexpected error."""
+    spool_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, spool_dir)
+    sink = _BrokenSink(failures=1)
+    uploader = result_upload.SpooledUploader(
+        sink, spool.ResultSpool(spool_dir), interval=0.01)
+    test_result, results = result_info.build_test_result('test_id', 1)
+    uploader.add(test_result, results)
+    deadline = time.time() + 5
+    while not sink.rows and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(0, sink.failures)
+    self.assertEqual(['test_id'], [row['test_id'] for row in sink.rows])
+
+  def test_spooled_uploader_refused(self):
+    """Tests rows the sink refuses are moved aside and do not block others."""
+    spool_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, spool_dir)
+    sink = _RefusingSink(failures=1)
+    uploader = result_upload.SpooledUploader(
+        sink, spool.ResultSpool(spool_dir), batch_size=1)
+    for test_id in ('test_0', 'test_1'):
+      test_result, results = result_info.build_test_result(test_id, 1)
+      uploader.add(test_result, results)
+    self.assertEqual([], uploader.flush())
+    self.assertEqual(['test_1'], [row['test_id'] for row in sink.rows])
+    with open(os.path.join(spool_dir, spool.REJECTED_FILE)) as f:
+      self.assertEqual('test_0', json.loads(f.readline())['test_id'])
+
+  @patch.dict('upload.result_upload._uploaders', clear=True)
+  def test_set_spool_dir(self):
+    """Tests uploaders are created for spools left by an earlier run."""
+    base_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, base_dir)
+    spool_dir = os.path.join(base_dir, 'LOCAL.dataset.table')
+    spool.ResultSpool(spool_dir).append({
+        'result_id': 'result_0',
+        'test_id': 'test_id'
+    })
+    spool.write_meta(spool_dir, {
+        'project': 'LOCAL',
+        'dataset': 'dataset',
+        'table': 'table',
+        'stream': True
+    })
+    with patch('upload.result_upload._spool_dir', None):
+      result_upload.set_spool_dir(base_dir)
+      uploader = result_upload._uploaders[('LOCAL', 'dataset', 'table', True)]
+      self.assertEqual([], uploader.flush())
+    self.assertEqual(['test_id'],
+                     [row['test_id'] for row in uploader.sink.rows])
+
+
+class _FlakySink(result_upload.LocalSink):
+  """LocalSink that fails with a transient error `failures` times."""
+
+  def __init__(self, failures):
+    super(_FlakySink, self).__init__()
+    self.failures = failures
+
+  def insert(self, rows):
+    if self.failures:
+      self.failures -= 1
+      raise result_upload.exceptions.ServiceUnavailable('try again')
+    return super(_FlakySink, self).insert(rows)
+
+
+class _BrokenSink(result_upload.LocalSink):
+  """LocalSink that fails with an unexpected error `failures` times."""
+
+  def __init__(self, failures):
+    super(_BrokenSink, self).__init__()
+    self.failures = failures
+
+  def insert(self, rows):
+    if self.failures:
+      self.failures -= 1
+      raise ValueError('unexpected')
+    return super(_BrokenSink, self).insert(rows)
+
+
+class _RefusingSink(result_upload.LocalSink):
+  """LocalSink that refuses the request `failures` times."""
+
+  def __init__(self, failures):
+    super(_RefusingSink, self).__init__()
+    self.failures = failures
+
+  def insert(self, rows):
+    if self.failures:
+      self.failures -= 1
+      raise result_upload.exceptions.Forbidden('no access')
+    return super(_RefusingSink, self).insert(rows)
@@ -0,0 +1,174 @@
+"""Durable append-only spool of result rows waiting to be uploaded."""
+from __future__ import print_function
+import datetime
+import json
+import os
+import threading
+
+ROWS_FILE = 'rows.jsonl'
+OFFSET_FILE = 'rows.offset'
+REJECTED_FILE = 'rejected.jsonl'
+META_FILE = 'sink.json'
+# Bytes read at a time looking back for the end of the last full row.
+TAIL_BLOCK_SIZE = 4096
+
+
+class ResultSpool(object):
+  """Rows appended to a JSONL file and a committed offset of rows sent.
+
+  Each row is written and fsynced before `append` returns, so a row is never
+  lost once a test has reported it. The offset is advanced with `commit`
+  after the rows before it are uploaded and is replaced atomically, which
+  means a crash at worst sends a batch twice. Once everything is sent the
+  files are truncated.
+
+  Example:
+    spool = ResultSpool('/workspace/spool/project.dataset.result')
+    spool.append(row)
+    rows, offset = spool.pending(500)
+    ...upload rows...
+    spool.commit(offset)
+
+  Args:
+    spool_dir (str): Folder holding the spool files, created if needed.
+  """
+
+  def __init__(self, spool_dir):
+    self.spool_dir = spool_dir
+    self.rows_file = os.path.join(spool_dir, ROWS_FILE)
+    self.offset_file = os.path.join(spool_dir, OFFSET_FILE)
+    self.lock = threading.Lock()
+    if not os.path.isdir(spool_dir):
+      os.makedirs(spool_dir)
+
+  def append(self, row):
+    """Appends `row` and waits for it to reach the disk.
+
+    A partial last line left by a crash mid write is dropped first, so the
+    row does not run on from it.
+    """
+    line = json.dumps(row, default=_json_default) + '\n'
+    with self.lock:
+      size = self._complete_size()
+      if size != _size(self.rows_file):
+        self._truncate_rows(size)
+      with open(self.rows_file, 'a') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+  def pending(self, max_rows):
+    """Returns up to `max_rows` unsent rows and the offset after them.
+
+    A partial last line, left by a crash mid write, is not returned. An
+    offset past the end of the rows, left by a crash while starting over, is
+    read as 0.
+    """
+    rows = []
+    with self.lock:
+      offset = self._read_offset()
+      if not os.path.isfile(self.rows_file):
+        return rows, offset
+      with open(self.rows_file, 'rb') as f:
+        f.seek(offset)
+        while len(rows) < max_rows:
+          line = f.readline()
+          if not line.endswith(b'\n'):
+            break
+          offset += len(line)
+          rows.append(json.loads(line.decode('utf-8')))
+    return rows, offset
+
+  def commit(self, offset):
+    """Marks rows before `offset` as sent."""
+    with self.lock:
+      if offset >= _size(self.rows_file):
+        # Everything is sent. Starts over rather than growing forever. The
+        # offset is reset first, so a crash in between sends rows twice
+        # rather than skipping rows appended later.
+        self._write_offset(0)
+        self._truncate_rows(0)
+      else:
+        self._write_offset(offset)
+
+  def reject(self, rows):
+    """Keeps rows the sink refused so they do not block the rest."""
+    with self.lock:
+      with open(os.path.join(self.spool_dir, REJECTED_FILE), 'a') as f:
+        for row in rows:
+          f.write(json.dumps(row, default=_json_default) + '\n')
+
+  def __len__(self):
+    """Returns number of bytes not yet sent."""
+    with self.lock:
+      return max(_size(self.rows_file) - self._read_offset(), 0)
+
+  def _complete_size(self):
+    """Returns size of the rows file up to the end of its last full line."""
+    size = _size(self.rows_file)
+    if not size:
+      return 0
+    with open(self.rows_file, 'rb') as f:
+      end = size
+      while end > 0:
+        start = max(end - TAIL_BLOCK_SIZE, 0)
+        f.seek(start)
+        newline = f.read(end - start).rfind(b'\n')
+        if newline >= 0:
+          return start + newline + 1
+        end = start
+    return 0
+
+  def _write_offset(self, offset):
+    tmp_file = self.offset_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+      f.write(str(offset))
+      f.flush()
+      os.fsync(f.fileno())
+    os.rename(tmp_file, self.offset_file)
+
+  def _truncate_rows(self, size):
+    with open(self.rows_file, 'ab') as f:
+      f.truncate(size)
+      f.flush()
+      os.fsync(f.fileno())
+
+  def _read_offset(self):
+    try:
+      with open(self.offset_file) as f:
+        offset = int(f.read().strip() or 0)
+    except (IOError, OSError, ValueError):
+      return 0
+    return offset if offset <= _size(self.rows_file) else 0
+
+
+def write_meta(spool_dir, meta):
+  """Records which sink a spool drains to so it can be resumed later."""
+  with open(os.path.join(spool_dir, META_FILE), 'w') as f:
+    json.dump(meta, f)
+
+
+def find_spools(base_dir):
+  """Returns list of (spool_dir, meta) for spools under `base_dir`."""
+  spools = []
+  if os.path.isdir(base_dir):
+    for name in sorted(os.listdir(base_dir)):
+      meta_file = os.path.join(base_dir, name, META_FILE)
+      if os.path.isfile(meta_file):
+        with open(meta_file) as f:
+          spools.append((os.path.join(base_dir, name), json.load(f)))
+  return spools
+
+
+def _size(path):
+  try:
+    return os.path.getsize(path)
+  except OSError:
+    return 0
+
+
+def _json_default(value):
+  """Serializes the row timestamp, which BigQuery accepts as a string."""
+  if isinstance(value, (datetime.datetime, datetime.date)):
+    return value.isoformat()
+  raise TypeError('{} is not JSON serializable'.format(repr(value)))
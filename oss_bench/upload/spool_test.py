@@ -0,0 +1,106 @@
+"""Tests spool module."""
+from __future__ import print_function
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+import upload.spool as spool
+
+
+class TestResultSpool(unittest.TestCase):
+
+  def setUp(self):
+    self.spool_dir = os.path.join(tempfile.mkdtemp(), 'spool')
+    self.addCleanup(shutil.rmtree, os.path.dirname(self.spool_dir))
+
+  def test_append_pending_commit(self):
+    """Tests rows come back in order until committed."""
+    result_spool = spool.ResultSpool(self.spool_dir)
+    for i in range(3):
+      result_spool.append({'test_id': i})
+    rows, offset = result_spool.pending(2)
+    self.assertEqual([{'test_id': 0}, {'test_id': 1}], rows)
+    result_spool.commit(offset)
+
+    # A new spool on the same folder resumes after the committed rows.
+    result_spool = spool.ResultSpool(self.spool_dir)
+    rows, offset = result_spool.pending(2)
+    self.assertEqual([{'test_id': 2}], rows)
+    result_spool.commit(offset)
+    self.assertEqual(0, len(result_spool))
+    self.assertEqual(([], 0), result_spool.pending(2))
+
+  def test_pending_skips_partial_line(self):
+    """Tests a row cut off by a crash is not returned."""
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.append({'test_id': 0})
+    with open(os.path.join(self.spool_dir, spool.ROWS_FILE), 'a') as f:
+      f.write('{"test_id": 1')
+    rows, _ = result_spool.pending(10)
+    self.assertEqual([{'test_id': 0}], rows)
+
+  @patch('upload.spool.ResultSpool._truncate_rows')
+  def test_commit_crash_before_truncate(self, truncate_rows_mock):
+    """Tests a crash while starting over sends rows again, never skips."""
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.append({'test_id': 0})
+    truncate_rows_mock.side_effect = OSError('crash')
+    _, offset = result_spool.pending(10)
+    with self.assertRaises(OSError):
+      result_spool.commit(offset)
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.append({'test_id': 1})
+    rows, _ = result_spool.pending(10)
+    self.assertEqual([{'test_id': 0}, {'test_id': 1}], rows)
+
+  def test_pending_stale_offset(self):
+    """Tests an offset past the end of the rows starts from the first row."""
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool._write_offset(80)
+    result_spool.append({'test_id': 0})
+    result_spool.append({'test_id': 1})
+    self.assertGreater(len(result_spool), 0)
+    rows, offset = result_spool.pending(10)
+    self.assertEqual([{'test_id': 0}, {'test_id': 1}], rows)
+    self.assertEqual(
+        os.path.getsize(os.path.join(self.spool_dir, spool.ROWS_FILE)), offset)
+
+  def test_append_after_partial_line(self):
+    """Tests a row appended after a crash mid write is not joined to it."""
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.append({'test_id': 0})
+    with open(os.path.join(self.spool_dir, spool.ROWS_FILE), 'a') as f:
+      f.write('{"test_id": 1')
+    result_spool.append({'test_id': 2})
+    rows, _ = result_spool.pending(10)
+    self.assertEqual([{'test_id': 0}, {'test_id': 2}], rows)
+
+    # Also when the partial line is the only one.
+    os.remove(os.path.join(self.spool_dir, spool.ROWS_FILE))
+    with open(os.path.join(self.spool_dir, spool.ROWS_FILE), 'a') as f:
+      f.write('{"test_id": 1')
+    result_spool.append({'test_id': 3})
+    self.assertEqual([{'test_id': 3}], result_spool.pending(10)[0])
+
+  def test_append_timestamp(self):
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.append({'timestamp': datetime(2018, 1, 2, 3, 4, 5)})
+    rows, _ = result_spool.pending(1)
+    self.assertEqual('2018-01-02T03:04:05', rows[0]['timestamp'])
+
+  def test_reject(self):
+    result_spool = spool.ResultSpool(self.spool_dir)
+    result_spool.reject([{'test_id': 0}])
+    with open(os.path.join(self.spool_dir, spool.REJECTED_FILE)) as f:
+      self.assertEqual('{"test_id": 0}\n', f.read())
+
+  def test_find_spools(self):
+    spool.ResultSpool(self.spool_dir)
+    meta = {'project': 'LOCAL', 'dataset': 'd', 'table': 't', 'stream': True}
+    spool.write_meta(self.spool_dir, meta)
+    base_dir = os.path.dirname(self.spool_dir)
+    self.assertEqual([(self.spool_dir, meta)], spool.find_spools(base_dir))
+    self.assertEqual([], spool.find_spools(os.path.join(base_dir, 'missing')))
@@ -27,6 +27,7 @@ def main():
       system_info=system_info,
       extras=extras,
       stream=True)
+  result_upload.flush_all()
 
 if __name__ == '__main__':
   main()